@@ -3,6 +3,7 @@ from __future__ import annotations
 
 import sys
 import argparse
+from functools import partial
 from pathlib import Path
 
 # ======================================================
@@ -17,6 +18,7 @@ if str(ROOT) not in sys.path:
 # ======================================================
 from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_config
+from src.core.db import source_snapshot
 from src.loaders.newdb_builder import NewDBBuilder
 
 # ---------------- FASE 1: EXTRACTORES -----------------
@@ -24,9 +26,12 @@ from src.extractors.invoices_extractor import InvoicesExtractor
 from src.extractors.bank_extractor import BankExtractor
 from src.extractors.clients_extractor import ClientsExtractor
 
-from src.loaders.invoice_writer import InvoiceWriter
-from src.loaders.bank_writer import BankWriter
-from src.loaders.clients_writer import ClientsWriter
+from src.loaders.invoice_writer import InvoiceWriter, COLUMNS as COLS_FACTURAS
+from src.loaders.bank_writer import BankWriter, COLUMNS as COLS_BANCOS
+from src.loaders.clients_writer import ClientsWriter, COLUMNS as COLS_CLIENTES
+from src.loaders.sql_etl import SqlEtlEngine
+from src.loaders.stage_store import StageStore, MatchProgress, huella_archivo
+from src.loaders.migrations import SchemaError, explain_check
 
 # ---------------- FASE 2: PIPELINES -------------------
 from src.pipelines.pipeline_facturas import PipelineFacturas
@@ -35,81 +40,246 @@ from src.pipelines.pipeline_clients import PipelineClientes
 from src.pipelines.pipeline_matcher import PipelineMatcher
 
 from src.pipelines.incremental import IncrementalRunner
+from src.pipelines.stage_graph import StageGraph
+from src.pipelines.run_context import RunContext, RunContextError, frame_from_rows
+from src.pipelines.streaming import StreamPipeline
 
 
 # ======================================================
-#                FULL · ETL COMPLETO
+#      ETAPAS FULL (funciones de módulo → picklables)
 # ======================================================
-def cmd_full(args):
-    info("=== FULL RUN · PULSEFORGE ===")
-
-    # 1) Configuración
-    cfg = get_config()
-    ok(f"DB origen:  {cfg.db_source}")
-    ok(f"DB destino: {cfg.db_destino}")
-
-    # 2) Crear BD destino / reset
+def _etapa_reset(_):
     warn("Reiniciando BD destino…")
     NewDBBuilder()
 
-    # ==================================================
-    #               FASE 1 — EXTRACCIÓN
-    # ==================================================
-    info("=== FASE 1 · EXTRACCIÓN Y CARGA ===")
 
-    # -------- Facturas --------
+def _etapa_sql_etl(_):
+    # -------- Todo dentro de SQLite (ATTACH + UDFs) --------
+    return SqlEtlEngine().run()
+
+
+def _etapa_extraer_facturas(_):
     info("Extrayendo facturas desde BD origen…")
-    fact_ex = InvoicesExtractor()
-    facturas = fact_ex.run()  # → list[dict]
+    return InvoicesExtractor().run()  # → list[dict]
+
 
+def _etapa_guardar_facturas(e):
     info("Guardando facturas RAW en PulseForge…")
-    fact_writer = InvoiceWriter()
-    fact_writer.save_many(facturas)
+    return InvoiceWriter().save_many(e["extraer_facturas"])
+
 
-    # -------- Bancos --------
+def _etapa_extraer_bancos(_):
     info("Extrayendo movimientos bancarios…")
-    bank_ex = BankExtractor()
-    movimientos = bank_ex.run()  # list[dict]
+    return BankExtractor().run()  # list[dict]
 
-    info("Guardando movimientos RAW en PulseForge…")
-    bank_writer = BankWriter()
-    bank_writer.save_many(movimientos)
 
-    # -------- Clientes --------
-    info("Extrayendo clientes…")
-    cli_ex = ClientsExtractor()
-    clientes = cli_ex.run()  # list[dict]
+def _etapa_guardar_bancos(e):
+    info("Guardando movimientos RAW en PulseForge…")
+    return BankWriter().save_many(e["extraer_bancos"])
 
-    info("Guardando clientes RAW en PulseForge…")
-    cli_writer = ClientsWriter()
-    cli_writer.save_many(clientes)
 
-    ok("FASE 1 completada ✔ (BD destino llena con datos RAW)")
+def _etapa_extraer_clientes(_):
+    info("Extrayendo clientes…")
+    return ClientsExtractor().run()  # list[dict]
 
-    # ==================================================
-    #           FASE 2 — PIPELINES / TRANSFORMERS
-    # ==================================================
-    info("=== FASE 2 · PROCESAMIENTO ===")
 
-    pf = PipelineFacturas()
-    df_f = pf.process()
+def _etapa_guardar_clientes(e):
+    info("Guardando clientes RAW en PulseForge…")
+    return ClientsWriter().save_many(e["extraer_clientes"])
+
+
+def _save_rows(writer, rows: list) -> int:
+    n = writer.save_rows(rows)
+    if n is None:
+        raise RunContextError(f"{type(writer).__name__} no confirmó la carga")
+    return n
+
+
+def _etapa_cargar(ctx: RunContext, writer_cls, columnas, tabla: str, fuente: str, e):
+    """
+    Traspaso en memoria: el frame queda en el RunContext para FASE 2
+    y el INSERT se encola en el hilo escritor (segundo plano).
+    """
+    writer = writer_cls()
+    rows = writer.to_rows(e[fuente] or [])
+    ctx.put(tabla, frame_from_rows(columnas, rows))
+    ctx.write(tabla, _save_rows, writer, rows)
+    return len(rows)
+
+
+def _etapa_stream(ctx: RunContext | None, extractor_cls, writer_cls, columnas, tabla: str, _):
+    """
+    Extracción → normalización/hash → INSERT por bloques, solapados en
+    tres hilos con colas acotadas (memoria acotada salvo en modo memoria,
+    donde las filas además quedan en el RunContext).
+    """
+    bloque = get_config().etl.stream_bloque
+    extractor = extractor_cls()
+    writer = writer_cls()
+    acumuladas = [] if ctx is not None else None
+
+    def escribir(rows):
+        if acumuladas is not None:
+            acumuladas.extend(rows)
+        return writer.save_rows(rows)
+
+    n = StreamPipeline(
+        tabla,
+        leer=lambda: extractor.iter_chunks(bloque),
+        transformar=lambda b: writer.to_rows(extractor.transform_chunk(b)),
+        escribir=escribir,
+    ).run()
+
+    if ctx is not None:
+        ctx.put(tabla, frame_from_rows(columnas, acumuladas))
+    return n
+
+
+def _etapa_persistir(ctx: RunContext, _):
+    # Punto durable del modo en memoria: todo lo encolado ya está en SQLite
+    ctx.flush()
+
+
+def _etapa_proc_facturas(ctx, _):
+    df_f = PipelineFacturas(ctx).process()
     ok(f"Facturas procesadas: {len(df_f)}")
+    return len(df_f)
 
-    pb = PipelineBancos()
-    df_b = pb.process()
+
+def _etapa_proc_bancos(ctx, _):
+    df_b = PipelineBancos(ctx).process()
     ok(f"Movimientos procesados: {len(df_b)}")
+    return len(df_b)
+
 
-    pc = PipelineClientes()
-    df_c = pc.process()
+def _etapa_proc_clientes(ctx, _):
+    df_c = PipelineClientes(ctx).process()
     ok(f"Clientes procesados: {len(df_c)}")
+    return len(df_c)
+
+
+def _etapa_match(ctx, _):
+    # Progreso cada N facturas → un --resume continúa donde quedó
+    r = PipelineMatcher(progreso=MatchProgress("full"), ctx=ctx).run()
+    return len(r.get("matches", []))
+
+
+def build_full_graph(
+    motor: str = "pandas",
+    resume: bool = False,
+    ctx: RunContext | None = None,
+    stream: bool = False,
+) -> StageGraph:
+    """
+    FASE 1 (extracción + carga) → FASE 2 (pipelines) → FASE 3 (match).
+    Las ramas facturas / bancos / clientes son independientes hasta el match;
+    toda escritura sobre la BD destino comparte el recurso "bd_destino".
+
+    Cada etapa queda registrada en etapas_pf; con resume=True se saltan las
+    completadas cuya huella (BD origen + motor + dependencias) no cambió.
+
+    Con `ctx` (traspaso en memoria) las fases se pasan DataFrames y las
+    escrituras van en segundo plano; la etapa "persistir" es el punto durable.
+
+    Con `stream` facturas y bancos se extraen/cargan por bloques
+    (lector → transformador → escritor) en una sola etapa cada uno.
+    """
+    BD = ("bd_destino",)
+    memoria = ctx is not None
+    stream = stream and motor != "sql"
+    origen = {
+        "origen": huella_archivo(get_config().db_source),
+        "motor": motor, "memoria": memoria, "stream": stream,
+    }
+    g = StageGraph("full", store=StageStore("full"), resume=resume)
+
+    g.add("reset", _etapa_reset, recursos=BD, durable=True)
+
+    if motor == "sql":
+        g.add("sql_etl", _etapa_sql_etl, deps=["reset"], recursos=BD, durable=True, entrada=origen)
+        cargas = {"facturas": "sql_etl", "bancos": "sql_etl", "clientes": "sql_etl"}
+    else:
+        cargas = {}
+        if stream:
+            g.add("stream_facturas", partial(_etapa_stream, ctx, InvoicesExtractor, InvoiceWriter, COLS_FACTURAS, "facturas_pf"),
+                  deps=["reset"], recursos=BD, durable=not memoria, entrada=origen)
+            g.add("stream_bancos", partial(_etapa_stream, ctx, BankExtractor, BankWriter, COLS_BANCOS, "bancos_pf"),
+                  deps=["reset"], recursos=BD, durable=not memoria, entrada=origen)
+            cargas = {"facturas": "stream_facturas", "bancos": "stream_bancos"}
+
+        g.add("extraer_clientes", _etapa_extraer_clientes, entrada=origen)
+        if not stream:
+            g.add("extraer_facturas", _etapa_extraer_facturas, entrada=origen)
+            g.add("extraer_bancos", _etapa_extraer_bancos, entrada=origen)
+
+        if memoria:
+            guardar = {
+                "facturas": partial(_etapa_cargar, ctx, InvoiceWriter, COLS_FACTURAS, "facturas_pf", "extraer_facturas"),
+                "bancos": partial(_etapa_cargar, ctx, BankWriter, COLS_BANCOS, "bancos_pf", "extraer_bancos"),
+                "clientes": partial(_etapa_cargar, ctx, ClientsWriter, COLS_CLIENTES, "clientes_pf", "extraer_clientes"),
+            }
+        else:
+            guardar = {
+                "facturas": _etapa_guardar_facturas,
+                "bancos": _etapa_guardar_bancos,
+                "clientes": _etapa_guardar_clientes,
+            }
+
+        for ent in ("facturas", "bancos", "clientes"):
+            if ent in cargas:
+                continue
+            g.add(f"guardar_{ent}", guardar[ent], deps=["reset", f"extraer_{ent}"],
+                  recursos=BD, durable=not memoria)
+            cargas[ent] = f"guardar_{ent}"
+
+    g.add("proc_facturas", partial(_etapa_proc_facturas, ctx), deps=[cargas["facturas"]], recursos=BD, durable=not memoria)
+    g.add("proc_bancos", partial(_etapa_proc_bancos, ctx), deps=[cargas["bancos"]], recursos=BD, durable=not memoria)
+    g.add("proc_clientes", partial(_etapa_proc_clientes, ctx), deps=[cargas["clientes"]], recursos=BD, durable=not memoria)
+
+    procs = ["proc_facturas", "proc_bancos", "proc_clientes"]
+    if memoria:
+        g.add("persistir", partial(_etapa_persistir, ctx), deps=procs, durable=True)
+        procs = ["persistir"]
+
+    g.add("match", partial(_etapa_match, ctx), deps=procs, recursos=BD, durable=True)
+    return g
 
-    # ==================================================
-    #              FASE 3 — MATCH
-    # ==================================================
-    info("=== FASE 3 · MATCHING ===")
 
-    pm = PipelineMatcher()
-    pm.run()
+# ======================================================
+#                FULL · ETL COMPLETO
+# ======================================================
+def cmd_full(args):
+    info("=== FULL RUN · PULSEFORGE ===")
+
+    # 1) Configuración
+    cfg = get_config()
+    ok(f"DB origen:  {cfg.db_source}")
+    ok(f"DB destino: {cfg.db_destino}")
+
+    motor = (getattr(args, "engine", None) or cfg.etl.motor or "pandas").lower()
+    info(f"Motor FASE 1 → {motor}")
+
+    resume = bool(getattr(args, "resume", False))
+    if resume:
+        info("Modo --resume → se saltan etapas ya completadas.")
+
+    stream = bool(getattr(args, "stream", False))
+    if stream and motor == "sql":
+        warn("--stream no aplica al motor sql (ya es set-based) → se ignora.")
+
+    memoria = bool(getattr(args, "in_memory", False) or cfg.etl.traspaso_memoria)
+    ctx = RunContext() if memoria else None
+    if memoria:
+        info("Traspaso en memoria entre fases (escritura en segundo plano).")
+
+    # 2) Grafo: reset → extracción/carga → pipelines → match
+    #    Snapshot opcional: vista consistente de la BD origen durante la extracción
+    try:
+        with source_snapshot(cfg.etl.origen_snapshot):
+            build_full_graph(motor, resume=resume, ctx=ctx, stream=stream).run()
+    finally:
+        if ctx is not None:
+            ctx.close()
 
     ok("RUN completado con éxito ✔")
 
@@ -121,8 +291,11 @@ def cmd_incremental(args):
     info("=== INCREMENTAL RUN ===")
     cfg = get_config()
 
-    runner = IncrementalRunner()
-    runner.run()
+    with source_snapshot(cfg.etl.origen_snapshot):
+        runner = IncrementalRunner()
+        if getattr(args, "reset_checkpoints", False):
+            runner.checkpoints.reset()
+        runner.run()
 
     ok("Incremental ejecutado.")
 
@@ -151,6 +324,20 @@ def cmd_rebuild(args):
     ok("BD reconstruida.")
 
 
+# ======================================================
+#        EXPLAIN · AUTOCHEQUEO DE ÍNDICES
+# ======================================================
+def cmd_explain(args):
+    info("=== EXPLAIN · CONSULTAS CALIENTES ===")
+
+    fallos = explain_check()
+    if fallos:
+        raise SchemaError(
+            f"{len(fallos)} consultas calientes sin índice: {', '.join(n for n, _ in fallos)}"
+        )
+    ok("Plan de consultas verificado.")
+
+
 # ======================================================
 #                  STATUS
 # ======================================================
@@ -175,11 +362,36 @@ def build_cli():
 
     sub = parser.add_subparsers(dest="command", required=True)
 
-    sub.add_parser("full", help="Ejecuta ETL completo (extract + load + pipelines + match)").set_defaults(func=cmd_full)
-    sub.add_parser("incremental", help="Ejecuta incremental").set_defaults(func=cmd_incremental)
+    p_full = sub.add_parser("full", help="Ejecuta ETL completo (extract + load + pipelines + match)")
+    p_full.add_argument(
+        "--engine", choices=["pandas", "sql"], default=None,
+        help="Motor de FASE 1 (default: settings.json → etl.motor)"
+    )
+    p_full.add_argument(
+        "--resume", action="store_true",
+        help="Reanuda una corrida interrumpida: salta etapas completadas y continúa el matching"
+    )
+    p_full.add_argument(
+        "--in-memory", action="store_true",
+        help="Pasa los DataFrames entre fases en memoria (default: settings.json → etl.traspaso_memoria)"
+    )
+    p_full.add_argument(
+        "--stream", action="store_true",
+        help="Facturas y bancos por bloques: lectura, transformación y escritura solapadas"
+    )
+    p_full.set_defaults(func=cmd_full)
+    p_inc = sub.add_parser("incremental", help="Ejecuta incremental")
+    p_inc.add_argument(
+        "--reset-checkpoints", action="store_true",
+        help="Olvida los checkpoints de extracción (relee todo el origen)"
+    )
+    p_inc.set_defaults(func=cmd_incremental)
     sub.add_parser("match", help="Ejecuta solo matching").set_defaults(func=cmd_match)
     sub.add_parser("rebuild", help="Reconstruye BD destino").set_defaults(func=cmd_rebuild)
     sub.add_parser("status", help="Estado del sistema").set_defaults(func=cmd_status)
+    sub.add_parser(
+        "explain", help="Migra la BD destino y verifica que las consultas calientes usen índices"
+    ).set_defaults(func=cmd_explain)
 
     return parser
 
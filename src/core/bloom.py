@@ -0,0 +1,119 @@
+# src/core/bloom.py
+from __future__ import annotations
+
+# -------------------------
+# Bootstrap interno
+# -------------------------
+import sys
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import json
+import math
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# =====================================================
+# FILTRO BLOOM (BITSET NUMPY, PERSISTIBLE EN DISCO)
+# =====================================================
+class BloomFilter:
+    """
+    Filtro Bloom sobre source_hash (sha256 hex):
+    - "no está" es definitivo → fila nueva sin consultar la BD
+    - "quizás está" → hay que confirmar contra la BD
+    """
+
+    def __init__(self, capacidad: int, fp: float = 0.01):
+        self.capacidad = max(1, int(capacidad))
+        self.fp = min(max(float(fp), 1e-6), 0.5)
+
+        self.m = max(64, int(-self.capacidad * math.log(self.fp) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / self.capacidad * math.log(2)))
+        self.bits = np.zeros((self.m + 7) // 8, dtype=np.uint8)
+        self.n = 0
+
+    # ---------------------
+    # Índices (doble hashing sobre el propio sha256)
+    # ---------------------
+    @staticmethod
+    def _semillas(hashes: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        h1 = np.empty(len(hashes), dtype=np.uint64)
+        h2 = np.empty(len(hashes), dtype=np.uint64)
+
+        for i, h in enumerate(hashes):
+            h = str(h or "")
+            try:
+                a, b = int(h[0:16], 16), int(h[16:32], 16)
+                if len(h) < 32:
+                    raise ValueError
+            except ValueError:
+                d = hashlib.sha256(h.encode("utf-8")).hexdigest()
+                a, b = int(d[0:16], 16), int(d[16:32], 16)
+            h1[i] = a
+            h2[i] = b | 1
+
+        return h1, h2
+
+    def _indices(self, hashes: List[str]) -> np.ndarray:
+        h1, h2 = self._semillas(hashes)
+        i = np.arange(self.k, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            pos = h1[:, None] + i[None, :] * h2[:, None]
+        return (pos % np.uint64(self.m)).astype(np.int64)
+
+    # ---------------------
+    # API
+    # ---------------------
+    def add_many(self, hashes: Iterable[str]):
+        hashes = list(hashes)
+        if not hashes:
+            return
+        pos = self._indices(hashes).ravel()
+        np.bitwise_or.at(self.bits, pos >> 3, (1 << (pos & 7)).astype(np.uint8))
+        self.n += len(hashes)
+
+    def contains_many(self, hashes: Iterable[str]) -> np.ndarray:
+        hashes = list(hashes)
+        if not hashes:
+            return np.zeros(0, dtype=bool)
+        pos = self._indices(hashes)
+        presentes = (self.bits[pos >> 3] >> (pos & 7).astype(np.uint8)) & 1
+        return presentes.all(axis=1)
+
+    @property
+    def saturado(self) -> bool:
+        return self.n > self.capacidad
+
+    # ---------------------
+    # Persistencia (.npy + .json)
+    # ---------------------
+    def save(self, path: Path, meta: Optional[Dict[str, Any]] = None):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.save(path.with_suffix(".npy"), self.bits, allow_pickle=False)
+        path.with_suffix(".json").write_text(json.dumps({
+            "capacidad": self.capacidad, "fp": self.fp, "m": self.m,
+            "k": self.k, "n": self.n, **(meta or {}),
+        }), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path) -> Tuple[Optional["BloomFilter"], Dict[str, Any]]:
+        path = Path(path)
+        try:
+            meta = json.loads(path.with_suffix(".json").read_text(encoding="utf-8"))
+            bits = np.load(path.with_suffix(".npy"), allow_pickle=False)
+        except Exception:
+            return None, {}
+
+        bloom = cls(meta["capacidad"], meta["fp"])
+        if bloom.m != meta["m"] or bloom.k != meta["k"] or len(bits) != len(bloom.bits):
+            return None, {}
+
+        bloom.bits = bits
+        bloom.n = int(meta.get("n", 0))
+        return bloom, meta
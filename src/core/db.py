@@ -111,6 +111,19 @@ class BaseDB:
             error(f"Error read_query(): {e}")
             raise DatabaseError(e)
 
+    # ---------------------
+    # SELECT → DataFrames por bloques (streaming)
+    # ---------------------
+    def read_chunks(self, query: str, tamano: int):
+        import pandas as pd
+
+        conn = self.connect()
+        try:
+            yield from pd.read_sql_query(query, conn, chunksize=max(1, int(tamano)))
+        except Exception as e:
+            error(f"Error read_chunks(): {e}")
+            raise DatabaseError(e)
+
     # ---------------------
     # SELECT * tabla (con verificación)
     # ---------------------
@@ -143,14 +156,203 @@ class BaseDB:
             raise DatabaseError(e)
 
 
+# =====================================================
+# Snapshot de BD Origen (vista consistente por corrida)
+# =====================================================
+_SNAPSHOT_PATH: Optional[str] = None
+
+
+def _source_uri(path: str, immutable: bool = False) -> str:
+    uri = f"{Path(path).resolve().as_uri()}?mode=ro"
+    return uri + "&immutable=1" if immutable else uri
+
+
+def get_source_path() -> str:
+    """Ruta efectiva de la BD origen: snapshot activo o la BD configurada."""
+    return _SNAPSHOT_PATH or get_config().db_source
+
+
+def get_source_uri() -> str:
+    """URI de solo lectura de la BD origen efectiva (para ATTACH)."""
+    return _source_uri(get_source_path(), immutable=_SNAPSHOT_PATH is not None)
+
+
+# Snapshots ajenos más antiguos que esto se consideran abandonados aunque el pid siga vivo
+_SNAPSHOT_MAX_EDAD_S = 24 * 3600
+
+
+def _pid_activo(pid: int) -> bool:
+    """True si el proceso pid sigue vivo (ante la duda se asume vivo)."""
+    import os
+
+    if pid <= 0:
+        return False
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill(pid, 0) en Windows termina el proceso → se consulta por la API Win32
+        import ctypes
+
+        k32 = ctypes.windll.kernel32
+        h = k32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not h:
+            return False
+        try:
+            code = ctypes.c_ulong()
+            return bool(k32.GetExitCodeProcess(h, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            k32.CloseHandle(h)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+def _limpiar_snapshots(temp_dir: Path):
+    """
+    Borra snapshots huérfanos: los de procesos que ya no existen o los que superan
+    _SNAPSHOT_MAX_EDAD_S. Los de corridas concurrentes vivas no se tocan.
+    """
+    import time
+
+    ahora = time.time()
+    for viejo in temp_dir.glob("source_snapshot_*.sqlite"):
+        partes = viejo.stem.split("_")
+        try:
+            pid = int(partes[4])  # source_snapshot_<fecha>_<hora>_<pid>_<uuid>
+        except (IndexError, ValueError):
+            pid = 0  # formato antiguo sin pid → solo por edad
+        try:
+            huerfano = pid and not _pid_activo(pid)
+            if huerfano or ahora - viejo.stat().st_mtime > _SNAPSHOT_MAX_EDAD_S:
+                viejo.unlink()
+        except Exception:
+            pass  # p.ej. archivo aún abierto en Windows → se reintenta en la próxima corrida
+
+
+def create_source_snapshot() -> str:
+    """
+    Copia la BD origen a un archivo temporal local con la API backup de sqlite3.
+    Todas las SourceDB creadas después leen del snapshot (sin locks sobre producción).
+    El nombre lleva pid + uuid, así corridas concurrentes no se pisan ni se borran.
+    """
+    global _SNAPSHOT_PATH
+    import os
+    import time
+    import uuid
+    from datetime import datetime
+
+    cfg = get_config()
+    temp_dir = Path(cfg.temp_dir)
+    if not temp_dir.is_absolute():
+        temp_dir = ROOT / temp_dir
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    _limpiar_snapshots(temp_dir)
+
+    sello = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+    destino = temp_dir / f"source_snapshot_{sello}.sqlite"
+    info(f"Creando snapshot de BD origen → {destino}")
+
+    t0 = time.perf_counter()
+    src = dst = None
+    try:
+        src = sqlite3.connect(_source_uri(cfg.db_source), uri=True, timeout=10)
+        dst = sqlite3.connect(destino)
+        src.backup(dst)
+    except Exception as e:
+        error(f"No se pudo crear snapshot de BD origen: {e}")
+        raise DatabaseError(e)
+    finally:
+        if dst:
+            dst.close()
+        if src:
+            src.close()
+
+    _SNAPSHOT_PATH = str(destino)
+    mb = destino.stat().st_size / 1_048_576
+    ok(f"Snapshot listo ({mb:.1f} MB en {time.perf_counter() - t0:.2f}s).")
+    return _SNAPSHOT_PATH
+
+
+def release_source_snapshot():
+    global _SNAPSHOT_PATH
+    if not _SNAPSHOT_PATH:
+        return
+
+    try:
+        Path(_SNAPSHOT_PATH).unlink(missing_ok=True)
+        ok(f"Snapshot de BD origen eliminado → {_SNAPSHOT_PATH}")
+    except Exception as e:
+        warn(f"No se pudo eliminar snapshot {_SNAPSHOT_PATH}: {e}")
+    finally:
+        _SNAPSHOT_PATH = None
+
+
+@contextmanager
+def source_snapshot(enabled: bool = True):
+    """Snapshot durante el bloque (no-op si enabled=False)."""
+    if not enabled:
+        yield None
+        return
+
+    path = create_source_snapshot()
+    try:
+        yield path
+    finally:
+        release_source_snapshot()
+
+
 # =====================================================
 # BD Origen
 # =====================================================
 class SourceDB(BaseDB):
-    def __init__(self):
+    def __init__(self, read_only: Optional[bool] = None):
         cfg = get_config()
-        super().__init__(cfg.db_source)
-        info(f"BD Origen configurada: {cfg.db_source}")
+        super().__init__(get_source_path())
+
+        # Snapshot → siempre solo lectura e inmutable (archivo privado de la corrida)
+        self.is_snapshot = _SNAPSHOT_PATH is not None
+        self.read_only = (
+            self.is_snapshot
+            or (cfg.etl.origen_solo_lectura if read_only is None else read_only)
+        )
+        self.mmap_size = cfg.etl.origen_mmap_size
+
+        if self.is_snapshot:
+            info(f"BD Origen configurada (snapshot): {self.db_path}")
+        else:
+            info(f"BD Origen configurada: {cfg.db_source}")
+
+    # ---------------------
+    # Conexión (opcional solo lectura + mmap)
+    # ---------------------
+    def connect(self):
+        if not self.read_only:
+            return super().connect()
+
+        if self.connection:
+            return self.connection
+
+        try:
+            info(f"Conectando SQLite (solo lectura) → {self.db_path}")
+            self.connection = sqlite3.connect(
+                _source_uri(self.db_path, immutable=self.is_snapshot),
+                uri=True,
+                check_same_thread=False,
+                timeout=10
+            )
+            self.connection.execute("PRAGMA query_only = 1")
+            if self.mmap_size > 0:
+                self.connection.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+            ok("Conexión establecida.")
+            return self.connection
+        except Exception as e:
+            error(f"Error al conectar: {e}")
+            raise DatabaseError(e)
 
 
 # =====================================================
@@ -5,7 +5,7 @@ from pathlib import Path
 import os
 import json
 from dataclasses import dataclass, field
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
 
 # ------------------------------------------------------------
 # Bootstrap rutas
@@ -90,6 +90,75 @@ class ParametrosContables:
     monto_variacion: float = 0.0
     tipo_cambio_usd_pen: float = 0.0
 
+    # Tipo de cambio por fecha: CSV local (fecha, tipo_cambio[, moneda]) → tipo_cambio_pf
+    #   vacío = tipo_cambio_usd_pen fijo para todos los movimientos
+    tipo_cambio_csv: str = ""
+
+
+@dataclass
+class ParametrosETL:
+    # Extracción multi-banco: 1 = secuencial (comportamiento clásico)
+    workers_bancos: int = 1
+    normalizar_en_procesos: bool = False
+
+    # Acceso a BD origen: solo lectura + mmap, snapshot opcional por corrida
+    origen_solo_lectura: bool = False
+    origen_mmap_size: int = 268435456  # 256 MB (0 = sin mmap)
+    origen_snapshot: bool = False
+
+    # Motor de FASE 1: "pandas" (extractores + writers) | "sql" (ATTACH + UDFs)
+    motor: str = "pandas"
+
+    # Incremental: checkpoints por tabla origen
+    #   { "<tabla>": {"modo": "auto|rowid|id|timestamp|checksum", "columna": "..."} }
+    checkpoints: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    checkpoint_pagina: int = 1000  # filas por página (modo checksum)
+
+    # Incremental: filtro Bloom en disco como ruta rápida de "hash nuevo"
+    bloom_incremental: bool = False
+    bloom_fp: float = 0.01
+
+    # Ejecución en grafo (DAG): ramas independientes en paralelo
+    dag_workers: int = 4
+    dag_procesos: List[str] = field(default_factory=list)  # etapas a ProcessPool
+
+    # FULL: DataFrames de fase a fase en memoria + escritura en segundo plano
+    traspaso_memoria: bool = False
+
+    # FULL --stream: lector → transformador → escritor con colas acotadas
+    stream_bloque: int = 5000   # filas por bloque de lectura
+    stream_cola: int = 4        # bloques en vuelo por cola (backpressure)
+
+
+@dataclass
+class ParametrosMatching:
+    # Corridas cuyos detalles se conservan en match_detalles_pf (0 = todas)
+    match_runs_conservar: int = 10
+
+    # Reanudación (--resume): progreso del matching cada N facturas (0 = off)
+    match_checkpoint_cada: int = 500
+
+    # Candidatos del matching: "memoria" (bancos_pf en pandas) | "rtree" (R*Tree en disco)
+    match_candidatos: str = "memoria"
+    # "memoria": índice de bancos (BankLedger) persistido en temp_dir y mapeado
+    #   de disco; cada corrida solo prepara los movimientos anexados
+    match_indice_disco: bool = False
+    rtree_bloque: int = 500         # facturas por consulta al R*Tree
+    rtree_ventana_dias: int = 0     # ± días alrededor de la fecha de pago (0 = sin límite)
+
+    # Matcher: similitud de nombre solo sobre movimientos que mencionan al cliente
+    #   "python" (todos los candidatos) | "fts" (FTS5 + BM25 sobre bancos_pf)
+    match_nombres: str = "python"
+    fts_limite: int = 0             # hits por cliente (0 = todos)
+
+    # MatcherEngine por pasadas ordenadas (vacío = bucle clásico por factura)
+    #   p.ej. ["exacta", "referencia", "pareada", "tolerancia", "nombre", "masivo", "fraccionado", "ia"]
+    match_pasadas: List[str] = field(default_factory=list)
+    masivo_candidatos: int = 30     # pasada masivo: facturas por depósito (máx. 40)
+    masivo_max_facturas: int = 8    # pasada masivo: facturas por subconjunto
+    fraccionado_candidatos: int = 20        # pasada fraccionado: movimientos por factura (máx. 40)
+    fraccionado_max_movimientos: int = 3    # pasada fraccionado: movimientos por subconjunto
+
 
 @dataclass
 class PulseForgeConfig:
@@ -110,6 +179,12 @@ class PulseForgeConfig:
     # Parámetros contables
     parametros: ParametrosContables = field(default_factory=ParametrosContables)
 
+    # Parámetros de ejecución ETL
+    etl: ParametrosETL = field(default_factory=ParametrosETL)
+
+    # Parámetros del matching facturas ↔ bancos
+    matching: ParametrosMatching = field(default_factory=ParametrosMatching)
+
     # DataTables
     tablas: Dict[str, str] = field(default_factory=dict)
     tablas_bancos: Dict[str, str] = field(default_factory=dict)
@@ -159,8 +234,69 @@ def get_config() -> PulseForgeConfig:
         dias_tolerancia_pago=parametros_raw.get("dias_tolerancia_pago", 0),
         monto_variacion=parametros_raw.get("monto_variacion", 0.0),
         tipo_cambio_usd_pen=parametros_raw.get("tipo_cambio_usd_pen", 0.0),
+        tipo_cambio_csv=str(parametros_raw.get("tipo_cambio_csv", "") or "").strip(),
+    )
+
+    # -----------------------------
+    # PARAMETROS ETL
+    # -----------------------------
+    etl_raw = settings.get("etl", {})
+    etl = ParametrosETL(
+        workers_bancos=max(1, int(etl_raw.get("workers_bancos", 1) or 1)),
+        normalizar_en_procesos=bool(etl_raw.get("normalizar_en_procesos", False)),
+        origen_solo_lectura=bool(etl_raw.get("origen_solo_lectura", False)),
+        origen_mmap_size=max(0, int(etl_raw.get("origen_mmap_size", 268435456) or 0)),
+        origen_snapshot=bool(etl_raw.get("origen_snapshot", False)),
+        motor=str(etl_raw.get("motor", "pandas") or "pandas").strip().lower(),
+        checkpoints=dict(etl_raw.get("checkpoints", {}) or {}),
+        checkpoint_pagina=max(1, int(etl_raw.get("checkpoint_pagina", 1000) or 1000)),
+        bloom_incremental=bool(etl_raw.get("bloom_incremental", False)),
+        bloom_fp=float(etl_raw.get("bloom_fp", 0.01) or 0.01),
+        dag_workers=max(1, int(etl_raw.get("dag_workers", 4) or 1)),
+        dag_procesos=list(etl_raw.get("dag_procesos", []) or []),
+        traspaso_memoria=bool(etl_raw.get("traspaso_memoria", False)),
+        stream_bloque=max(1, int(etl_raw.get("stream_bloque", 5000) or 5000)),
+        stream_cola=max(1, int(etl_raw.get("stream_cola", 4) or 4)),
     )
 
+    # Compatibilidad: tipo_cambio_csv antes vivía en "etl"
+    if "tipo_cambio_csv" in etl_raw:
+        warn("'etl.tipo_cambio_csv' → muévalo a 'parametros_contables.tipo_cambio_csv'.")
+        if not pc.tipo_cambio_csv:
+            pc.tipo_cambio_csv = str(etl_raw.get("tipo_cambio_csv") or "").strip()
+
+    # -----------------------------
+    # PARAMETROS MATCHING
+    # -----------------------------
+    # Compatibilidad: las claves de matching antes vivían en "etl"
+    match_raw = {k: v for k, v in etl_raw.items() if k in ParametrosMatching.__dataclass_fields__}
+    if match_raw:
+        warn(f"Claves de matching en 'etl' ({', '.join(sorted(match_raw))}) → muévalas a 'matching'.")
+    match_raw.update(settings.get("matching", {}) or {})
+    matching = ParametrosMatching(
+        match_runs_conservar=max(0, int(match_raw.get("match_runs_conservar", 10) or 0)),
+        match_checkpoint_cada=max(0, int(match_raw.get("match_checkpoint_cada", 500) or 0)),
+        match_candidatos=str(match_raw.get("match_candidatos", "memoria") or "memoria").strip().lower(),
+        match_indice_disco=bool(match_raw.get("match_indice_disco", False)),
+        rtree_bloque=max(1, int(match_raw.get("rtree_bloque", 500) or 500)),
+        rtree_ventana_dias=max(0, int(match_raw.get("rtree_ventana_dias", 0) or 0)),
+        match_nombres=str(match_raw.get("match_nombres", "python") or "python").strip().lower(),
+        fts_limite=max(0, int(match_raw.get("fts_limite", 0) or 0)),
+        match_pasadas=[str(p).strip().lower() for p in match_raw.get("match_pasadas", []) or []],
+        masivo_candidatos=min(40, max(2, int(match_raw.get("masivo_candidatos", 30) or 30))),
+        masivo_max_facturas=max(2, int(match_raw.get("masivo_max_facturas", 8) or 8)),
+        fraccionado_candidatos=min(40, max(2, int(match_raw.get("fraccionado_candidatos", 20) or 20))),
+        fraccionado_max_movimientos=max(2, int(match_raw.get("fraccionado_max_movimientos", 3) or 3)),
+    )
+
+    # Las pasadas retiran lo resuelto sobre el libro completo de bancos; el R*Tree
+    # solo entrega candidatos por factura → combinación no soportada
+    if matching.match_pasadas and matching.match_candidatos == "rtree":
+        raise EnvConfigError(
+            "matching.match_pasadas requiere match_candidatos = \"memoria\" "
+            "(con match_indice_disco para no re-preparar bancos_pf en cada corrida)."
+        )
+
     # -----------------------------
     # RUTAS DB
     # -----------------------------
@@ -195,6 +331,8 @@ def get_config() -> PulseForgeConfig:
         db_new=db_new,
 
         parametros=pc,
+        etl=etl,
+        matching=matching,
 
         tablas=settings.get("tablas", {}),
         tablas_bancos=settings.get("tablas_bancos", {}),
@@ -17,7 +17,8 @@ from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_config
 from src.core.utils import (
     normalize_text, clean_amount, parse_date,
-    format_date_yyyymmdd, date_diff_days, clean_ruc
+    format_date_yyyymmdd, date_diff_days, clean_ruc,
+    to_cents, amount_cents, from_cents, pct_cents
 )
 from src.core.validations import (
     validate_system_config,
@@ -139,6 +140,41 @@ def test_utils():
         error(f"Utils ERROR: {e}")
 
 
+# =====================================================
+#   TEST CÉNTIMOS (to_cents / pct_cents / from_cents)
+# =====================================================
+def test_cents():
+    info("🔍 Probando aritmética en céntimos...")
+
+    try:
+        # Medio céntimo: se redondea lejos de cero sobre el decimal escrito
+        # (round(2.675, 2) en float da 2.67 por el binario)
+        montos = ["1.005", 2.675, -1.005, "-2.675", 0.125, "1,234.565"]
+        esperado = [101, 268, -101, -268, 13, 123457]
+        assert to_cents(montos).tolist() == esperado, to_cents(montos).tolist()
+        assert [amount_cents(v) for v in montos] == esperado
+        ok(f"to_cents / amount_cents medio céntimo → {esperado}")
+
+        # Negativos y nulos (NaN / None / texto) → 0, sin romper el int64
+        nulos = to_cents([float("nan"), None, "", -0.0, -10.10])
+        assert str(nulos.dtype) == "int64" and nulos.tolist() == [0, 0, 0, 0, -1010], nulos.tolist()
+        assert amount_cents(float("nan")) == 0 and amount_cents(None) == 0
+        ok("Negativos y nulos → OK")
+
+        # pct_cents: tasa en millonésimas, .5 céntimo lejos de cero
+        assert pct_cents([25, -25, 1000_00, 2542_37], 0.18).tolist() == [5, -5, 180_00, 457_63]
+        assert pct_cents([1180_00, 14567, 0], 0.04).tolist() == [47_20, 583, 0]
+        ok("pct_cents → OK")
+
+        # from_cents: vuelta a float exacta al céntimo
+        assert from_cents([101, -101, 0, 123457]).tolist() == [1.01, -1.01, 0.0, 1234.57]
+        ok("from_cents → OK")
+
+    except Exception as e:
+        error(f"Céntimos ERROR: {e}")
+        raise
+
+
 # =====================================================
 #   TEST VALIDATIONS
 # =====================================================
@@ -171,6 +207,7 @@ if __name__ == "__main__":
     test_db_connections()
     test_real_data()
     test_utils()
+    test_cents()
     test_validations()
 
     ok("=== TEST CORE COMPLETADO ===")
@@ -124,6 +124,119 @@ def clean_amount(value) -> float:
 
 
 
+# =====================================================
+# LIMPIEZA VECTORIZADA DE MONTOS (COLUMNAS COMPLETAS)
+# =====================================================
+def clean_amount_series(values):
+    """
+    Versión columnar de clean_amount():
+    - Recibe una Series (o lista) y devuelve Series float64
+    - Mismas reglas EU/US, símbolos y negativos entre paréntesis
+    - Nulos y valores no parseables → 0.0
+    """
+    import numpy as np
+    import pandas as pd
+
+    s = values if isinstance(values, pd.Series) else pd.Series(values, dtype=object)
+
+    if len(s) == 0:
+        return pd.Series(dtype="float64", index=s.index)
+
+    # Columna 100% numérica → conversión directa
+    if pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_bool_dtype(s.dtype):
+        return s.astype("float64").fillna(0.0)
+
+    s = s.astype(object)
+    out = pd.Series(0.0, index=s.index, dtype="float64")
+
+    # ------------------------------------
+    # 1. Números nativos → float directo
+    # ------------------------------------
+    es_num = s.map(lambda v: isinstance(v, (int, float))).astype(bool)
+    if es_num.any():
+        out[es_num] = pd.to_numeric(s[es_num], errors="coerce").astype("float64")
+
+    # ------------------------------------
+    # 2. Resto → limpieza textual (mismas reglas que clean_amount)
+    # ------------------------------------
+    es_txt = ~es_num & s.notna()
+    if not es_txt.any():
+        return out.fillna(0.0)
+
+    v = s[es_txt].astype(str)
+    v = v.str.normalize("NFKD").str.replace("\u00A0", " ", regex=False).str.strip()
+
+    negative = v.str.contains("(", regex=False) & v.str.contains(")", regex=False)
+    v = v.str.replace("(", "", regex=False).str.replace(")", "", regex=False)
+
+    v = v.str.replace(r"[^\d\.,\-]", "", regex=True)
+    v = v.str.replace("--", "-", regex=False)
+
+    separadores = v.str.count(",") + v.str.count(r"\.")
+    multiple = separadores > 1
+    formato_eu = multiple & (v.str.rfind(",") > v.str.rfind("."))
+    formato_us = multiple & ~formato_eu
+    solo_coma = ~multiple
+
+    v = v.mask(formato_eu, v.str.replace(".", "", regex=False).str.replace(",", ".", regex=False))
+    v = v.mask(formato_us, v.str.replace(",", "", regex=False))
+    v = v.mask(solo_coma, v.str.replace(",", ".", regex=False))
+
+    num = pd.to_numeric(v, errors="coerce").astype("float64")
+    num = num.where(~negative, -num).fillna(0.0)
+
+    out[es_txt] = num.to_numpy(dtype=np.float64)
+    return out.fillna(0.0)
+
+
+# =====================================================
+# MONTOS EN CÉNTIMOS (int64)
+# =====================================================
+def to_cents(values):
+    """
+    Montos → céntimos int64 (Series), con las reglas de clean_amount_series.
+    Redondeo al céntimo, .5 lejos de cero sobre el decimal escrito
+    (1.005 → 101, no 100 por el binario del float). Nulos → 0.
+    """
+    import numpy as np
+    import pandas as pd
+
+    s = clean_amount_series(values)
+    absoluto = np.floor(np.round(np.abs(s.to_numpy(dtype=np.float64)) * 100, 6) + 0.5)
+    return pd.Series(np.sign(s.to_numpy()) * absoluto, index=s.index).astype("int64")
+
+
+def amount_cents(value) -> int:
+    """Versión escalar de to_cents() (mismas reglas que clean_amount)."""
+    v = clean_amount(value)
+    if v != v:  # NaN
+        return 0
+    c = int(round(abs(v) * 100, 6) + 0.5)
+    return -c if v < 0 else c
+
+
+def from_cents(cents):
+    """Céntimos → monto float64 (Series) para escribir / mostrar."""
+    import pandas as pd
+
+    s = cents if isinstance(cents, pd.Series) else pd.Series(cents)
+    return s.astype("int64") / 100
+
+
+def pct_cents(cents, tasa: float):
+    """
+    Porcentaje de un monto en céntimos (IGV, detracción) en aritmética
+    entera: tasa en millonésimas, .5 céntimo lejos de cero. Series int64.
+    """
+    import numpy as np
+    import pandas as pd
+
+    s = cents if isinstance(cents, pd.Series) else pd.Series(cents)
+    c = s.to_numpy(dtype=np.int64)
+    ppm = int(round(float(tasa) * 1_000_000))
+    return pd.Series(np.sign(c) * ((np.abs(c) * ppm + 500_000) // 1_000_000), index=s.index).astype("int64")
+
+
 # =====================================================
 # PARSE UNIVERSAL DE FECHAS
 # =====================================================
@@ -15,7 +15,9 @@ if str(ROOT) not in sys.path:
 # ------------------------------------------------------------
 # Imports principales
 # ------------------------------------------------------------
-from typing import Optional, Dict, List
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Optional, Dict, List, Tuple
 import pandas as pd
 
 from src.core.logger import info, ok, warn, error
@@ -34,7 +36,7 @@ class BankExtractor:
     - Columnas detectadas desde settings.json → columnas_bancos
     """
 
-    def __init__(self) -> None:
+    def __init__(self, checkpoints=None) -> None:
         info("Inicializando BankExtractor…")
 
         cfg = get_config()
@@ -47,6 +49,13 @@ class BankExtractor:
         self.tablas_bancos: Dict[str, str] = cfg.tablas_bancos or {}
         self.cols_bank: Dict[str, List[str]] = cfg.columnas_bancos or {}
 
+        # Concurrencia multi-banco (settings.json → etl)
+        self.workers: int = cfg.etl.workers_bancos
+        self.normalizar_en_procesos: bool = cfg.etl.normalizar_en_procesos
+
+        # Incremental opcional (CheckpointStore) → solo filas nuevas/cambiadas
+        self.checkpoints = checkpoints
+
         if not self.tabla_unica and not self.tablas_bancos:
             error("No hay configuración de bancos en settings.json")
             raise KeyError("Config bancos no encontrada.")
@@ -61,6 +70,9 @@ class BankExtractor:
             info("Modo multi-tablas bancarias activado:")
             for codigo, tabla in self.tablas_bancos.items():
                 info(f"   - {codigo}: {tabla}")
+            if self.workers > 1:
+                info(f"Extracción concurrente → {self.workers} workers"
+                     f"{' (normalización en procesos)' if self.normalizar_en_procesos else ''}")
 
         ok("BankExtractor listo.")
 
@@ -73,12 +85,13 @@ class BankExtractor:
             return ""
         return name.strip().lower().replace(" ", "").replace("_", "")
 
-    def _pick_column(self, df: pd.DataFrame, posibles: List[str]) -> Optional[str]:
+    @classmethod
+    def _pick_column(cls, df: pd.DataFrame, posibles: List[str]) -> Optional[str]:
         if df.empty or not posibles:
             return None
 
-        posibles_norm = [self._normalize_name(p) for p in posibles]
-        cols_norm = {col: self._normalize_name(col) for col in df.columns}
+        posibles_norm = [cls._normalize_name(p) for p in posibles]
+        cols_norm = {col: cls._normalize_name(col) for col in df.columns}
 
         # 1) Match exacto normalizado
         for col, col_norm in cols_norm.items():
@@ -100,10 +113,14 @@ class BankExtractor:
     # --------------------------------------------------------
     # LECTURA DE TABLA ORIGEN
     # --------------------------------------------------------
-    def _read_table(self, table_name: str) -> pd.DataFrame:
+    def _read_table(self, table_name: str, db: Optional[SourceDB] = None) -> pd.DataFrame:
+        db = db or self._db
         try:
-            query = f'SELECT * FROM "{table_name}"'
-            df = self._db.read_query(query)
+            if self.checkpoints is not None:
+                df = self.checkpoints.read_delta(db, table_name)
+            else:
+                query = f'SELECT * FROM "{table_name}"'
+                df = db.read_query(query)
 
             if df.empty:
                 warn(f"Tabla de banco vacía → {table_name}")
@@ -118,35 +135,67 @@ class BankExtractor:
     # PROCESAR Y NORMALIZAR UNA TABLA
     # --------------------------------------------------------
     def _process_table(self, df_raw: pd.DataFrame, codigo_banco: str) -> pd.DataFrame:
-        if df_raw.empty:
-            return pd.DataFrame()
-
-        df_norm = pd.DataFrame()
-
-        # Mapear columnas mediante configuración
-        for campo, opciones in self.cols_bank.items():
-            col = self._pick_column(df_raw, opciones)
+        return _normalize_bank_table(df_raw, codigo_banco, self.cols_bank)
 
-            if not col:
-                warn(f"[{codigo_banco}] Columna no encontrada → {campo} (opciones: {opciones})")
-                df_norm[campo] = None
-                continue
-
-            df_norm[campo] = df_raw[col]
+    # --------------------------------------------------------
+    # UNA TABLA DE BANCO: LECTURA + NORMALIZACIÓN (CON TIEMPOS)
+    # --------------------------------------------------------
+    def _extract_bank(
+        self,
+        codigo: str,
+        tabla: str,
+        db: Optional[SourceDB] = None,
+        pool: Optional[ProcessPoolExecutor] = None,
+    ) -> Tuple[pd.DataFrame, float, float]:
+        t0 = time.perf_counter()
+        df_raw = self._read_table(tabla, db)
+        t_lectura = time.perf_counter() - t0
 
-        # Normalizar monto
-        if "monto" in df_norm.columns:
-            df_norm["monto"] = df_norm["monto"].apply(clean_amount)
+        if df_raw.empty:
+            return pd.DataFrame(), t_lectura, 0.0
 
-        # Normalizar textos
-        for campo in ["descripcion", "tipo_mov", "destinatario", "tipo_documento"]:
-            if campo in df_norm.columns:
-                df_norm[campo] = df_norm[campo].astype(str).apply(normalize_text)
+        t1 = time.perf_counter()
+        if not self.cols_bank:
+            df_norm = df_raw.assign(banco_codigo=codigo)
+        elif pool is not None:
+            df_norm = pool.submit(_normalize_bank_table, df_raw, codigo, self.cols_bank).result()
+        else:
+            df_norm = self._process_table(df_raw, codigo)
+        t_norm = time.perf_counter() - t1
+
+        return df_norm, t_lectura, t_norm
+
+    def _extract_bank_own_conn(
+        self,
+        codigo: str,
+        tabla: str,
+        pool: Optional[ProcessPoolExecutor],
+    ) -> Tuple[pd.DataFrame, float, float]:
+        """Cada hilo abre su propia conexión de solo lectura a la BD origen."""
+        db = SourceDB(read_only=True)
+        try:
+            return self._extract_bank(codigo, tabla, db=db, pool=pool)
+        finally:
+            db.close()
 
-        df_norm["banco_codigo"] = codigo_banco
-        ok(f"[{codigo_banco}] Movimientos normalizados: {len(df_norm)}")
+    # --------------------------------------------------------
+    # MULTI-BANCO CONCURRENTE (orden estable = orden de settings)
+    # --------------------------------------------------------
+    def _extract_concurrent(self) -> Dict[str, Tuple[pd.DataFrame, float, float]]:
+        workers = min(self.workers, len(self.tablas_bancos))
+        info(f"Extrayendo {len(self.tablas_bancos)} tablas de banco en paralelo ({workers} hilos)…")
 
-        return df_norm
+        pool = ProcessPoolExecutor(max_workers=workers) if self.normalizar_en_procesos else None
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bank") as hilos:
+                futuros = {
+                    codigo: hilos.submit(self._extract_bank_own_conn, codigo, tabla, pool)
+                    for codigo, tabla in self.tablas_bancos.items()
+                }
+                return {codigo: fut.result() for codigo, fut in futuros.items()}
+        finally:
+            if pool is not None:
+                pool.shutdown()
 
     # --------------------------------------------------------
     # MÉTODO PRINCIPAL DE EXTRACCIÓN → DEVUELVE DATAFRAME
@@ -174,19 +223,27 @@ class BankExtractor:
             return df_final
 
         # --- Múltiples tablas por banco ---
-        for codigo, tabla in self.tablas_bancos.items():
-            df_raw = self._read_table(tabla)
-            if df_raw.empty:
-                continue
-
-            df_norm = (
-                self._process_table(df_raw, codigo)
-                if self.cols_bank else df_raw.assign(banco_codigo=codigo)
-            )
+        t0 = time.perf_counter()
 
+        if self.workers > 1 and len(self.tablas_bancos) > 1:
+            resultados = self._extract_concurrent()
+        else:
+            resultados = {
+                codigo: self._extract_bank(codigo, tabla)
+                for codigo, tabla in self.tablas_bancos.items()
+            }
+
+        for codigo in self.tablas_bancos:
+            df_norm, t_lectura, t_norm = resultados[codigo]
+            info(
+                f"[{codigo}] ⏱ lectura {t_lectura:.2f}s · normalización {t_norm:.2f}s "
+                f"→ {len(df_norm)} movimientos"
+            )
             if not df_norm.empty:
                 movimientos.append(df_norm)
 
+        info(f"⏱ Extracción multi-banco total: {time.perf_counter() - t0:.2f}s")
+
         if not movimientos:
             warn("No se encontraron movimientos bancarios en ninguna tabla configurada.")
             return pd.DataFrame()
@@ -195,6 +252,36 @@ class BankExtractor:
         ok(f"TOTAL movimientos extraídos (multi-banco): {len(df_final)}")
         return df_final
 
+    # --------------------------------------------------------
+    # STREAMING: bloques crudos + transformación por bloque
+    # --------------------------------------------------------
+    def iter_chunks(self, tamano: int):
+        """(código banco, bloque crudo) con conexión propia (corre en el hilo lector)."""
+        tablas = {"GENERAL": self.tabla_unica} if self.tabla_unica else self.tablas_bancos
+
+        db = SourceDB(read_only=True)
+        try:
+            for codigo, tabla in tablas.items():
+                try:
+                    for df_raw in db.read_chunks(f'SELECT * FROM "{tabla}"', tamano):
+                        yield codigo, df_raw
+                except Exception as e:
+                    warn(f"No se pudo leer tabla '{tabla}': {e}")
+        finally:
+            db.close()
+
+    def transform_chunk(self, bloque: Tuple[str, pd.DataFrame]) -> list[dict]:
+        """Normalización + source_hash de un bloque (mismo camino que run())."""
+        codigo, df_raw = bloque
+        if df_raw.empty:
+            return []
+
+        if self.cols_bank:
+            df = self._process_table(df_raw, codigo)
+        else:
+            df = df_raw.assign(banco_codigo=codigo)
+        return self._df_to_records(df)
+
     # --------------------------------------------------------
     # HASH INTERNO PARA CADA MOVIMIENTO
     # --------------------------------------------------------
@@ -252,3 +339,42 @@ class BankExtractor:
         registros = self._df_to_records(df)
         ok(f"[BankExtractor] Registros preparados para carga: {len(registros)}")
         return registros
+
+
+# ============================================================
+#   NORMALIZACIÓN DE UNA TABLA (función de módulo → picklable)
+# ============================================================
+def _normalize_bank_table(
+    df_raw: pd.DataFrame,
+    codigo_banco: str,
+    cols_bank: Dict[str, List[str]],
+) -> pd.DataFrame:
+    if df_raw.empty:
+        return pd.DataFrame()
+
+    df_norm = pd.DataFrame()
+
+    # Mapear columnas mediante configuración
+    for campo, opciones in cols_bank.items():
+        col = BankExtractor._pick_column(df_raw, opciones)
+
+        if not col:
+            warn(f"[{codigo_banco}] Columna no encontrada → {campo} (opciones: {opciones})")
+            df_norm[campo] = None
+            continue
+
+        df_norm[campo] = df_raw[col]
+
+    # Normalizar monto
+    if "monto" in df_norm.columns:
+        df_norm["monto"] = df_norm["monto"].apply(clean_amount)
+
+    # Normalizar textos
+    for campo in ["descripcion", "tipo_mov", "destinatario", "tipo_documento"]:
+        if campo in df_norm.columns:
+            df_norm[campo] = df_norm[campo].astype(str).apply(normalize_text)
+
+    df_norm["banco_codigo"] = codigo_banco
+    ok(f"[{codigo_banco}] Movimientos normalizados: {len(df_norm)}")
+
+    return df_norm
@@ -29,7 +29,7 @@ from src.core.utils import normalize_text, clean_ruc
 # ============================================================
 class ClientsExtractor:
 
-    def __init__(self) -> None:
+    def __init__(self, checkpoints=None) -> None:
         info("Inicializando ClientsExtractor…")
 
         cfg = get_config()
@@ -44,6 +44,9 @@ class ClientsExtractor:
         self._db = SourceDB()
         self._db.connect()
 
+        # Incremental opcional (CheckpointStore)
+        self.checkpoints = checkpoints
+
     # --------------------------------------------------------
     @staticmethod
     def _norm(name: str) -> str:
@@ -86,8 +89,11 @@ class ClientsExtractor:
             return pd.DataFrame()
 
         try:
-            q = f'SELECT * FROM "{self._tabla_clientes}"'
-            df = self._db.read_query(q)
+            if self.checkpoints is not None:
+                df = self.checkpoints.read_delta(self._db, self._tabla_clientes)
+            else:
+                q = f'SELECT * FROM "{self._tabla_clientes}"'
+                df = self._db.read_query(q)
 
             if df.empty:
                 warn(f"Tabla '{self._tabla_clientes}' vacía.")
@@ -28,13 +28,16 @@ from src.transformers.data_mapper import DataMapper
 # ============================================================
 class InvoicesExtractor:
 
-    def __init__(self):
+    def __init__(self, checkpoints=None):
         info("Inicializando InvoicesExtractor…")
 
         self.cfg = get_config()
         self._db = SourceDB()
         self._db.connect()
 
+        # Incremental opcional (CheckpointStore) → solo filas nuevas/cambiadas
+        self.checkpoints = checkpoints
+
         # Tabla origen
         self._tabla_facturas = self.cfg.tablas.get("facturas")
         if not self._tabla_facturas:
@@ -94,8 +97,11 @@ class InvoicesExtractor:
     # --------------------------------------------------------
     def _load_raw(self) -> pd.DataFrame:
         try:
-            q = f'SELECT * FROM "{self._tabla_facturas}"'
-            df = self._db.read_query(q)
+            if self.checkpoints is not None:
+                df = self.checkpoints.read_delta(self._db, self._tabla_facturas)
+            else:
+                q = f'SELECT * FROM "{self._tabla_facturas}"'
+                df = self._db.read_query(q)
 
             if df.empty:
                 warn(f"Tabla '{self._tabla_facturas}' vacía en BD origen.")
@@ -114,6 +120,7 @@ class InvoicesExtractor:
     # --------------------------------------------------------
     def _normalize_df(self, df_raw: pd.DataFrame) -> pd.DataFrame:
         df = pd.DataFrame()
+        previo = dict(self._col_origen_map)
         self._col_origen_map.clear()
 
         if df_raw.empty:
@@ -137,8 +144,8 @@ class InvoicesExtractor:
             df[campo_std] = df_raw[col_real]
             self._col_origen_map[campo_std] = col_real
 
-        # mostrar mapeo
-        if self._col_origen_map:
+        # mostrar mapeo (una vez por cambio: en streaming se repite por bloque)
+        if self._col_origen_map and self._col_origen_map != previo:
             info("📑 Mapeo columnas facturas:")
             for std, real in self._col_origen_map.items():
                 info(f"   - {std:<15} ⇐ {real}")
@@ -185,6 +192,32 @@ class InvoicesExtractor:
         ok(f"Facturas extraídas + mapeadas: {len(mapped)}")
         return mapped
 
+    # --------------------------------------------------------
+    # STREAMING: bloques crudos + transformación por bloque
+    # --------------------------------------------------------
+    def iter_chunks(self, tamano: int):
+        """Bloques crudos de la tabla origen (conexión propia: corre en el hilo lector)."""
+        db = SourceDB(read_only=True)
+        try:
+            for df_raw in db.read_chunks(f'SELECT * FROM "{self._tabla_facturas}"', tamano):
+                df_raw.columns = [c.strip() for c in df_raw.columns]
+                yield df_raw
+        finally:
+            db.close()
+
+    def transform_chunk(self, df_raw: pd.DataFrame) -> list[dict]:
+        """Mismo camino que extract() aplicado a un bloque."""
+        if df_raw.empty:
+            return []
+
+        df = self._normalize_df(df_raw)
+        if df.empty:
+            return []
+
+        df = self._fix_dates(df)
+        df = self._post_clean(df)
+        return self.mapper.map_facturas(df)
+
     # ============================================================
     #          INTERFAZ ESTÁNDAR PARA PIPELINES → ie.run()
     # ============================================================
@@ -5,6 +5,7 @@ import sqlite3
 from pathlib import Path
 import sys
 import hashlib
+from typing import Optional
 
 # Bootstrap
 ROOT = Path(__file__).resolve().parents[2]
@@ -12,11 +13,18 @@ if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
 from src.core.logger import info, ok, warn, error
-from src.core.env_loader import get_env
+from src.core.env_loader import get_env, get_config
+from src.loaders.migrations import ensure_schema, ensure_rtree, ensure_fts
 
 
 TABLE_NAME = "bancos_pf"
 
+# Columnas en el orden del INSERT (sin id autoincremental)
+COLUMNS = (
+    "source_hash", "fecha", "tipo_mov", "descripcion", "operacion",
+    "destinatario", "tipo_documento", "monto", "moneda", "banco_codigo",
+)
+
 
 # ============================================================
 #              BANK WRITER · PULSEFORGE 2025
@@ -58,35 +66,19 @@ class BankWriter:
     #            CREAR TABLA (si no existe)
     # ============================================================
     def _ensure_table(self):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-
         info("[BankWriter] Verificando tabla pf_bank_movs…")
 
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_hash TEXT UNIQUE,
-                fecha TEXT,
-                tipo_mov TEXT,
-                descripcion TEXT,
-                operacion TEXT,
-                destinatario TEXT,
-                tipo_documento TEXT,
-                monto REAL,
-                moneda TEXT,
-                banco_codigo TEXT
-            );
-        """)
-
-        # Índices críticos para performance del match
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_bank_hash  ON {TABLE_NAME}(source_hash);")
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_bank_oper  ON {TABLE_NAME}(operacion);")
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_bank_banco ON {TABLE_NAME}(banco_codigo);")
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_bank_fecha ON {TABLE_NAME}(fecha);")
-
-        conn.commit()
-        conn.close()
+        # DDL e índices: migraciones versionadas (src/loaders/migrations.py)
+        ensure_schema(self.db_path)
+
+        # Candidatos de matching desde disco: R*Tree mantenido por triggers
+        matching = get_config().matching
+        if matching.match_candidatos == "rtree":
+            ensure_rtree(self.db_path)
+
+        # Búsqueda por nombre de cliente en descripciones: FTS5 + triggers
+        if matching.match_nombres == "fts":
+            ensure_fts(self.db_path)
 
         ok("[BankWriter] Tabla lista ✔")
 
@@ -107,59 +99,72 @@ class BankWriter:
 
         return True
 
+    # ============================================================
+    #               REGISTROS → FILAS (tal cual se insertan)
+    # ============================================================
+    def to_rows(self, movimientos: list[dict]) -> list[tuple]:
+        """Valida, completa source_hash y devuelve tuplas en el orden de COLUMNS."""
+        rows = []
+
+        for m in movimientos:
+
+            if not self._validate_mov(m):
+                continue
+
+            # 🚀 Generar hash si no viene del extractor
+            if not m.get("source_hash"):
+                m["source_hash"] = self._make_hash(m)
+
+            rows.append((
+                m["source_hash"],
+                m.get("fecha"),
+                m.get("tipo_mov"),
+                m.get("descripcion"),
+                m.get("operacion"),
+                m.get("destinatario"),
+                m.get("tipo_documento"),
+                m.get("monto", 0.0),
+                m.get("moneda"),
+                m.get("banco_codigo"),
+            ))
+
+        return rows
+
     # ============================================================
     #                GUARDAR LISTA DE MOVIMIENTOS
     # ============================================================
-    def save_many(self, movimientos: list[dict]):
+    def save_many(self, movimientos: list[dict]) -> Optional[int]:
         if not movimientos:
             warn("[BankWriter] No hay movimientos para guardar.")
-            return
+            return 0
+
+        return self.save_rows(self.to_rows(movimientos))
 
+    def save_rows(self, rows: list[tuple]) -> Optional[int]:
+        """INSERT OR REPLACE de filas ya preparadas con to_rows()."""
         conn = sqlite3.connect(self.db_path)
+        # REPLACE borra la fila previa: así dispara el trigger de borrado del R*Tree
+        conn.execute("PRAGMA recursive_triggers = ON")
         cur = conn.cursor()
 
-        info(f"[BankWriter] Guardando {len(movimientos)} movimientos…")
+        info(f"[BankWriter] Guardando {len(rows)} movimientos…")
 
         try:
             sql = f"""
-                INSERT OR REPLACE INTO {TABLE_NAME} (
-                    source_hash, fecha, tipo_mov, descripcion, operacion,
-                    destinatario, tipo_documento, monto, moneda, banco_codigo
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+                INSERT OR REPLACE INTO {TABLE_NAME} ({", ".join(COLUMNS)})
+                VALUES ({", ".join("?" for _ in COLUMNS)});
             """
 
-            validos = 0
-
-            for m in movimientos:
-
-                if not self._validate_mov(m):
-                    continue
-
-                # 🚀 Generar hash si no viene del extractor
-                if not m.get("source_hash"):
-                    m["source_hash"] = self._make_hash(m)
-
-                cur.execute(sql, (
-                    m["source_hash"],
-                    m.get("fecha"),
-                    m.get("tipo_mov"),
-                    m.get("descripcion"),
-                    m.get("operacion"),
-                    m.get("destinatario"),
-                    m.get("tipo_documento"),
-                    m.get("monto", 0.0),
-                    m.get("moneda"),
-                    m.get("banco_codigo"),
-                ))
-
-                validos += 1
+            cur.executemany(sql, rows)
 
             conn.commit()
-            ok(f"[BankWriter] ✔ Movimientos insertados: {validos}")
+            ok(f"[BankWriter] ✔ Movimientos insertados: {len(rows)}")
+            return len(rows)
 
         except Exception as e:
             conn.rollback()
             error(f"[BankWriter] ❌ Error guardando movimientos → {e}")
+            return None
 
         finally:
             conn.close()
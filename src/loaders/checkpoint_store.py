@@ -0,0 +1,288 @@
+# src/loaders/checkpoint_store.py
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+import sys
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+# Bootstrap
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import pandas as pd
+
+from src.core.logger import info, ok, warn, error
+from src.core.env_loader import get_env, get_config
+from src.loaders.migrations import ensure_schema
+
+
+TABLE_NAME = "checkpoints_pf"
+MODOS = ("rowid", "id", "timestamp", "checksum")
+
+# Columna técnica con la marca de agua (se retira antes de mapear)
+MARCA = "__pf_marca"
+
+
+def _q(nombre: str) -> str:
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+# ============================================================
+#           CHECKPOINTS DE EXTRACCIÓN · PULSEFORGE 2025
+# ============================================================
+class CheckpointStore:
+    """
+    Marca de agua por tabla origen, guardada en la BD PulseForge.
+
+    Modos (settings.json → etl.checkpoints):
+        • rowid      → filas con rowid > último visto (altas)
+        • id         → columna monótona > último valor (altas)
+        • timestamp  → columna fecha/hora >= último valor (altas + cambios)
+        • checksum   → hash por página de N filas; solo páginas distintas
+        • auto       → timestamp si la regla trae 'columna', si no checksum
+                       (rowid/id sólo ven altas: hay que pedirlos explícitamente
+                       para tablas de solo inserción)
+
+    Los nuevos checkpoints quedan pendientes hasta commit(), que el
+    runner llama sólo cuando los writers guardaron bien.
+    """
+
+    def __init__(self):
+        db_path = str(get_env("PULSEFORGE_NEWDB_PATH")).strip()
+
+        if not db_path:
+            raise ValueError("[Checkpoints] ❌ Falta PULSEFORGE_NEWDB_PATH en .env")
+
+        self.db_path = Path(db_path)
+        cfg = get_config()
+        self.reglas: Dict[str, Dict[str, str]] = cfg.etl.checkpoints or {}
+        self.pagina: int = cfg.etl.checkpoint_pagina
+
+        self._ensure_table()
+        self._estado: Dict[str, Dict[str, Any]] = self._load()
+        self._pendiente: Dict[str, Dict[str, Any]] = {}
+
+    # ============================================================
+    #              CREAR TABLA SI NO EXISTE
+    # ============================================================
+    def _ensure_table(self):
+        ensure_schema(self.db_path)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT tabla, modo, columna, valor, paginas FROM {TABLE_NAME}"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        estado = {}
+        for tabla, modo, columna, valor, paginas in rows:
+            estado[tabla] = {
+                "modo": modo,
+                "columna": columna,
+                "valor": json.loads(valor) if valor else None,
+                "paginas": json.loads(paginas) if paginas else [],
+            }
+
+        if estado:
+            info(f"[Checkpoints] {len(estado)} tablas con checkpoint previo.")
+        return estado
+
+    # ============================================================
+    #              RESOLVER MODO POR TABLA
+    # ============================================================
+    @staticmethod
+    def _tiene_rowid(conn: sqlite3.Connection, tabla: str) -> bool:
+        row = conn.execute(
+            "SELECT type, sql FROM sqlite_master WHERE name = ?", (tabla,)
+        ).fetchone()
+        if not row or row[0] != "table":
+            return False
+        return "WITHOUT ROWID" not in (row[1] or "").upper()
+
+    def _regla(self, conn: sqlite3.Connection, tabla: str) -> tuple[str, Optional[str]]:
+        regla = self.reglas.get(tabla) or {}
+        modo = str(regla.get("modo", "auto") or "auto").lower()
+        columna = regla.get("columna")
+
+        if modo in ("id", "timestamp") and not columna:
+            warn(f"[Checkpoints] '{tabla}' en modo {modo} sin 'columna' → auto.")
+            modo = "auto"
+
+        if modo == "rowid" and not self._tiene_rowid(conn, tabla):
+            warn(f"[Checkpoints] '{tabla}' no tiene rowid → checksum.")
+            modo = "checksum"
+
+        if modo not in MODOS:
+            # Facturas y movimientos se actualizan en origen → un modo que detecte cambios
+            modo = "timestamp" if columna else "checksum"
+
+        return modo, columna if modo in ("id", "timestamp") else None
+
+    # ============================================================
+    #              LECTURA DELTA (API PARA EXTRACTORES)
+    # ============================================================
+    def read_delta(self, db, tabla: str) -> pd.DataFrame:
+        """
+        SELECT * de la tabla origen, limitado a lo nuevo / cambiado
+        desde el último checkpoint confirmado.
+        """
+        conn = db.connect()
+        modo, columna = self._regla(conn, tabla)
+
+        previo = self._estado.get(tabla)
+        if previo and (previo["modo"] != modo or previo["columna"] != columna):
+            warn(f"[Checkpoints] '{tabla}' cambió de modo ({previo['modo']} → {modo}) → lectura completa.")
+            previo = None
+
+        if modo == "checksum":
+            df = self._read_checksum(conn, tabla, previo)
+        else:
+            df = self._read_watermark(conn, tabla, modo, columna, previo)
+
+        if df.empty:
+            info(f"[Checkpoints] '{tabla}' sin cambios desde el último checkpoint.")
+        else:
+            ok(f"[Checkpoints] '{tabla}' ({modo}) → {len(df)} filas nuevas/cambiadas.")
+        return df
+
+    def _read_watermark(
+        self,
+        conn: sqlite3.Connection,
+        tabla: str,
+        modo: str,
+        columna: Optional[str],
+        previo: Optional[Dict[str, Any]],
+    ) -> pd.DataFrame:
+        marca = "_rowid_" if modo == "rowid" else _q(columna)
+        operador = ">=" if modo == "timestamp" else ">"
+        valor = previo["valor"] if previo else None
+
+        sql = f"SELECT {marca} AS {MARCA}, * FROM {_q(tabla)}"
+        params: tuple = ()
+        if valor is not None:
+            sql += f" WHERE {marca} {operador} ?"
+            params = (valor,)
+        sql += f" ORDER BY {marca}"
+
+        df = pd.read_sql_query(sql, conn, params=params)
+        marcas = df.pop(MARCA)
+
+        nuevo = marcas.dropna().max() if not marcas.dropna().empty else valor
+        if hasattr(nuevo, "item"):
+            nuevo = nuevo.item()  # numpy → tipo nativo (json)
+
+        self._pendiente[tabla] = {
+            "modo": modo, "columna": columna, "valor": nuevo,
+            "paginas": [], "filas": len(df),
+        }
+        return df
+
+    def _orden_checksum(self, conn: sqlite3.Connection, tabla: str) -> str:
+        if self._tiene_rowid(conn, tabla):
+            return " ORDER BY _rowid_"
+
+        pk = sorted(
+            (r[5], r[1]) for r in conn.execute(f"PRAGMA table_info({_q(tabla)})") if r[5]
+        )
+        if pk:
+            return " ORDER BY " + ", ".join(_q(c) for _, c in pk)
+        return ""  # vistas: orden de recorrido
+
+    def _read_checksum(
+        self,
+        conn: sqlite3.Connection,
+        tabla: str,
+        previo: Optional[Dict[str, Any]],
+    ) -> pd.DataFrame:
+        paginas_previas: List[str] = previo["paginas"] if previo else []
+
+        cur = conn.execute(f"SELECT * FROM {_q(tabla)}{self._orden_checksum(conn, tabla)}")
+        columnas = [d[0] for d in cur.description]
+
+        paginas: List[str] = []
+        cambiadas: List[tuple] = []
+
+        while True:
+            filas = cur.fetchmany(self.pagina)
+            if not filas:
+                break
+
+            h = hashlib.sha1(repr(filas).encode("utf-8")).hexdigest()
+            n = len(paginas)
+            if n >= len(paginas_previas) or paginas_previas[n] != h:
+                cambiadas.extend(filas)
+            paginas.append(h)
+
+        self._pendiente[tabla] = {
+            "modo": "checksum", "columna": None, "valor": None,
+            "paginas": paginas, "filas": len(cambiadas),
+        }
+        return pd.DataFrame.from_records(cambiadas, columns=columnas, coerce_float=True)
+
+    # ============================================================
+    #              CONFIRMAR / REINICIAR
+    # ============================================================
+    def commit(self, tablas: Optional[Iterable[str]] = None):
+        """Persiste los checkpoints pendientes (todas o sólo `tablas`)."""
+        objetivo = list(self._pendiente) if tablas is None else [
+            t for t in tablas if t in self._pendiente
+        ]
+        if not objetivo:
+            return
+
+        ahora = datetime.now().isoformat(timespec="seconds")
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.executemany(
+                f"""
+                INSERT OR REPLACE INTO {TABLE_NAME}
+                    (tabla, modo, columna, valor, paginas, filas, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?, ?);
+                """,
+                [
+                    (
+                        t,
+                        self._pendiente[t]["modo"],
+                        self._pendiente[t]["columna"],
+                        json.dumps(self._pendiente[t]["valor"], default=str),
+                        json.dumps(self._pendiente[t]["paginas"]),
+                        self._pendiente[t]["filas"],
+                        ahora,
+                    )
+                    for t in objetivo
+                ],
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            error(f"[Checkpoints] ❌ Error guardando checkpoints → {e}")
+            raise
+        finally:
+            conn.close()
+
+        for t in objetivo:
+            self._estado[t] = self._pendiente.pop(t)
+        ok(f"[Checkpoints] ✔ Checkpoints confirmados: {', '.join(objetivo)}")
+
+    def reset(self, tabla: Optional[str] = None):
+        """Olvida checkpoints (una tabla o todas) → próxima lectura completa."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if tabla:
+                conn.execute(f"DELETE FROM {TABLE_NAME} WHERE tabla = ?", (tabla,))
+                self._estado.pop(tabla, None)
+            else:
+                conn.execute(f"DELETE FROM {TABLE_NAME}")
+                self._estado.clear()
+            conn.commit()
+        finally:
+            conn.close()
+        warn(f"[Checkpoints] Reiniciados → {tabla or 'todas las tablas'}")
@@ -5,6 +5,7 @@ import sqlite3
 from pathlib import Path
 import sys
 import hashlib
+from typing import Optional
 
 # Bootstrap dinámico
 ROOT = Path(__file__).resolve().parents[2]
@@ -13,10 +14,14 @@ if str(ROOT) not in sys.path:
 
 from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_env
+from src.loaders.migrations import ensure_schema
 
 
 TABLE_NAME = "clientes_pf"
 
+# Columnas en el orden del INSERT (sin id autoincremental)
+COLUMNS = ("source_hash", "ruc", "razon_social")
+
 
 # ============================================================
 #              CLIENT WRITER · PULSEFORGE 2025
@@ -39,26 +44,10 @@ class ClientsWriter:
     #               CREAR TABLA BASE
     # ============================================================
     def _ensure_table(self):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-
         info("[ClientsWriter] Verificando tabla pf_clients…")
 
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_hash TEXT UNIQUE,
-                ruc TEXT,
-                razon_social TEXT
-            );
-        """)
-
-        # Índices críticos para búsquedas por RUC
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_cli_hash ON {TABLE_NAME}(source_hash);")
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_cli_ruc  ON {TABLE_NAME}(ruc);")
-
-        conn.commit()
-        conn.close()
+        # DDL e índices: migraciones versionadas (src/loaders/migrations.py)
+        ensure_schema(self.db_path)
 
         ok("[ClientsWriter] Tabla lista ✔")
 
@@ -85,51 +74,63 @@ class ClientsWriter:
 
         return True
 
+    # ============================================================
+    #               REGISTROS → FILAS (tal cual se insertan)
+    # ============================================================
+    def to_rows(self, clientes: list[dict]) -> list[tuple]:
+        """Valida, completa source_hash y devuelve tuplas en el orden de COLUMNS."""
+        rows = []
+
+        for c in clientes:
+
+            if not self._validate_cliente(c):
+                continue
+
+            # 🚀 Generar hash si no existe
+            if not c.get("source_hash"):
+                c["source_hash"] = self._make_hash(c)
+
+            rows.append((
+                c["source_hash"],
+                c["ruc"],
+                c["razon_social"],
+            ))
+
+        return rows
+
     # ============================================================
     #               GUARDADO MASIVO
     # ============================================================
-    def save_many(self, clientes: list[dict]):
+    def save_many(self, clientes: list[dict]) -> Optional[int]:
         if not clientes:
             warn("[ClientsWriter] No hay clientes para guardar.")
-            return
+            return 0
+
+        return self.save_rows(self.to_rows(clientes))
 
+    def save_rows(self, rows: list[tuple]) -> Optional[int]:
+        """INSERT OR REPLACE de filas ya preparadas con to_rows()."""
         conn = sqlite3.connect(self.db_path)
         cur = conn.cursor()
 
-        info(f"[ClientsWriter] Guardando {len(clientes)} clientes…")
+        info(f"[ClientsWriter] Guardando {len(rows)} clientes…")
 
         try:
             sql = f"""
-                INSERT OR REPLACE INTO {TABLE_NAME} (
-                    source_hash, ruc, razon_social
-                ) VALUES (?, ?, ?);
+                INSERT OR REPLACE INTO {TABLE_NAME} ({", ".join(COLUMNS)})
+                VALUES ({", ".join("?" for _ in COLUMNS)});
             """
 
-            validos = 0
-
-            for c in clientes:
-
-                if not self._validate_cliente(c):
-                    continue
-
-                # 🚀 Generar hash si no existe
-                if not c.get("source_hash"):
-                    c["source_hash"] = self._make_hash(c)
-
-                cur.execute(sql, (
-                    c["source_hash"],
-                    c["ruc"],
-                    c["razon_social"],
-                ))
-
-                validos += 1
+            cur.executemany(sql, rows)
 
             conn.commit()
-            ok(f"[ClientsWriter] ✔ Clientes guardados: {validos}")
+            ok(f"[ClientsWriter] ✔ Clientes guardados: {len(rows)}")
+            return len(rows)
 
         except Exception as e:
             conn.rollback()
             error(f"[ClientsWriter] ❌ Error guardando clientes → {e}")
+            return None
 
         finally:
             conn.close()
@@ -5,6 +5,7 @@ import sqlite3
 from pathlib import Path
 import sys
 import hashlib
+from typing import Optional
 
 # Bootstrap
 ROOT = Path(__file__).resolve().parents[2]
@@ -13,10 +14,18 @@ if str(ROOT) not in sys.path:
 
 from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_env
+from src.loaders.migrations import ensure_schema
 
 
 TABLE_NAME = "facturas_pf"
 
+# Columnas en el orden del INSERT (sin id autoincremental)
+COLUMNS = (
+    "source_hash", "ruc", "cliente_generador", "serie", "numero", "combinada",
+    "fecha_emision", "vencimiento", "subtotal", "igv", "total",
+    "estado_fs", "estado_cont", "fue_cobrado", "match_id",
+)
+
 
 # ============================================================
 #                INVOICE WRITER · PULSEFORGE 2025
@@ -39,38 +48,10 @@ class InvoiceWriter:
     #              CREAR TABLA E ÍNDICES SI NO EXISTEN
     # ============================================================
     def _ensure_table(self):
-        conn = sqlite3.connect(self.db_path)
-        cur = conn.cursor()
-
         info("[InvoiceWriter] Verificando tabla pf_invoices…")
 
-        cur.execute(f"""
-            CREATE TABLE IF NOT EXISTS {TABLE_NAME} (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                source_hash TEXT UNIQUE,
-                ruc TEXT,
-                cliente_generador TEXT,
-                serie TEXT,
-                numero TEXT,
-                combinada TEXT,
-                fecha_emision TEXT,
-                vencimiento TEXT,
-                subtotal REAL,
-                igv REAL,
-                total REAL,
-                estado_fs TEXT,
-                estado_cont TEXT,
-                fue_cobrado INTEGER,
-                match_id TEXT
-            );
-        """)
-
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_inv_hash      ON {TABLE_NAME}(source_hash);")
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_inv_serie_num ON {TABLE_NAME}(serie, numero);")
-        cur.execute(f"CREATE INDEX IF NOT EXISTS idx_inv_ruc       ON {TABLE_NAME}(ruc);")
-
-        conn.commit()
-        conn.close()
+        # DDL e índices: migraciones versionadas (src/loaders/migrations.py)
+        ensure_schema(self.db_path)
 
         ok("[InvoiceWriter] Tabla lista ✔")
 
@@ -107,65 +88,76 @@ class InvoiceWriter:
         return True
 
 
+    # ============================================================
+    #               REGISTROS → FILAS (tal cual se insertan)
+    # ============================================================
+    def to_rows(self, facturas: list[dict]) -> list[tuple]:
+        """Valida, completa source_hash y devuelve tuplas en el orden de COLUMNS."""
+        rows = []
+
+        for f in facturas:
+
+            if not self._validate_factura(f):
+                continue
+
+            # 🚀 Generar hash automático si no existe
+            if not f.get("source_hash"):
+                f["source_hash"] = self._make_hash(f)
+
+            rows.append((
+                f["source_hash"],
+                f["ruc"],
+                f.get("cliente_generador"),
+                f.get("serie"),
+                f.get("numero"),
+                f.get("combinada"),
+                str(f["fecha_emision"]) if f.get("fecha_emision") else None,
+                str(f["vencimiento"]) if f.get("vencimiento") else None,
+                f.get("subtotal"),
+                f.get("igv"),
+                f.get("total"),
+                f.get("estado_fs"),
+                f.get("estado_cont"),
+                f.get("fue_cobrado", 0),
+                f.get("match_id")
+            ))
+
+        return rows
+
+
     # ============================================================
     #                     GUARDAR MUCHAS FACTURAS
     # ============================================================
-    def save_many(self, facturas: list[dict]):
+    def save_many(self, facturas: list[dict]) -> Optional[int]:
         if not facturas:
             warn("[InvoiceWriter] No hay facturas para guardar.")
-            return
+            return 0
+
+        return self.save_rows(self.to_rows(facturas))
 
+    def save_rows(self, rows: list[tuple]) -> Optional[int]:
+        """INSERT OR REPLACE de filas ya preparadas con to_rows()."""
         conn = sqlite3.connect(self.db_path)
         cur = conn.cursor()
 
-        info(f"[InvoiceWriter] Guardando {len(facturas)} facturas…")
+        info(f"[InvoiceWriter] Guardando {len(rows)} facturas…")
 
         try:
             sql = f"""
-                INSERT OR REPLACE INTO {TABLE_NAME} (
-                    source_hash, ruc, cliente_generador, serie, numero, combinada,
-                    fecha_emision, vencimiento, subtotal, igv, total,
-                    estado_fs, estado_cont, fue_cobrado, match_id
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?);
+                INSERT OR REPLACE INTO {TABLE_NAME} ({", ".join(COLUMNS)})
+                VALUES ({", ".join("?" for _ in COLUMNS)});
             """
 
-            validas = 0
-
-            for f in facturas:
-
-                if not self._validate_factura(f):
-                    continue
-
-                # 🚀 Generar hash automático si no existe
-                if not f.get("source_hash"):
-                    f["source_hash"] = self._make_hash(f)
-
-                cur.execute(sql, (
-                    f["source_hash"],
-                    f["ruc"],
-                    f.get("cliente_generador"),
-                    f.get("serie"),
-                    f.get("numero"),
-                    f.get("combinada"),
-                    str(f["fecha_emision"]) if f.get("fecha_emision") else None,
-                    str(f["vencimiento"]) if f.get("vencimiento") else None,
-                    f.get("subtotal"),
-                    f.get("igv"),
-                    f.get("total"),
-                    f.get("estado_fs"),
-                    f.get("estado_cont"),
-                    f.get("fue_cobrado", 0),
-                    f.get("match_id")
-                ))
-
-                validas += 1
+            cur.executemany(sql, rows)
 
             conn.commit()
-            ok(f"[InvoiceWriter] ✔ Facturas guardadas: {validas}")
+            ok(f"[InvoiceWriter] ✔ Facturas guardadas: {len(rows)}")
+            return len(rows)
 
         except Exception as e:
             conn.rollback()
             error(f"[InvoiceWriter] ❌ Error guardando facturas → {e}")
+            return None
 
         finally:
             conn.close()
@@ -5,7 +5,7 @@ import sys
 import sqlite3
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 import pandas as pd
 
@@ -18,11 +18,35 @@ if str(ROOT) not in sys.path:
 
 from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_config
+from src.loaders.migrations import ensure_schema
 
 
 MATCH_TABLE = "match_pf"
 FACT_TABLE = "facturas_pf"
 BANK_TABLE = "bancos_pf"
+RUNS_TABLE = "match_runs_pf"
+DETALLE_TABLE = "match_detalles_pf"
+DETALLE_VIEW = "match_detalles_tmp"   # compatibilidad: detalles de la última corrida
+
+# Columnas de detalle que produce MatcherEngine
+DETALLE_COLUMNS = (
+    "factura_id", "movimiento_id", "monto_factura", "monto_banco",
+    "variacion_monto", "fecha_mov", "banco_pago", "operacion",
+    "descripcion_banco", "score_similitud", "razon_ia", "tipo_monto_match",
+)
+
+# Columnas de match_pf que escribe una corrida (clave de par primero)
+_MATCH_COLUMNS = (
+    ("factura_hash", "TEXT"), ("banco_hash", "TEXT"), ("cliente_hash", "TEXT"),
+    ("tipo_monto_match", "TEXT"), ("monto_factura", "REAL"), ("monto_banco", "REAL"),
+    ("diferencia", "REAL"), ("porcentaje_match", "REAL"), ("estado", "TEXT"),
+    ("fecha_match", "TEXT"),
+)
+# Un par se reescribe solo si cambia alguna de estas
+_CAMBIO_COLUMNS = (
+    "cliente_hash", "tipo_monto_match", "monto_factura", "monto_banco",
+    "diferencia", "porcentaje_match", "estado",
+)
 
 
 # ============================================================
@@ -55,79 +79,180 @@ class MatchWriter:
         info("Inicializando MatchWriter…")
         self.cfg = get_config()
         self.db_path = _get_db_path()
+        self.resumen: Dict[str, int] = {}   # conteos del último upsert (save_run / save_matches)
         info(f"[MatchWriter] BD PulseForge configurada: {self.db_path}")
-        self._fact_hash_map: Dict[Any, str] = {}
-        self._bank_hash_map: Dict[Any, str] = {}
 
     # ------------------------------------------------------
-    #  Creación de tabla (segura)
+    #  Esquema (match_pf, corridas, detalles): migraciones versionadas
     # ------------------------------------------------------
     def _ensure_table(self, conn: sqlite3.Connection) -> None:
-        sql = f"""
-        CREATE TABLE IF NOT EXISTS {MATCH_TABLE} (
-            id               INTEGER PRIMARY KEY AUTOINCREMENT,
-            factura_hash     TEXT,
-            banco_hash       TEXT,
-            cliente_hash     TEXT,
-            tipo_monto_match TEXT,
-            monto_factura    REAL,
-            monto_banco      REAL,
-            diferencia       REAL,
-            porcentaje_match REAL,
-            estado           TEXT,
-            fecha_match      TEXT
-        );
-        """
-        conn.execute(sql)
-        conn.commit()
+        ensure_schema(self.db_path)
         ok(f"[MatchWriter] Tabla {MATCH_TABLE} verificada/creada.")
 
     # ------------------------------------------------------
-    #  Cargar hash maps
+    #  Columnas de entrada (tolerantes a ausencias)
     # ------------------------------------------------------
-    def _load_hash_maps(self, conn: sqlite3.Connection) -> None:
+    @staticmethod
+    def _num(df: pd.DataFrame, col: str) -> pd.Series:
+        if col not in df.columns:
+            return pd.Series(float("nan"), index=df.index)
+        return pd.to_numeric(df[col], errors="coerce")
+
+    @classmethod
+    def _primero(cls, df: pd.DataFrame, cols: List[str]) -> pd.Series:
+        """Primer valor numérico no nulo y distinto de cero (equivale a `a or b or c`)."""
+        out = pd.Series(float("nan"), index=df.index)
+        for col in cols:
+            vacio = out.isna() | (out == 0)
+            out = out.where(~vacio, cls._num(df, col))
+        return out
 
-        # Facturas
-        try:
-            df_fact = pd.read_sql_query(
-                f"SELECT id, source_hash FROM {FACT_TABLE}", conn
-            )
-            self._fact_hash_map = (
-                df_fact.dropna(subset=["id"])
-                .set_index("id")["source_hash"]
-                .dropna()
-                .astype(str)
-                .to_dict()
+    # =======================================================
+    #  FILAS match_pf · hashes resueltos en SQL (JOIN por id)
+    # =======================================================
+    def _stage_matches(self, conn: sqlite3.Connection, df_match: pd.DataFrame) -> None:
+        """
+        Deja la corrida en temp.pf_match_run (clave de par; si un par se
+        repite gana el mayor score). Solo viajan ids + valores: los hashes
+        de factura/banco salen de un JOIN contra facturas_pf / bancos_pf,
+        con el respaldo FAC:<id> / BANK:<id> si el id no existe.
+        """
+        conn.execute(f"""
+            CREATE TEMP TABLE IF NOT EXISTS pf_match_run (
+                {", ".join(f"{c} {t}" for c, t in _MATCH_COLUMNS)},
+                PRIMARY KEY (factura_hash, banco_hash)
             )
-            ok(f"[MatchWriter] Hashes facturas cargados ({len(self._fact_hash_map)})")
-        except Exception as e:
-            warn(f"[MatchWriter] No se pudieron cargar hashes de facturas: {e}")
-            self._fact_hash_map = {}
+        """)
+        conn.execute("DELETE FROM temp.pf_match_run")
 
-        # Bancos
-        try:
-            df_bank = pd.read_sql_query(
-                f"SELECT id, source_hash FROM {BANK_TABLE}", conn
+        if df_match is None or df_match.empty:
+            return
+
+        df = df_match
+        factura_id = self._num(df, "factura_id")
+        factura_id = factura_id.where(factura_id.notna() & (factura_id != 0), self._num(df, "id"))
+
+        monto_factura = self._primero(df, ["monto_factura", "total_final", "total_con_igv"]).fillna(0.0)
+        monto_banco = self._primero(df, ["monto_banco_equivalente", "monto_banco"]).fillna(0.0)
+        diferencia = self._primero(df, ["variacion_monto"])
+        diferencia = diferencia.where(diferencia.notna() & (diferencia != 0), monto_factura - monto_banco)
+
+        estado = df.get("match_tipo", pd.Series(None, index=df.index, dtype=object))
+        estado = estado.where(estado.notna() & (estado.astype(str) != ""), "NO_MATCH")
+
+        filas = pd.DataFrame({
+            "factura_id": factura_id.astype("Int64"),
+            "movimiento_id": self._num(df, "movimiento_id").astype("Int64"),
+            "factura_hash": df.get("factura_hash"),
+            "banco_hash": df.get("banco_hash"),
+            "cliente_hash": df.get("cliente_hash"),
+            "tipo_monto_match": df.get("tipo_monto_match"),
+            "monto_factura": monto_factura,
+            "monto_banco": monto_banco,
+            "diferencia": diferencia.fillna(0.0),
+            "porcentaje_match": self._num(df, "score_similitud").fillna(0.0),
+            "estado": estado.astype(str).str.upper(),
+        }, index=df.index)
+        filas = filas.astype(object).where(filas.notna(), None)
+
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS pf_match_ids (
+                factura_id INTEGER, movimiento_id INTEGER,
+                factura_hash TEXT, banco_hash TEXT, cliente_hash TEXT,
+                tipo_monto_match TEXT, monto_factura REAL, monto_banco REAL,
+                diferencia REAL, porcentaje_match REAL, estado TEXT
             )
-            self._bank_hash_map = (
-                df_bank.dropna(subset=["id"])
-                .set_index("id")["source_hash"]
-                .dropna()
-                .astype(str)
-                .to_dict()
+        """)
+        conn.execute("DELETE FROM temp.pf_match_ids")
+        conn.executemany(
+            f"INSERT INTO temp.pf_match_ids VALUES ({', '.join('?' for _ in filas.columns)})",
+            filas.itertuples(index=False, name=None),
+        )
+
+        cols = ", ".join(c for c, _ in _MATCH_COLUMNS)
+        conn.execute(
+            f"""
+            INSERT INTO temp.pf_match_run ({cols})
+            SELECT
+                COALESCE(t.factura_hash, f.source_hash, 'FAC:' || IFNULL(t.factura_id, '')),
+                COALESCE(t.banco_hash, b.source_hash, 'BANK:' || IFNULL(t.movimiento_id, '')),
+                t.cliente_hash, t.tipo_monto_match, t.monto_factura, t.monto_banco,
+                t.diferencia, t.porcentaje_match, t.estado, ?
+            FROM temp.pf_match_ids t
+            LEFT JOIN {FACT_TABLE} f ON f.id = t.factura_id
+            LEFT JOIN {BANK_TABLE} b ON b.id = t.movimiento_id
+            WHERE true
+            ON CONFLICT (factura_hash, banco_hash) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c, _ in _MATCH_COLUMNS[2:])}
+            WHERE excluded.porcentaje_match > porcentaje_match
+            """,
+            (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),),
+        )
+        conn.execute("DELETE FROM temp.pf_match_ids")
+
+    def _insert_matches(self, conn: sqlite3.Connection, df_match: pd.DataFrame,
+                        run_id: Optional[int] = None) -> Dict[str, int]:
+        """Upsert de matches sobre `conn` (sin commit: lo decide el llamador)."""
+        self._stage_matches(conn, df_match)
+        return self._upsert_run(conn, run_id)
+
+    # =======================================================
+    #  UPSERT POR PAR (factura_hash, banco_hash) · SOLO CAMBIOS
+    # =======================================================
+    def _upsert_run(self, conn: sqlite3.Connection, run_id: Optional[int] = None) -> Dict[str, int]:
+        """
+        Aplica temp.pf_match_run sobre match_pf:
+        - pares nuevos → INSERT
+        - pares cuyo score/estado/montos cambiaron → UPDATE (run_id nuevo)
+        - pares iguales → no se escriben
+        - con run_id: pares vigentes ausentes en esta corrida → vigente = 0
+        """
+        cols = ", ".join(c for c, _ in _MATCH_COLUMNS)
+
+        nuevos = conn.execute(f"""
+            SELECT COUNT(*) FROM temp.pf_match_run n
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {MATCH_TABLE} m
+                WHERE m.factura_hash = n.factura_hash AND m.banco_hash = n.banco_hash
             )
-            ok(f"[MatchWriter] Hashes bancos cargados ({len(self._bank_hash_map)})")
-        except Exception as e:
-            warn(f"[MatchWriter] No se pudieron cargar hashes de bancos: {e}")
-            self._bank_hash_map = {}
+        """).fetchall()[0][0]
+
+        antes = conn.total_changes
+        conn.execute(
+            f"""
+            INSERT INTO {MATCH_TABLE} ({cols}, run_id, vigente)
+            SELECT {cols}, ?, 1 FROM temp.pf_match_run WHERE true
+            ON CONFLICT (factura_hash, banco_hash) DO UPDATE SET
+                {", ".join(f"{c} = excluded.{c}" for c, _ in _MATCH_COLUMNS[2:])},
+                run_id  = excluded.run_id,
+                vigente = 1
+            WHERE vigente IS NOT 1
+               OR {" OR ".join(f"{c} IS NOT excluded.{c}" for c in _CAMBIO_COLUMNS)}
+            """,
+            (run_id,),
+        )
+        escritos = conn.total_changes - antes
+
+        superados = 0
+        if run_id is not None:
+            superados = conn.execute(
+                f"""
+                UPDATE {MATCH_TABLE} SET vigente = 0, run_id = ?
+                WHERE vigente = 1 AND NOT EXISTS (
+                    SELECT 1 FROM temp.pf_match_run n
+                    WHERE n.factura_hash = {MATCH_TABLE}.factura_hash
+                      AND n.banco_hash = {MATCH_TABLE}.banco_hash
+                )
+                """,
+                (run_id,),
+            ).rowcount
 
-    # ------------------------------------------------------
-    @staticmethod
-    def _safe_float(v) -> float:
-        try:
-            return float(v)
-        except Exception:
-            return 0.0
+        return {
+            "pares": conn.execute("SELECT COUNT(*) FROM temp.pf_match_run").fetchall()[0][0],
+            "nuevos": nuevos,
+            "actualizados": escritos - nuevos,
+            "superados": superados,
+        }
 
     # =======================================================
     #  🔥 API PRINCIPAL — save_matches(df)
@@ -144,98 +269,134 @@ class MatchWriter:
         conn = _get_connection()
         try:
             self._ensure_table(conn)
-            self._load_hash_maps(conn)
-
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            rows_to_insert = []
-
-            for _, row in df_match.iterrows():
-                factura_id = row.get("factura_id") or row.get("id")
-                mov_id = row.get("movimiento_id")
-
-                # ----------------------------
-                # HASH FACTURA
-                # ----------------------------
-                if pd.notna(row.get("factura_hash")):
-                    factura_hash = str(row.get("factura_hash"))
-                elif factura_id in self._fact_hash_map:
-                    factura_hash = self._fact_hash_map[factura_id]
-                else:
-                    factura_hash = f"FAC:{factura_id}"
-
-                # ----------------------------
-                # HASH BANCO
-                # ----------------------------
-                if pd.notna(row.get("banco_hash")):
-                    banco_hash = str(row.get("banco_hash"))
-                elif mov_id in self._bank_hash_map:
-                    banco_hash = self._bank_hash_map[mov_id]
-                else:
-                    banco_hash = f"BANK:{mov_id}"
-
-                cliente_hash = row.get("cliente_hash")
-                tipo_monto_match = row.get("tipo_monto_match")
-
-                monto_factura = self._safe_float(
-                    row.get("monto_factura")
-                    or row.get("total_final")
-                    or row.get("total_con_igv")
-                )
+            n = self._insert_matches(conn, df_match)
+            conn.commit()
+            self.resumen = n
 
-                monto_banco = self._safe_float(
-                    row.get("monto_banco_equivalente")
-                    or row.get("monto_banco")
-                )
+            ok(f"[MatchWriter] {MATCH_TABLE}: {n['nuevos']} nuevos · "
+               f"{n['actualizados']} actualizados · {n['pares'] - n['nuevos'] - n['actualizados']} sin cambios.")
 
-                diferencia = self._safe_float(
-                    row.get("variacion_monto") or (monto_factura - monto_banco)
-                )
+        except Exception as e:
+            conn.rollback()
+            error(f"[MatchWriter] Error guardando matches: {e}")
+            raise
+        finally:
+            conn.close()
 
-                porcentaje_match = self._safe_float(row.get("score_similitud"))
-                estado = str(row.get("match_tipo") or "NO_MATCH").upper()
-
-                rows_to_insert.append(
-                    (
-                        factura_hash,
-                        banco_hash,
-                        cliente_hash,
-                        tipo_monto_match,
-                        monto_factura,
-                        monto_banco,
-                        diferencia,
-                        porcentaje_match,
-                        estado,
-                        now_str,
-                    )
-                )
+    # =======================================================
+    #  CORRIDAS + DETALLES (append-only, particionado por run_id)
+    # =======================================================
+    @staticmethod
+    def _detalle_rows(run_id: int, df: pd.DataFrame) -> List[tuple]:
+        df = df.reindex(columns=list(DETALLE_COLUMNS))
+        for col in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+        df = df.astype(object).where(df.notna(), None)
+        return [(run_id, *fila) for fila in df.itertuples(index=False, name=None)]
+
+    def _mark_paid(self, conn: sqlite3.Connection, df_match: pd.DataFrame) -> int:
+        """fue_cobrado/match_id en un solo UPDATE unido a una TEMP de ids."""
+        df_ok = df_match[df_match["match_tipo"] == "MATCH"]
+        if "factura_hash" not in df_ok.columns:
+            df_ok = df_ok.assign(factura_hash=None)
+
+        pagadas = [
+            (int(fid), fh if pd.notna(fh) else None)
+            for fid, fh in zip(df_ok["factura_id"], df_ok["factura_hash"])
+            if pd.notna(fid) and fid
+        ]
+
+        conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS pf_pagadas (factura_id INTEGER PRIMARY KEY, match_id TEXT)"
+        )
+        conn.execute("DELETE FROM temp.pf_pagadas")
+        conn.executemany("INSERT OR REPLACE INTO temp.pf_pagadas VALUES (?, ?)", pagadas)
+        conn.execute(f"""
+            UPDATE {FACT_TABLE}
+            SET fue_cobrado = 1,
+                match_id = (SELECT p.match_id FROM temp.pf_pagadas p WHERE p.factura_id = {FACT_TABLE}.id)
+            WHERE id IN (SELECT factura_id FROM temp.pf_pagadas)
+        """)
+        return len(df_ok)
+
+    def save_run(self, df_match: pd.DataFrame, df_detalles: pd.DataFrame) -> int:
+        """
+        Una corrida de matching en UNA transacción:
+        match_pf + facturas cobradas + detalles (run_id nuevo). Devuelve run_id.
+        """
+        df_match = df_match if df_match is not None else pd.DataFrame()
+        df_detalles = df_detalles if df_detalles is not None else pd.DataFrame()
 
-            sql_insert = f"""
-            INSERT INTO {MATCH_TABLE} (
-                factura_hash,
-                banco_hash,
-                cliente_hash,
-                tipo_monto_match,
-                monto_factura,
-                monto_banco,
-                diferencia,
-                porcentaje_match,
-                estado,
-                fecha_match
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
-
-            conn.executemany(sql_insert, rows_to_insert)
-            conn.commit()
+        conn = _get_connection()
+        try:
+            self._ensure_table(conn)
 
-            ok(f"[MatchWriter] Insertados {len(rows_to_insert)} registros en {MATCH_TABLE}.")
+            fecha = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            run_id = conn.execute(
+                f"INSERT INTO {RUNS_TABLE} (fecha) VALUES (?)", (fecha,)
+            ).lastrowid
+
+            # Sin matches → todo lo vigente queda superado
+            n = self._insert_matches(conn, df_match, run_id)
+            n_match = n["pares"]
+            n_pagadas = self._mark_paid(conn, df_match) if not df_match.empty else 0
+
+            detalles = self._detalle_rows(run_id, df_detalles) if not df_detalles.empty else []
+            conn.executemany(
+                f"INSERT INTO {DETALLE_TABLE} (run_id, {', '.join(DETALLE_COLUMNS)}) "
+                f"VALUES ({', '.join('?' for _ in range(len(DETALLE_COLUMNS) + 1))})",
+                detalles,
+            )
+
+            conn.execute(
+                f"UPDATE {RUNS_TABLE} SET matches = ?, detalles = ?, pagadas = ? WHERE run_id = ?",
+                (n_match, len(detalles), n_pagadas, run_id),
+            )
+            conn.commit()
+            self.resumen = n
 
         except Exception as e:
             conn.rollback()
-            error(f"[MatchWriter] Error guardando matches: {e}")
+            error(f"[MatchWriter] Error guardando corrida de matching: {e}")
             raise
         finally:
             conn.close()
 
+        info(f"[MatchWriter] {MATCH_TABLE}: {n['nuevos']} nuevos · {n['actualizados']} actualizados · "
+             f"{n['superados']} superados · {n_match - n['nuevos'] - n['actualizados']} sin cambios.")
+        ok(f"[MatchWriter] Corrida {run_id}: {n_match} matches · "
+           f"{n_pagadas} facturas cobradas · {len(detalles)} detalles.")
+
+        conservar = self.cfg.matching.match_runs_conservar
+        if conservar > 0:
+            self.prune_runs(conservar)
+        return run_id
+
+    def prune_runs(self, conservar: int) -> int:
+        """Borra los detalles de corridas antiguas (se conservan las últimas N)."""
+        conn = _get_connection()
+        try:
+            self._ensure_table(conn)
+            corte = conn.execute(
+                f"SELECT run_id FROM {RUNS_TABLE} ORDER BY run_id DESC LIMIT 1 OFFSET ?",
+                (max(1, int(conservar)) - 1,),
+            ).fetchall()
+            if not corte:
+                return 0
+
+            borradas = conn.execute(
+                f"DELETE FROM {DETALLE_TABLE} WHERE run_id < ?", (corte[0][0],)
+            ).rowcount
+            conn.execute(f"DELETE FROM {RUNS_TABLE} WHERE run_id < ?", (corte[0][0],))
+            conn.commit()
+        finally:
+            conn.close()
+
+        if borradas:
+            info(f"[MatchWriter] Podadas {borradas} filas de detalle (corridas < {corte[0][0]}).")
+        return borradas
+
     # =======================================================
     #  🔄 RETROCOMPATIBILIDAD — save_many(records)
     # =======================================================
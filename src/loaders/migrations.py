@@ -0,0 +1,557 @@
+# src/loaders/migrations.py
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+import sys
+from typing import Callable, List, Optional, Tuple
+
+# Bootstrap
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src.core.logger import info, ok, warn, error
+from src.core.env_loader import get_env
+
+
+# ============================================================
+#  EXCEPCIÓN
+# ============================================================
+class SchemaError(Exception):
+    pass
+
+
+def _db_path() -> Path:
+    db_path = str(get_env("PULSEFORGE_NEWDB_PATH")).strip()
+    if not db_path:
+        raise ValueError("[Schema] ❌ Falta PULSEFORGE_NEWDB_PATH en .env")
+    path = Path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _columnas(conn: sqlite3.Connection, tabla: str) -> set:
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({tabla})").fetchall()}
+
+
+# ============================================================
+#  v1 · TABLAS BASE + ÍNDICES DE BÚSQUEDA
+# ============================================================
+def _v1_base(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS bancos_pf (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_hash TEXT UNIQUE,
+            fecha TEXT,
+            tipo_mov TEXT,
+            descripcion TEXT,
+            operacion TEXT,
+            destinatario TEXT,
+            tipo_documento TEXT,
+            monto REAL,
+            moneda TEXT,
+            banco_codigo TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS clientes_pf (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_hash TEXT UNIQUE,
+            ruc TEXT,
+            razon_social TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS facturas_pf (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_hash TEXT UNIQUE,
+            ruc TEXT,
+            cliente_generador TEXT,
+            serie TEXT,
+            numero TEXT,
+            combinada TEXT,
+            fecha_emision TEXT,
+            vencimiento TEXT,
+            subtotal REAL,
+            igv REAL,
+            total REAL,
+            estado_fs TEXT,
+            estado_cont TEXT,
+            fue_cobrado INTEGER,
+            match_id TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS calculos_pf (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            factura_hash TEXT,
+            subtotal REAL,
+            igv REAL,
+            total_con_igv REAL,
+            detraccion REAL,
+            total_sin_detraccion REAL,
+            total_final REAL,
+            dias_credito INTEGER,
+            fecha_pago TEXT,
+            variacion REAL
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_pf (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            factura_hash TEXT,
+            banco_hash TEXT,
+            cliente_hash TEXT,
+            tipo_monto_match TEXT,
+            monto_factura REAL,
+            monto_banco REAL,
+            diferencia REAL,
+            porcentaje_match REAL,
+            estado TEXT,
+            fecha_match TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS auditoria_pf (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            evento TEXT,
+            detalle TEXT,
+            fecha TEXT
+        );
+    """)
+
+    # source_hash ya tiene índice propio por UNIQUE → no se duplica
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inv_serie_num ON facturas_pf(serie, numero);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inv_ruc       ON facturas_pf(ruc);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bank_oper     ON bancos_pf(operacion);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bank_banco    ON bancos_pf(banco_codigo);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_bank_fecha    ON bancos_pf(fecha);")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_cli_ruc       ON clientes_pf(ruc);")
+
+
+# ============================================================
+#  v2 · TABLAS DE CONTROL (checkpoints, etapas, corridas)
+# ============================================================
+def _v2_control(conn: sqlite3.Connection):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS checkpoints_pf (
+            tabla TEXT PRIMARY KEY,
+            modo TEXT,
+            columna TEXT,
+            valor TEXT,
+            paginas TEXT,
+            filas INTEGER,
+            actualizado TEXT
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS etapas_pf (
+            grafo TEXT,
+            etapa TEXT,
+            huella TEXT,
+            salida TEXT,
+            duracion REAL,
+            actualizado TEXT,
+            PRIMARY KEY (grafo, etapa)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_progreso_pf (
+            grafo TEXT,
+            lote INTEGER,
+            huella TEXT,
+            posicion INTEGER,
+            matches BLOB,
+            detalles BLOB,
+            actualizado TEXT,
+            PRIMARY KEY (grafo, lote)
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_runs_pf (
+            run_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+            fecha    TEXT,
+            matches  INTEGER,
+            detalles INTEGER,
+            pagadas  INTEGER
+        );
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS match_detalles_pf (
+            run_id            INTEGER NOT NULL,
+            factura_id        INTEGER,
+            movimiento_id     INTEGER,
+            monto_factura     REAL,
+            monto_banco       REAL,
+            variacion_monto   REAL,
+            fecha_mov         TEXT,
+            banco_pago        TEXT,
+            operacion         TEXT,
+            descripcion_banco TEXT,
+            score_similitud   REAL,
+            razon_ia          TEXT,
+            tipo_monto_match  TEXT
+        );
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_det_run ON match_detalles_pf(run_id);")
+
+    # La antigua tabla temporal pasa a ser una vista de la última corrida
+    tipo = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'match_detalles_tmp'"
+    ).fetchall()
+    if tipo and tipo[0][0] == "table":
+        conn.execute("DROP TABLE match_detalles_tmp")
+    conn.execute("""
+        CREATE VIEW IF NOT EXISTS match_detalles_tmp AS
+        SELECT factura_id, movimiento_id, monto_factura, monto_banco,
+               variacion_monto, fecha_mov, banco_pago, operacion,
+               descripcion_banco, score_similitud, razon_ia, tipo_monto_match
+        FROM match_detalles_pf
+        WHERE run_id = (SELECT MAX(run_id) FROM match_runs_pf);
+    """)
+
+
+# ============================================================
+#  v3 · match_pf: clave única por par + versión de corrida
+# ============================================================
+def _v3_match_pares(conn: sqlite3.Connection):
+    columnas = _columnas(conn, "match_pf")
+    if "run_id" not in columnas:
+        conn.execute("ALTER TABLE match_pf ADD COLUMN run_id INTEGER")
+    if "vigente" not in columnas:
+        conn.execute("ALTER TABLE match_pf ADD COLUMN vigente INTEGER DEFAULT 1")
+
+    borradas = conn.execute("""
+        DELETE FROM match_pf
+        WHERE id NOT IN (SELECT MAX(id) FROM match_pf GROUP BY factura_hash, banco_hash)
+    """).rowcount
+    if borradas:
+        warn(f"[Schema] match_pf: {borradas} pares duplicados eliminados.")
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_match_par ON match_pf(factura_hash, banco_hash);"
+    )
+
+
+# ============================================================
+#  v4 · ÍNDICES DE RUTA CALIENTE (auditoría EXPLAIN QUERY PLAN)
+# ============================================================
+def _v4_indices_match(conn: sqlite3.Connection):
+    # PipelineMatcher._load_data: facturas_pf ⋈ calculos_pf por hash
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_calc_factura ON calculos_pf(factura_hash);")
+
+    # match_pf por banco (por factura ya lo cubre ux_match_par)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_match_banco ON match_pf(banco_hash);")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_match_vigente
+        ON match_pf(factura_hash, banco_hash) WHERE vigente = 1;
+    """)
+
+    # Facturas cobradas / abiertas (parcial: solo las pendientes de cobro)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_inv_cobrado ON facturas_pf(fue_cobrado);")
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_inv_abiertas
+        ON facturas_pf(fecha_emision) WHERE fue_cobrado = 0;
+    """)
+
+    # Duplicados del autoíndice UNIQUE(source_hash) creados por los writers
+    for idx in ("idx_inv_hash", "idx_bank_hash", "idx_cli_hash"):
+        conn.execute(f"DROP INDEX IF EXISTS {idx};")
+
+
+# ============================================================
+#  v5 · TIPO DE CAMBIO POR FECHA
+# ============================================================
+def _v5_tipo_cambio(conn: sqlite3.Connection):
+    # Una tasa por moneda y día; la PK (moneda, fecha) es el índice de la serie
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS tipo_cambio_pf (
+            moneda TEXT NOT NULL,
+            fecha TEXT NOT NULL,
+            tipo_cambio REAL NOT NULL,
+            PRIMARY KEY (moneda, fecha)
+        ) WITHOUT ROWID;
+    """)
+
+
+# Orden = versión (PRAGMA user_version). Solo se agregan al final.
+MIGRATIONS: List[Tuple[str, Callable[[sqlite3.Connection], None]]] = [
+    ("tablas base + índices de búsqueda", _v1_base),
+    ("tablas de control (checkpoints, etapas, corridas de match)", _v2_control),
+    ("match_pf con clave única por par y versión", _v3_match_pares),
+    ("índices de ruta caliente del matching", _v4_indices_match),
+    ("tipo de cambio por fecha (tipo_cambio_pf)", _v5_tipo_cambio),
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+# ============================================================
+#  APLICAR MIGRACIONES PENDIENTES
+# ============================================================
+def migrate(db_path: Optional[Path] = None) -> int:
+    """
+    Lleva la BD a SCHEMA_VERSION. Cada migración corre en su propia
+    transacción (BEGIN IMMEDIATE → dos procesos no migran a la vez)
+    junto con el PRAGMA user_version. Devuelve la versión final.
+    """
+    db_path = Path(db_path) if db_path else _db_path()
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        version = conn.execute("PRAGMA user_version").fetchall()[0][0]
+        if version >= SCHEMA_VERSION:
+            return version
+
+        for i, (descripcion, fn) in enumerate(MIGRATIONS, start=1):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Otro proceso pudo migrar mientras esperábamos el lock
+                version = conn.execute("PRAGMA user_version").fetchall()[0][0]
+                if i <= version:
+                    conn.execute("COMMIT")
+                    continue
+                fn(conn)
+                conn.execute(f"PRAGMA user_version = {i}")
+                conn.execute("COMMIT")
+                info(f"[Schema] v{i} aplicada → {descripcion}")
+            except Exception as e:
+                conn.execute("ROLLBACK")
+                error(f"[Schema] ❌ Migración v{i} ({descripcion}) → {e}")
+                raise SchemaError(f"Migración v{i} falló: {e}") from e
+
+        ok(f"[Schema] BD en versión {SCHEMA_VERSION} → {db_path}")
+        return SCHEMA_VERSION
+    finally:
+        conn.close()
+
+
+def ensure_schema(db_path: Optional[Path] = None) -> int:
+    """Punto único para writers/stores: no-op barato si la BD ya está al día."""
+    return migrate(db_path)
+
+
+# ============================================================
+#  EXTENSIONES OPCIONALES (fuera de user_version)
+# ============================================================
+RTREE_TABLE = "bancos_rtree"
+
+# Caja de cada movimiento: monto en su propia moneda (+usd marca los que
+# Calculator convierte con tipo_cambio) y fecha como ordinal gregoriano
+# (= date.toordinal()). Un cambio de tipo de cambio no invalida el índice.
+_RTREE_VALORES = """
+    {r}.id,
+    COALESCE(CAST({r}.monto AS REAL), 0), COALESCE(CAST({r}.monto AS REAL), 0),
+    COALESCE(julianday({r}.fecha) - 1721424.5, 0), COALESCE(julianday({r}.fecha) - 1721424.5, 0),
+    (UPPER(COALESCE({r}.moneda, '')) LIKE '%USD%' OR UPPER(COALESCE({r}.moneda, '')) LIKE '%DOL%')
+"""
+
+
+def ensure_rtree(db_path: Optional[Path] = None) -> bool:
+    """
+    R*Tree (monto × fecha) sobre bancos_pf + triggers que lo mantienen.
+    Opcional (matching.match_candidatos = "rtree"): si SQLite no trae el módulo
+    rtree devuelve False y el matching sigue en memoria.
+    """
+    db_path = Path(db_path) if db_path else _db_path()
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (RTREE_TABLE,)
+        ).fetchall()
+        if existe:
+            return True
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {RTREE_TABLE} USING rtree(
+                    id, monto_min, monto_max, fecha_min, fecha_max, +usd
+                )
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_bancos_rtree_ins AFTER INSERT ON bancos_pf
+                BEGIN
+                    INSERT OR REPLACE INTO {RTREE_TABLE} VALUES ({_RTREE_VALORES.format(r="NEW")});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_bancos_rtree_upd
+                AFTER UPDATE OF monto, fecha, moneda ON bancos_pf
+                BEGIN
+                    INSERT OR REPLACE INTO {RTREE_TABLE} VALUES ({_RTREE_VALORES.format(r="NEW")});
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_bancos_rtree_del AFTER DELETE ON bancos_pf
+                BEGIN
+                    DELETE FROM {RTREE_TABLE} WHERE id = OLD.id;
+                END
+            """)
+            n = conn.execute(
+                f"INSERT INTO {RTREE_TABLE} SELECT {_RTREE_VALORES.format(r='b')} FROM bancos_pf b"
+            ).rowcount
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            conn.execute("ROLLBACK")
+            warn(f"[Schema] R*Tree no disponible en este SQLite → {e}")
+            return False
+
+        ok(f"[Schema] Índice {RTREE_TABLE} creado ({n} movimientos).")
+        return True
+    finally:
+        conn.close()
+
+
+FTS_TABLE = "bancos_fts"
+
+
+def ensure_fts(db_path: Optional[Path] = None) -> bool:
+    """
+    FTS5 (contenido externo = bancos_pf) sobre descripcion/destinatario +
+    triggers. unicode61 con remove_diacritics 2 pliega mayúsculas y tildes
+    como utils.normalize_text, y parte en letras/dígitos igual que
+    FTSNameCandidates.terminos(). Opcional: sin FTS5 devuelve False.
+    """
+    db_path = Path(db_path) if db_path else _db_path()
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    try:
+        existe = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = ?", (FTS_TABLE,)
+        ).fetchall()
+        if existe:
+            return True
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+                    descripcion, destinatario,
+                    content = 'bancos_pf', content_rowid = 'id',
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_bancos_fts_ins AFTER INSERT ON bancos_pf
+                BEGIN
+                    INSERT INTO {FTS_TABLE} (rowid, descripcion, destinatario)
+                    VALUES (NEW.id, NEW.descripcion, NEW.destinatario);
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_bancos_fts_del AFTER DELETE ON bancos_pf
+                BEGIN
+                    INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, descripcion, destinatario)
+                    VALUES ('delete', OLD.id, OLD.descripcion, OLD.destinatario);
+                END
+            """)
+            conn.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_bancos_fts_upd
+                AFTER UPDATE OF descripcion, destinatario ON bancos_pf
+                BEGIN
+                    INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, descripcion, destinatario)
+                    VALUES ('delete', OLD.id, OLD.descripcion, OLD.destinatario);
+                    INSERT INTO {FTS_TABLE} (rowid, descripcion, destinatario)
+                    VALUES (NEW.id, NEW.descripcion, NEW.destinatario);
+                END
+            """)
+            conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError as e:
+            conn.execute("ROLLBACK")
+            warn(f"[Schema] FTS5 no disponible en este SQLite → {e}")
+            return False
+
+        ok(f"[Schema] Índice {FTS_TABLE} creado.")
+        return True
+    finally:
+        conn.close()
+
+
+# ============================================================
+#  AUTOCHEQUEO · EXPLAIN QUERY PLAN DE LAS CONSULTAS CALIENTES
+# ============================================================
+# (nombre, sql, tablas/alias que PUEDEN recorrerse completas)
+HOT_QUERIES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("matcher.carga_facturas", """
+        SELECT f.*, c.total_final, c.detraccion
+        FROM facturas_pf f LEFT JOIN calculos_pf c ON f.source_hash = c.factura_hash
+     """, ("f",)),
+    ("calculos.sync_factura",
+     "UPDATE facturas_pf SET igv = ?, total = ? WHERE source_hash = ?", ()),
+    ("writer.factura_por_hash", "SELECT id FROM facturas_pf WHERE source_hash = ?", ()),
+    ("writer.banco_por_hash", "SELECT id FROM bancos_pf WHERE source_hash = ?", ()),
+    ("writer.cliente_por_hash", "SELECT id FROM clientes_pf WHERE source_hash = ?", ()),
+    ("match.por_par",
+     "SELECT id FROM match_pf WHERE factura_hash = ? AND banco_hash = ?", ()),
+    ("match.por_factura", "SELECT * FROM match_pf WHERE factura_hash = ?", ()),
+    ("match.por_banco", "SELECT * FROM match_pf WHERE banco_hash = ?", ()),
+    ("match.vigentes",
+     "SELECT factura_hash, banco_hash FROM match_pf WHERE vigente = 1", ()),
+    ("match.detalles_ultima_corrida", "SELECT * FROM match_detalles_tmp", ()),
+    ("facturas.cobradas", "SELECT id FROM facturas_pf WHERE fue_cobrado = 1", ()),
+    ("facturas.abiertas_desde",
+     "SELECT id FROM facturas_pf WHERE fue_cobrado = 0 AND fecha_emision >= ?", ()),
+    ("facturas.serie_numero",
+     "SELECT id FROM facturas_pf WHERE serie = ? AND numero = ?", ()),
+    ("facturas.por_ruc", "SELECT id FROM facturas_pf WHERE ruc = ?", ()),
+    ("clientes.por_ruc", "SELECT id FROM clientes_pf WHERE ruc = ?", ()),
+    ("bancos.ventana_fecha",
+     "SELECT id FROM bancos_pf WHERE fecha BETWEEN ? AND ?", ()),
+    ("tipo_cambio.serie",
+     "SELECT fecha, tipo_cambio FROM tipo_cambio_pf WHERE moneda = ? ORDER BY fecha", ()),
+    ("etapas.por_grafo",
+     "SELECT etapa, huella, salida FROM etapas_pf WHERE grafo = ?", ()),
+]
+
+
+def _escaneos(plan: List[tuple], permitidos: Tuple[str, ...]) -> List[str]:
+    """
+    Pasos 'SCAN <tabla>' sin índice (los de un índice parcial/cubriente valen)
+    y AUTOMATIC INDEX: SQLite recorre la tabla para armar un índice efímero.
+    """
+    malos = []
+    for fila in plan:
+        detalle = str(fila[-1])
+        if "AUTOMATIC" in detalle:
+            malos.append(detalle)
+            continue
+        if not detalle.startswith("SCAN ") or "INDEX" in detalle:
+            continue
+        objetivo = detalle.split()[1]
+        if objetivo not in permitidos:
+            malos.append(detalle)
+    return malos
+
+
+def explain_check(db_path: Optional[Path] = None) -> List[Tuple[str, List[str]]]:
+    """
+    Corre HOT_QUERIES con EXPLAIN QUERY PLAN sobre la BD (ya migrada) y
+    devuelve [(consulta, [pasos SCAN sin índice])] de las que fallan.
+    """
+    db_path = Path(db_path) if db_path else _db_path()
+    migrate(db_path)
+
+    conn = sqlite3.connect(db_path)
+    fallos: List[Tuple[str, List[str]]] = []
+    try:
+        for nombre, sql, permitidos in HOT_QUERIES:
+            params = (None,) * sql.count("?")
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+            pasos = " | ".join(str(f[-1]) for f in plan)
+            malos = _escaneos(plan, permitidos)
+            if malos:
+                error(f"[Schema] ❌ {nombre}: {pasos}")
+                fallos.append((nombre, malos))
+            else:
+                info(f"[Schema] ✔ {nombre}: {pasos}")
+    finally:
+        conn.close()
+
+    if fallos:
+        warn(f"[Schema] {len(fallos)}/{len(HOT_QUERIES)} consultas calientes recorren tablas completas.")
+    else:
+        ok(f"[Schema] {len(HOT_QUERIES)} consultas calientes usan índices ✔")
+    return fallos
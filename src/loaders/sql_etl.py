@@ -0,0 +1,453 @@
+# src/loaders/sql_etl.py
+from __future__ import annotations
+
+# ------------------------------------------------------------
+# Bootstrap rutas
+# ------------------------------------------------------------
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------------
+# Imports principales
+# ------------------------------------------------------------
+import re
+import time
+import sqlite3
+import hashlib
+from typing import Dict, List, Optional
+
+from src.core.logger import info, ok, warn, error
+from src.core.env_loader import get_config
+from src.core.db import get_source_path, get_source_uri
+from src.core.utils import normalize_text, clean_amount, clean_ruc, parse_date
+from src.transformers.data_mapper import normalize_colname
+
+from src.loaders.invoice_writer import InvoiceWriter, TABLE_NAME as TABLA_FACTURAS
+from src.loaders.bank_writer import BankWriter, TABLE_NAME as TABLA_BANCOS
+from src.loaders.clients_writer import ClientsWriter, TABLE_NAME as TABLA_CLIENTES
+
+
+# ============================================================
+#   UDFs DETERMINÍSTICAS (mismas reglas que la ruta pandas)
+# ============================================================
+_VACIOS = ("", "nan", "None")
+
+
+def _pf_text(v) -> str:
+    """astype(str).apply(normalize_text) → NULL se vuelve 'none' igual que en pandas."""
+    return normalize_text(str(v))
+
+
+def _pf_str(v) -> str:
+    """str(valor or "").strip() (DataMapper._as_text)."""
+    return str(v or "").strip()
+
+
+def _pf_ruc(v) -> str:
+    return clean_ruc(str(v))
+
+
+def _pf_date(v) -> Optional[str]:
+    """InvoicesExtractor._fix_dates + str(date) del writer."""
+    if v in (None, "", "nan", "0"):
+        return None
+    d = parse_date(v)
+    return str(d) if d else None
+
+
+def _pf_coalesce(*valores):
+    """Primer valor válido (DataMapper._coalesce): vacíos / 'nan' / 'None' no cuentan."""
+    for v in valores:
+        if v is not None and str(v).strip() not in _VACIOS:
+            return v
+    return None
+
+
+def _pf_serie(combinada: str, serie: str) -> str:
+    m = re.match(r"^([A-Za-z0-9]+)-([0-9]+)", combinada or "")
+    if m:
+        return m.group(1)
+    if serie and not re.match(r"^[0-9]{1,3}$", serie):
+        return serie
+    return ""
+
+
+def _pf_numero(combinada: str, numero: str) -> str:
+    m = re.match(r"^([A-Za-z0-9]+)-([0-9]+)", combinada or "")
+    if m:
+        return m.group(2)
+    return numero if numero and numero.isdigit() else ""
+
+
+def _pf_hash(*valores) -> str:
+    """Hash canónico: "|".join(str(v)) en el orden recibido (claves ya ordenadas)."""
+    base = "|".join(str(v) for v in valores)
+    return hashlib.sha256(base.encode("utf-8")).hexdigest()
+
+
+_UDFS = {
+    "pf_text": (1, _pf_text),
+    "pf_str": (1, _pf_str),
+    "pf_ruc": (1, _pf_ruc),
+    "pf_date": (1, _pf_date),
+    "pf_amount": (1, clean_amount),
+    "pf_coalesce": (-1, _pf_coalesce),
+    "pf_serie": (2, _pf_serie),
+    "pf_numero": (2, _pf_numero),
+    "pf_hash": (-1, _pf_hash),
+}
+
+
+# ============================================================
+#   HELPERS SQL
+# ============================================================
+def _q(nombre: str) -> str:
+    return '"' + str(nombre).replace('"', '""') + '"'
+
+
+def _norm(name: str) -> str:
+    if not isinstance(name, str):
+        return ""
+    return name.strip().lower().replace(" ", "").replace("_", "")
+
+
+def _pick_name(columnas: List[str], posibles: List[str]) -> Optional[str]:
+    """Misma selección de columnas que los extractores (_pick), pero sobre nombres."""
+    if not columnas or not posibles:
+        return None
+
+    posibles_norm = [_norm(p) for p in posibles]
+    cols_norm = {col: _norm(col) for col in columnas}
+
+    # 1) Exacto
+    for col, norm in cols_norm.items():
+        if norm in posibles_norm:
+            return col
+
+    # 2) Alias contenido en nombre
+    for col, norm in cols_norm.items():
+        if any(alias in norm for alias in posibles_norm):
+            return col
+
+    # 3) Nombre contenido en alias
+    for col, norm in cols_norm.items():
+        if any(norm in alias for alias in posibles_norm):
+            return col
+
+    return None
+
+
+# ============================================================
+#   MOTOR ETL SET-BASED (FASE 1 DENTRO DE SQLITE)
+# ============================================================
+class SqlEtlEngine:
+    """
+    Alternativa a extractores + writers para la FASE 1:
+
+    - ATTACH de la BD origen (solo lectura) sobre la BD PulseForge
+    - normalize_text / clean_amount / clean_ruc / parse_date / hash
+      registrados como funciones SQLite determinísticas
+    - Un INSERT … SELECT … ON CONFLICT(source_hash) por tabla,
+      generado desde columnas_facturas / columnas_bancos
+
+    Produce las mismas filas y el mismo source_hash que la ruta pandas
+    (salvo columnas numéricas con nulos, que pandas convierte a float).
+    """
+
+    SRC = "src"
+
+    def __init__(self) -> None:
+        info("Inicializando SqlEtlEngine…")
+
+        self.cfg = get_config()
+        self.tablas = self.cfg.tablas or {}
+        self.tabla_unica: str = self.cfg.tabla_movimientos_unica or ""
+        self.tablas_bancos: Dict[str, str] = self.cfg.tablas_bancos or {}
+        self.cols_fact: Dict[str, List[str]] = self.cfg.columnas_facturas or {}
+        self.cols_bank: Dict[str, List[str]] = self.cfg.columnas_bancos or {}
+
+        # Los writers siguen siendo dueños del esquema destino
+        InvoiceWriter()
+        BankWriter()
+        self.db_path = ClientsWriter().db_path
+
+        self.conn: Optional[sqlite3.Connection] = None
+        ok("SqlEtlEngine listo.")
+
+    # --------------------------------------------------------
+    # CONEXIÓN + ATTACH + UDFs
+    # --------------------------------------------------------
+    def connect(self) -> sqlite3.Connection:
+        if self.conn:
+            return self.conn
+
+        origen = get_source_path()
+        info(f"[SqlEtl] BD destino → {self.db_path}")
+        info(f"[SqlEtl] ATTACH origen (solo lectura) → {origen}")
+
+        conn = sqlite3.connect(Path(self.db_path).resolve().as_uri(), uri=True, timeout=10)
+        conn.execute(f"ATTACH DATABASE ? AS {self.SRC}", (get_source_uri(),))
+
+        for nombre, (narg, fn) in _UDFS.items():
+            conn.create_function(nombre, narg, fn, deterministic=True)
+
+        self.conn = conn
+        return conn
+
+    def close(self) -> None:
+        if self.conn:
+            try:
+                self.conn.execute(f"DETACH DATABASE {self.SRC}")
+            except Exception:
+                pass
+            self.conn.close()
+            self.conn = None
+
+    def _columnas(self, tabla: str) -> List[str]:
+        cur = self.connect().execute(f"PRAGMA {self.SRC}.table_info({_q(tabla)})")
+        return [r[1] for r in cur.fetchall()]
+
+    def _ejecutar(self, etiqueta: str, sql: str) -> int:
+        conn = self.connect()
+        t0 = time.perf_counter()
+        try:
+            with conn:
+                filas = conn.execute(sql).rowcount
+        except Exception as e:
+            error(f"[SqlEtl] ❌ Error cargando {etiqueta} → {e}")
+            raise
+        ok(f"[SqlEtl] ✔ {etiqueta}: {filas} filas nuevas ({time.perf_counter() - t0:.2f}s)")
+        return filas
+
+    # ============================================================
+    #   FACTURAS
+    # ============================================================
+    def _sql_facturas(self) -> Optional[str]:
+        tabla = self.tablas.get("facturas")
+        if not tabla:
+            error("Falta 'facturas' en settings.tablas.")
+            return None
+
+        columnas = self._columnas(tabla)
+        if not columnas:
+            warn(f"Tabla '{tabla}' vacía o inexistente en BD origen.")
+            return None
+
+        # InvoicesExtractor: columnas con espacios invisibles → strip
+        reales = {c.strip(): c for c in columnas}
+
+        # 1) Campos estándar (InvoicesExtractor._normalize_df + _fix_dates + _post_clean)
+        std: Dict[str, str] = {}
+        for campo, posibles in self.cols_fact.items():
+            if not isinstance(posibles, list):
+                posibles = [posibles]
+
+            col = _pick_name(list(reales), posibles)
+            if not col:
+                warn(f"[FACTURAS] No se halló columna para '{campo}'")
+                expr = "NULL"
+            else:
+                info(f"   - {campo:<15} ⇐ {col}")
+                expr = f"r.{_q(reales[col])}"
+
+            if campo in ("fecha_emision", "vencimiento"):
+                expr = f"pf_date({expr})"
+            elif campo in ("cliente_generador", "estado_cont", "estado_fs"):
+                expr = f"pf_text({expr})"
+
+            std[normalize_colname(campo)] = expr
+
+        # 2) DataMapper: coalesce de alias sobre los campos estándar
+        def col(campo: str) -> str:
+            exprs = [
+                std[normalize_colname(a)]
+                for a in (self.cols_fact.get(campo) or [])
+                if normalize_colname(a) in std
+            ]
+            return f"pf_coalesce({', '.join(exprs)})" if exprs else "NULL"
+
+        def texto(campo: str) -> str:
+            return f"pf_str({col(campo)})"
+
+        mapeo = f"""
+            SELECT
+                pf_amount({col("subtotal")}) AS subtotal,
+                pf_amount({col("igv")}) AS igv,
+                pf_amount({col("total")}) AS total,
+                {texto("ruc")} AS ruc,
+                {texto("cliente_generador")} AS cliente_generador,
+                {texto("serie")} AS serie_txt,
+                {texto("numero")} AS numero_txt,
+                {texto("combinada")} AS combinada,
+                {col("fecha_emision")} AS fecha_emision,
+                {col("vencimiento")} AS vencimiento,
+                {texto("estado_fs")} AS estado_fs,
+                {texto("estado_cont")} AS estado_cont
+            FROM {self.SRC}.{_q(tabla)} AS r
+        """
+
+        # 3) Hash = DataMapper._make_hash (claves en orden alfabético)
+        return f"""
+            INSERT INTO {TABLA_FACTURAS} (
+                source_hash, ruc, cliente_generador, serie, numero, combinada,
+                fecha_emision, vencimiento, subtotal, igv, total,
+                estado_fs, estado_cont, fue_cobrado, match_id
+            )
+            SELECT
+                pf_hash(
+                    cliente_generador, combinada, estado_cont, estado_fs,
+                    fecha_emision, 0, igv, NULL, numero, ruc, serie,
+                    subtotal, total, vencimiento
+                ),
+                ruc, cliente_generador, serie, numero, combinada,
+                fecha_emision, vencimiento, subtotal, igv, total,
+                estado_fs, estado_cont, 0, NULL
+            FROM (
+                SELECT m.*,
+                       pf_serie(combinada, serie_txt) AS serie,
+                       pf_numero(combinada, numero_txt) AS numero
+                FROM ({mapeo}) AS m
+            )
+            -- = InvoiceWriter._validate_factura: sin RUC la factura se omite
+            -- (subtotal/igv/total nunca son nulos: pf_amount → 0.0)
+            WHERE ruc <> ''
+            ON CONFLICT(source_hash) DO NOTHING
+        """
+
+    # ============================================================
+    #   BANCOS
+    # ============================================================
+    def _select_banco(self, tabla: str, codigo: str) -> Optional[str]:
+        columnas = self._columnas(tabla)
+        if not columnas:
+            warn(f"Tabla de banco vacía o inexistente → {tabla}")
+            return None
+
+        campos: Dict[str, str] = {}
+        for campo, opciones in self.cols_bank.items():
+            col = _pick_name(columnas, opciones)
+            if not col:
+                warn(f"[{codigo}] Columna no encontrada → {campo} (opciones: {opciones})")
+            campos[campo] = f"r.{_q(col)}" if col else "NULL"
+
+        # BankExtractor._normalize_bank_table
+        if "monto" in campos:
+            campos["monto"] = f"pf_amount({campos['monto']})"
+        for campo in ("descripcion", "tipo_mov", "destinatario", "tipo_documento"):
+            if campo in campos:
+                campos[campo] = f"pf_text({campos[campo]})"
+
+        def c(campo: str) -> str:
+            return campos.get(campo, "NULL")
+
+        codigo_sql = "'" + codigo.replace("'", "''") + "'"
+        return f"""
+            SELECT
+                {c("fecha")} AS fecha,
+                {c("tipo_mov")} AS tipo_mov,
+                {c("descripcion")} AS descripcion,
+                {c("operacion")} AS operacion,
+                {c("destinatario")} AS destinatario,
+                {c("tipo_documento")} AS tipo_documento,
+                {c("monto")} AS monto,
+                {c("moneda")} AS moneda,
+                {codigo_sql} AS banco_codigo
+            FROM {self.SRC}.{_q(tabla)} AS r
+        """
+
+    def _sql_bancos(self) -> Optional[str]:
+        if not self.cols_bank:
+            warn("columnas_bancos vacío → el motor SQL no puede mapear bancos.")
+            return None
+
+        if self.tabla_unica:
+            origenes = {"GENERAL": self.tabla_unica}
+        else:
+            origenes = self.tablas_bancos
+
+        selects = [
+            s for s in (self._select_banco(t, cod) for cod, t in origenes.items()) if s
+        ]
+        if not selects:
+            warn("No se encontraron tablas de movimientos bancarios.")
+            return None
+
+        # Hash = BankExtractor._make_hash (claves en orden alfabético)
+        return f"""
+            INSERT INTO {TABLA_BANCOS} (
+                source_hash, fecha, tipo_mov, descripcion, operacion,
+                destinatario, tipo_documento, monto, moneda, banco_codigo
+            )
+            SELECT
+                pf_hash(
+                    banco_codigo, descripcion, destinatario, fecha, moneda,
+                    monto, operacion, tipo_documento, tipo_mov
+                ),
+                fecha, tipo_mov, descripcion, operacion,
+                destinatario, tipo_documento, monto, moneda, banco_codigo
+            FROM ({" UNION ALL ".join(selects)})
+            WHERE monto IS NOT NULL
+            ON CONFLICT(source_hash) DO NOTHING
+        """
+
+    # ============================================================
+    #   CLIENTES
+    # ============================================================
+    def _sql_clientes(self) -> Optional[str]:
+        tabla = self.tablas.get("clientes")
+        if not tabla:
+            warn("settings.json no define 'clientes' en 'tablas'.")
+            return None
+
+        columnas = self._columnas(tabla)
+        col_ruc = _pick_name(columnas, ["ruc", "documento", "doc", "dni"])
+        col_name = _pick_name(columnas, ["razon", "cliente", "nombre", "rs", "name"])
+
+        if not col_ruc or not col_name:
+            error("No se detectaron columnas RUC / razón social → clientes omitidos.")
+            return None
+
+        # ClientsExtractor: primer registro por RUC (orden de lectura)
+        return f"""
+            INSERT INTO {TABLA_CLIENTES} (source_hash, ruc, razon_social)
+            SELECT pf_hash(razon_social, ruc), ruc, razon_social
+            FROM (
+                SELECT ruc, razon_social,
+                       ROW_NUMBER() OVER (PARTITION BY ruc ORDER BY orden) AS rn
+                FROM (
+                    SELECT pf_ruc(r.{_q(col_ruc)}) AS ruc,
+                           pf_text(r.{_q(col_name)}) AS razon_social,
+                           ROW_NUMBER() OVER () AS orden
+                    FROM {self.SRC}.{_q(tabla)} AS r
+                )
+                WHERE ruc <> ''
+            )
+            WHERE rn = 1 AND razon_social <> ''
+            ON CONFLICT(source_hash) DO NOTHING
+        """
+
+    # ============================================================
+    #   API ESTÁNDAR → engine.run()
+    # ============================================================
+    def run(self) -> Dict[str, int]:
+        info("=== FASE 1 · MOTOR SQL (ATTACH + UDFs) ===")
+        t0 = time.perf_counter()
+        resumen: Dict[str, int] = {}
+
+        try:
+            for etiqueta, generar in (
+                ("facturas", self._sql_facturas),
+                ("bancos", self._sql_bancos),
+                ("clientes", self._sql_clientes),
+            ):
+                sql = generar()
+                resumen[etiqueta] = self._ejecutar(etiqueta, sql) if sql else 0
+        finally:
+            self.close()
+
+        ok(f"[SqlEtl] FASE 1 completada en {time.perf_counter() - t0:.2f}s → {resumen}")
+        return resumen
@@ -0,0 +1,254 @@
+# src/loaders/stage_store.py
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+import sys
+import json
+import hashlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bootstrap
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src.core.logger import info, ok, warn, error
+from src.core.env_loader import get_env, get_config
+from src.loaders.migrations import ensure_schema
+
+
+STAGES_TABLE = "etapas_pf"
+PROGRESS_TABLE = "match_progreso_pf"
+
+
+def _db_path() -> Path:
+    db_path = str(get_env("PULSEFORGE_NEWDB_PATH")).strip()
+    if not db_path:
+        raise ValueError("[Etapas] ❌ Falta PULSEFORGE_NEWDB_PATH en .env")
+    path = Path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def huella(*partes: Any) -> str:
+    """Huella estable (sha1) de cualquier combinación de valores serializables."""
+    base = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def huella_archivo(path: Any) -> str:
+    """Huella barata de un archivo (ruta + tamaño + mtime) para detectar cambios."""
+    try:
+        st = Path(path).stat()
+        return huella(str(Path(path).resolve()), st.st_size, st.st_mtime_ns)
+    except Exception:
+        return huella(str(path), None)
+
+
+# ============================================================
+#           CHECKPOINTS DE ETAPAS · PULSEFORGE 2025
+# ============================================================
+class StageStore:
+    """
+    Registro durable de etapas completadas por grafo (full, full_run…).
+
+    Cada fila guarda: huella de entradas, salida (json) y fecha.
+    Con --resume, StageGraph salta las etapas cuya huella coincide.
+    Una corrida nueva (sin --resume) limpia el registro del grafo.
+    """
+
+    def __init__(self, grafo: str):
+        self.grafo = grafo
+        self.db_path = _db_path()
+        self._ensure_table()
+
+    # ============================================================
+    #              CREAR TABLA SI NO EXISTE
+    # ============================================================
+    def _ensure_table(self):
+        ensure_schema(self.db_path)
+
+    # ============================================================
+    #              LECTURA / REGISTRO
+    # ============================================================
+    def completadas(self) -> Dict[str, Tuple[str, Any]]:
+        """{etapa: (huella, salida)} de las etapas ya completadas del grafo."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                f"SELECT etapa, huella, salida FROM {STAGES_TABLE} WHERE grafo = ?",
+                (self.grafo,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        return {
+            etapa: (h, json.loads(salida) if salida else None)
+            for etapa, h, salida in rows
+        }
+
+    def record(self, etapa: str, h: str, salida: Any = None, duracion: float = 0.0):
+        try:
+            texto = json.dumps(salida)
+        except (TypeError, ValueError):
+            texto = None  # DataFrames / listas grandes: solo se registra la etapa
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(
+                f"""
+                INSERT OR REPLACE INTO {STAGES_TABLE}
+                    (grafo, etapa, huella, salida, duracion, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?);
+                """,
+                (self.grafo, etapa, h, texto, round(duracion, 3),
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            error(f"[Etapas] ❌ No se pudo registrar '{etapa}' → {e}")
+            raise
+        finally:
+            conn.close()
+
+    def reset(self):
+        """Corrida nueva: olvida etapas y progreso de matching del grafo."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(f"DELETE FROM {STAGES_TABLE} WHERE grafo = ?", (self.grafo,))
+            conn.commit()
+        finally:
+            conn.close()
+        MatchProgress(self.grafo).clear()
+        info(f"[Etapas] Registro de etapas reiniciado → {self.grafo}")
+
+
+# ============================================================
+#           PROGRESO DEL MATCHING (CADA N FACTURAS)
+# ============================================================
+_TS = "__ts__"  # marca de fecha en el json del progreso
+
+
+def _json_default(valor: Any) -> Any:
+    """numpy → nativo; Timestamp/NaT → {"__ts__": iso | null} (se restaura al leer)."""
+    if isinstance(valor, datetime):
+        return {_TS: None if valor != valor else valor.isoformat()}
+    if hasattr(valor, "item"):
+        return valor.item()
+    raise TypeError(f"Tipo no serializable en progreso: {type(valor).__name__}")
+
+
+def _json_hook(obj: Dict[str, Any]) -> Any:
+    if len(obj) == 1 and _TS in obj:
+        import pandas as pd
+
+        return pd.NaT if obj[_TS] is None else pd.Timestamp(obj[_TS])
+    return obj
+
+
+def _filas_a_json(filas: List[dict]) -> str:
+    return json.dumps(filas, default=_json_default, ensure_ascii=False)
+
+
+def _filas_de_json(texto: Any) -> List[dict]:
+    return json.loads(texto, object_hook=_json_hook)
+
+
+class MatchProgress:
+    """
+    Progreso durable de MatcherEngine.run: cada `cada` facturas se guarda
+    un lote con la posición alcanzada y las filas generadas desde el lote
+    anterior (json). Al reanudar se recuperan las filas y se continúa en la
+    posición guardada, siempre que la huella de entrada coincida.
+    """
+
+    def __init__(self, grafo: str, cada: Optional[int] = None):
+        self.grafo = grafo
+        self.cada = int(get_config().matching.match_checkpoint_cada if cada is None else cada)
+        self.db_path = _db_path()
+        self._ensure_table()
+
+    def _ensure_table(self):
+        ensure_schema(self.db_path)
+
+    @property
+    def activo(self) -> bool:
+        return self.cada > 0
+
+    # ============================================================
+    #              CARGAR / GUARDAR / LIMPIAR
+    # ============================================================
+    def load(self, h: str) -> Tuple[int, List[dict], List[dict]]:
+        """(posición, matches, detalles) acumulados para la huella `h`."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            rows = conn.execute(
+                f"""
+                SELECT huella, posicion, matches, detalles FROM {PROGRESS_TABLE}
+                WHERE grafo = ? ORDER BY lote
+                """,
+                (self.grafo,),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        if not rows:
+            return 0, [], []
+
+        if any(r[0] != h for r in rows):
+            warn("[MatchProgress] Entradas del matching cambiaron → se descarta el progreso.")
+            self.clear()
+            return 0, [], []
+
+        matches: List[dict] = []
+        detalles: List[dict] = []
+        try:
+            for _, _, m, d in rows:
+                matches.extend(_filas_de_json(m))
+                detalles.extend(_filas_de_json(d))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            # Lotes de versiones anteriores (pickle) u otro formato → no se ejecutan
+            warn("[MatchProgress] Progreso guardado en formato no reconocido → se descarta.")
+            self.clear()
+            return 0, [], []
+
+        posicion = rows[-1][1]
+        ok(f"[MatchProgress] Reanudando matching en factura {posicion} "
+           f"({len(matches)} matches previos).")
+        return posicion, matches, detalles
+
+    def save(self, h: str, posicion: int, matches: List[dict], detalles: List[dict]):
+        """Guarda un lote: filas nuevas desde el lote anterior + posición."""
+        conn = sqlite3.connect(self.db_path)
+        try:
+            lote = conn.execute(
+                f"SELECT COALESCE(MAX(lote), 0) + 1 FROM {PROGRESS_TABLE} WHERE grafo = ?",
+                (self.grafo,),
+            ).fetchall()[0][0]
+            conn.execute(
+                f"""
+                INSERT INTO {PROGRESS_TABLE}
+                    (grafo, lote, huella, posicion, matches, detalles, actualizado)
+                VALUES (?, ?, ?, ?, ?, ?, ?);
+                """,
+                (self.grafo, lote, h, posicion,
+                 _filas_a_json(matches), _filas_a_json(detalles),
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            warn(f"[MatchProgress] No se pudo guardar progreso → {e}")
+        finally:
+            conn.close()
+
+    def clear(self):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(f"DELETE FROM {PROGRESS_TABLE} WHERE grafo = ?", (self.grafo,))
+            conn.commit()
+        finally:
+            conn.close()
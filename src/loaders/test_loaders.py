@@ -1,8 +1,12 @@
 # src/loaders/test_loaders.py
 from __future__ import annotations
+import os
 import sys
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
 import sqlite3
+import pandas as pd
 
 # ----------------------------------------------------------------------
 # Bootstrap
@@ -24,6 +28,9 @@ from src.loaders.newdb_builder import NewDBBuilder
 from src.loaders.invoice_writer import InvoiceWriter
 from src.loaders.bank_writer import BankWriter
 from src.loaders.clients_writer import ClientsWriter
+from src.loaders.sql_etl import SqlEtlEngine
+from src.loaders.match_writer import MatchWriter
+from src.loaders.migrations import MIGRATIONS, migrate
 
 # ----------------------------------------------------------------------
 # Extractors
@@ -130,8 +137,249 @@ def main():
     ok("=== TEST LOADERS COMPLETADO EXITOSAMENTE ===")
 
 
+# ======================================================================
+#        PARIDAD source_hash: RUTA PANDAS vs --engine sql
+# ======================================================================
+# Fila de prueba por campo estándar; cada columna origen se llama como el
+# primer alias de columnas_facturas (así el fixture sigue a settings.json).
+_FACTURAS_FIXTURE = [
+    {
+        "ruc": "20123456789", "cliente_generador": "Acme S.A.C.",
+        "serie": "F001", "numero": "123", "combinada": "F001-123",
+        "fecha_emision": "2024-01-15", "vencimiento": "2024-02-15",
+        "subtotal": "1,000.00", "igv": "180.00", "total": "1,180.00",
+        "estado_fs": "Pagado", "estado_cont": "Registrado",
+    },
+    {
+        "ruc": " 20555666777 ", "cliente_generador": "  comercial  ñandú ",
+        "serie": "F002", "numero": "45", "combinada": None,
+        "fecha_emision": "15/03/2024", "vencimiento": None,
+        "subtotal": 250.5, "igv": 45.09, "total": 295.59,
+        "estado_fs": "pendiente", "estado_cont": None,
+    },
+    # Sin RUC → ambas rutas la omiten (InvoiceWriter._validate_factura / WHERE ruc <> '')
+    {
+        "ruc": "", "cliente_generador": "Sin Ruc SRL",
+        "serie": "F003", "numero": "9", "combinada": "F003-9",
+        "fecha_emision": "2024-04-01", "vencimiento": "2024-05-01",
+        "subtotal": "100.00", "igv": "18.00", "total": "118.00",
+        "estado_fs": "Pagado", "estado_cont": "Registrado",
+    },
+    {
+        "ruc": None, "cliente_generador": "Ruc Nulo SAC",
+        "serie": "F004", "numero": "10", "combinada": "F004-10",
+        "fecha_emision": "2024-04-02", "vencimiento": None,
+        "subtotal": "50", "igv": "9", "total": "59",
+        "estado_fs": None, "estado_cont": None,
+    },
+]
+
+
+@contextmanager
+def _origen_destino_temporal(cfg):
+    """BD origen con _FACTURAS_FIXTURE + BD destino vacía, ambas temporales."""
+    tabla = cfg.tablas.get("facturas")
+    columnas = {}
+    for campo, alias in (cfg.columnas_facturas or {}).items():
+        alias = alias if isinstance(alias, list) else [alias]
+        if alias and campo in _FACTURAS_FIXTURE[0]:
+            columnas.setdefault(alias[0], campo)
+
+    previa_origen = cfg.db_source
+    previa_destino = os.environ.get("PULSEFORGE_NEWDB_PATH")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        origen = Path(tmp) / "origen.sqlite"
+        conn = sqlite3.connect(origen)
+        try:
+            cols_sql = ", ".join(f'"{c}"' for c in columnas)
+            conn.execute(f'CREATE TABLE "{tabla}" ({cols_sql})')
+            conn.executemany(
+                f'INSERT INTO "{tabla}" VALUES ({", ".join("?" * len(columnas))})',
+                [tuple(fila[campo] for campo in columnas.values()) for fila in _FACTURAS_FIXTURE],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        cfg.db_source = str(origen)
+        os.environ["PULSEFORGE_NEWDB_PATH"] = str(Path(tmp) / "pf.sqlite")
+        try:
+            yield Path(tmp) / "pf.sqlite"
+        finally:
+            cfg.db_source = previa_origen
+            if previa_destino is None:
+                os.environ.pop("PULSEFORGE_NEWDB_PATH", None)
+            else:
+                os.environ["PULSEFORGE_NEWDB_PATH"] = previa_destino
+
+
+def test_hash_sql_vs_pandas():
+    info("🔍 Probando paridad source_hash facturas (pandas vs --engine sql)...")
+
+    try:
+        cfg = get_config()
+
+        with _origen_destino_temporal(cfg) as destino:
+            # Ruta pandas: InvoicesExtractor → DataMapper → InvoiceWriter.to_rows
+            ie = InvoicesExtractor()
+            try:
+                filas_pandas = InvoiceWriter().to_rows(ie.extract())
+            finally:
+                ie._db.close()
+
+            # Ruta SQL: INSERT … SELECT con las UDFs de sql_etl
+            engine = SqlEtlEngine()
+            try:
+                sql = engine._sql_facturas()
+                assert sql, "SqlEtlEngine no generó el INSERT de facturas"
+                engine._ejecutar("facturas", sql)
+            finally:
+                engine.close()
+
+            conn = sqlite3.connect(destino)
+            try:
+                filas_sql = conn.execute(
+                    "SELECT source_hash, ruc, serie, numero, subtotal, igv, total FROM facturas_pf"
+                ).fetchall()
+            finally:
+                conn.close()
+
+        pandas_por_hash = {f[0]: (f[1], f[3], f[4], f[8], f[9], f[10]) for f in filas_pandas}
+        sql_por_hash = {f[0]: tuple(f[1:]) for f in filas_sql}
+
+        # Las filas sin RUC no llegan a ninguna de las dos rutas
+        assert len(filas_pandas) == 2, f"Ruta pandas: {len(filas_pandas)} facturas (esperadas 2)"
+        assert len(filas_sql) == 2, f"Ruta SQL: {len(filas_sql)} facturas (esperadas 2)"
+        assert sql_por_hash.keys() == pandas_por_hash.keys(), "source_hash distinto entre rutas"
+        assert sql_por_hash == pandas_por_hash, "Mismo hash pero columnas distintas"
+
+        ok(f"source_hash idéntico en ambas rutas ({len(sql_por_hash)} facturas, 2 sin RUC omitidas).")
+
+    except Exception as e:
+        error(f"❌ Error en test_hash_sql_vs_pandas: {e}")
+        raise
+
+
+# ======================================================================
+#        MATCH WRITER · UPSERT POR PAR ENTRE CORRIDAS (save_run)
+# ======================================================================
+@contextmanager
+def _bd_match_temporal(cfg):
+    """BD PulseForge temporal (esquema al día) como destino de MatchWriter."""
+    previa = cfg.db_pulseforge
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "pf_match.sqlite"
+        migrate(path)
+        cfg.db_pulseforge = str(path)
+        try:
+            yield path
+        finally:
+            cfg.db_pulseforge = previa
+
+
+def _corrida(pares) -> pd.DataFrame:
+    """(factura, banco, score) → df_match como lo entrega MatcherEngine."""
+    return pd.DataFrame([
+        {
+            "factura_id": k + 1, "movimiento_id": k + 1,
+            "factura_hash": f, "banco_hash": b,
+            "monto_factura": 100.0, "monto_banco": 100.0,
+            "score_similitud": score, "match_tipo": "MATCH",
+        }
+        for k, (f, b, score) in enumerate(pares)
+    ])
+
+
+def _conteos(mw: MatchWriter) -> dict:
+    return {k: mw.resumen[k] for k in ("nuevos", "actualizados", "superados")}
+
+
+def test_match_writer_upsert():
+    info("🔍 Probando MatchWriter.save_run: upsert por par entre corridas...")
+
+    try:
+        cfg = get_config()
+
+        with _bd_match_temporal(cfg) as path:
+            mw = MatchWriter()
+            base = [("F1", "B1", 0.90), ("F2", "B2", 0.80)]
+
+            run1 = mw.save_run(_corrida(base), pd.DataFrame())
+            assert _conteos(mw) == {"nuevos": 2, "actualizados": 0, "superados": 0}, mw.resumen
+
+            # Misma corrida otra vez → ninguna fila de match_pf se reescribe
+            mw.save_run(_corrida(base), pd.DataFrame())
+            assert _conteos(mw) == {"nuevos": 0, "actualizados": 0, "superados": 0}, mw.resumen
+            ok("Corrida repetida → 0 filas escritas.")
+
+            # Score distinto en F1/B1, F2/B2 ausente, F3/B3 nuevo
+            run3 = mw.save_run(_corrida([("F1", "B1", 0.95), ("F3", "B3", 0.70)]), pd.DataFrame())
+            assert _conteos(mw) == {"nuevos": 1, "actualizados": 1, "superados": 1}, mw.resumen
+
+            conn = sqlite3.connect(path)
+            try:
+                filas = {
+                    (f, b): (score, run_id, vigente)
+                    for f, b, score, run_id, vigente in conn.execute(
+                        "SELECT factura_hash, banco_hash, porcentaje_match, run_id, vigente FROM match_pf"
+                    )
+                }
+            finally:
+                conn.close()
+
+            assert filas == {
+                ("F1", "B1"): (0.95, run3, 1),
+                ("F2", "B2"): (0.80, run3, 0),
+                ("F3", "B3"): (0.70, run3, 1),
+            }, filas
+            assert run1 < run3
+            ok("Score cambiado → UPDATE; par ausente → vigente = 0; par nuevo → INSERT.")
+
+        # v3 sobre una match_pf previa con pares repetidos → queda el último
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "pf_v2.sqlite"
+            conn = sqlite3.connect(path)
+            try:
+                for _, fn in MIGRATIONS[:2]:
+                    fn(conn)
+                conn.execute("PRAGMA user_version = 2")
+                conn.executemany(
+                    "INSERT INTO match_pf (factura_hash, banco_hash, porcentaje_match) VALUES (?, ?, ?)",
+                    [("F1", "B1", 0.5), ("F1", "B1", 0.9), ("F2", "B2", 0.7)],
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            migrate(path)
+
+            conn = sqlite3.connect(path)
+            try:
+                filas = conn.execute(
+                    "SELECT id, factura_hash, banco_hash, porcentaje_match FROM match_pf ORDER BY id"
+                ).fetchall()
+                try:
+                    conn.execute("INSERT INTO match_pf (factura_hash, banco_hash) VALUES ('F2', 'B2')")
+                except sqlite3.IntegrityError:
+                    pass
+                else:
+                    raise AssertionError("ux_match_par no rechazó un par duplicado")
+            finally:
+                conn.close()
+
+            assert filas == [(2, "F1", "B1", 0.9), (3, "F2", "B2", 0.7)], filas
+            ok("Migración v3 → pares duplicados eliminados (se conserva el último) + índice único.")
+
+    except Exception as e:
+        error(f"❌ Error en test_match_writer_upsert: {e}")
+        raise
+
+
 # ======================================================================
 # Ejecución directa
 # ======================================================================
 if __name__ == "__main__":
+    test_hash_sql_vs_pandas()
+    test_match_writer_upsert()
     main()
@@ -0,0 +1,178 @@
+# src/loaders/tipo_cambio.py
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+import sys
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Bootstrap
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from src.core.logger import info, ok, warn
+from src.core.env_loader import get_env, get_config
+from src.loaders.migrations import ensure_schema
+from src.loaders.stage_store import huella_archivo
+
+
+TABLE = "tipo_cambio_pf"
+
+# Serie por (bd, moneda, huella del CSV): una lectura por corrida
+_SERIES: Dict[tuple, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+class TipoCambioError(Exception):
+    pass
+
+
+def _db_path() -> Path:
+    db_path = str(get_env("PULSEFORGE_NEWDB_PATH")).strip()
+    if not db_path:
+        raise ValueError("[TipoCambio] ❌ Falta PULSEFORGE_NEWDB_PATH en .env")
+    path = Path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _csv_path(csv: Optional[str] = None) -> Optional[Path]:
+    ruta = str(get_config().parametros.tipo_cambio_csv if csv is None else csv).strip()
+    if not ruta:
+        return None
+    path = Path(ruta)
+    return path if path.is_absolute() else ROOT / path
+
+
+# ============================================================
+#              LECTURA DEL CSV
+# ============================================================
+def leer_csv(path: Path) -> pd.DataFrame:
+    """
+    CSV → DataFrame (moneda, fecha ISO, tipo_cambio). Columnas aceptadas:
+    fecha | tipo_cambio / venta / tc | moneda (opcional, USD por defecto).
+    Fechas ISO o dd/mm/aaaa; filas sin fecha o con tasa ≤ 0 se descartan.
+    """
+    df = pd.read_csv(path, dtype=str, sep=None, engine="python")
+    df.columns = [str(c).strip().lower() for c in df.columns]
+
+    col_fecha = next((c for c in df.columns if "fecha" in c), None)
+    col_tasa = next((c for c in ("tipo_cambio", "venta", "tc", "valor") if c in df.columns), None)
+    if not col_fecha or not col_tasa:
+        raise TipoCambioError(f"CSV de tipo de cambio sin columnas fecha/tipo_cambio → {list(df.columns)}")
+
+    texto = df[col_fecha].fillna("").astype(str).str.strip()
+    fecha = pd.to_datetime(texto, errors="coerce", format="%Y-%m-%d")
+    faltan = fecha.isna() & (texto != "")
+    if faltan.any():
+        fecha = fecha.fillna(pd.to_datetime(texto.where(faltan), errors="coerce", dayfirst=True))
+
+    tasa = pd.to_numeric(df[col_tasa].astype(str).str.replace(",", ".", regex=False), errors="coerce")
+    moneda = df["moneda"].fillna("USD").astype(str).str.upper().str.strip() if "moneda" in df.columns \
+        else pd.Series("USD", index=df.index)
+
+    out = pd.DataFrame({
+        "moneda": moneda,
+        "fecha": fecha.dt.strftime("%Y-%m-%d"),
+        "tipo_cambio": tasa,
+    })
+    validas = fecha.notna() & (tasa > 0)
+    if (~validas).any():
+        warn(f"[TipoCambio] {int((~validas).sum())} filas inválidas descartadas de {path.name}")
+    return out[validas].drop_duplicates(["moneda", "fecha"], keep="last")
+
+
+def cargar_csv(csv: Optional[str] = None, db_path: Optional[Path] = None) -> int:
+    """Upsert del CSV configurado en tipo_cambio_pf. Devuelve filas cargadas."""
+    path = _csv_path(csv)
+    if path is None:
+        return 0
+    if not path.exists():
+        raise TipoCambioError(f"No existe el CSV de tipo de cambio → {path}")
+
+    db_path = Path(db_path) if db_path else _db_path()
+    ensure_schema(db_path)
+    df = leer_csv(path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {TABLE} (moneda, fecha, tipo_cambio) VALUES (?, ?, ?)",
+            df.itertuples(index=False, name=None),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+    ok(f"[TipoCambio] {len(df)} tasas cargadas desde {path.name} → {TABLE}")
+    return len(df)
+
+
+# ============================================================
+#              SERIE POR FECHA (CACHÉ POR CORRIDA)
+# ============================================================
+def serie(moneda: str = "USD", db_path: Optional[Path] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (fechas datetime64[D] ordenadas, tasas) de `moneda`. Si hay CSV
+    configurado se carga antes en tipo_cambio_pf, una vez por huella
+    del archivo; la serie queda en memoria para el resto de la corrida.
+    """
+    db_path = Path(db_path) if db_path else _db_path()
+    path = _csv_path()
+    clave = (str(db_path), moneda, huella_archivo(path) if path else None)
+    if clave in _SERIES:
+        return _SERIES[clave]
+
+    if path is not None:
+        cargar_csv(str(path), db_path)
+    else:
+        ensure_schema(db_path)
+
+    conn = sqlite3.connect(db_path)
+    try:
+        filas = conn.execute(
+            f"SELECT fecha, tipo_cambio FROM {TABLE} WHERE moneda = ? ORDER BY fecha", (moneda,)
+        ).fetchall()
+    finally:
+        conn.close()
+
+    fechas = np.array([f for f, _ in filas], dtype="datetime64[D]")
+    tasas = np.array([t for _, t in filas], dtype="float64")
+    _SERIES[clave] = (fechas, tasas)
+    if len(fechas):
+        info(f"[TipoCambio] Serie {moneda}: {len(fechas)} tasas ({fechas[0]} → {fechas[-1]})")
+    return fechas, tasas
+
+
+def limpiar_cache():
+    _SERIES.clear()
+
+
+def convertir(fechas: pd.Series, fijo: float, moneda: str = "USD",
+              db_path: Optional[Path] = None) -> np.ndarray:
+    """
+    Tasa vigente para cada fecha (as-of: la última publicada ese día o
+    antes). Antes de la primera tasa se usa la primera; sin fecha o sin
+    serie, el tipo de cambio fijo de settings.
+    """
+    tabla_f, tabla_t = serie(moneda, db_path)
+    dias = pd.to_datetime(fechas, errors="coerce").to_numpy(dtype="datetime64[D]")
+    tasa = np.full(len(dias), float(fijo), dtype="float64")
+    if not len(tabla_f):
+        return tasa
+
+    con_fecha = ~np.isnat(dias)
+    pos = np.searchsorted(tabla_f, dias[con_fecha], side="right") - 1
+    tasa[con_fecha] = tabla_t[np.clip(pos, 0, len(tabla_t) - 1)]
+    return tasa
+
+
+def rango(fijo: float, moneda: str = "USD", db_path: Optional[Path] = None) -> Tuple[float, float]:
+    """(mínima, máxima) entre la serie y el tipo de cambio fijo (> 0)."""
+    _, tasas = serie(moneda, db_path)
+    valores = [float(fijo)] + ([float(tasas.min()), float(tasas.max())] if len(tasas) else [])
+    valores = [v for v in valores if v > 0]
+    return (min(valores), max(valores)) if valores else (0.0, 0.0)
@@ -0,0 +1,378 @@
+# src/matchers/candidates.py
+from __future__ import annotations
+import re
+import sys
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+# ------------------------------------------------------
+# Bootstrap de rutas
+# ------------------------------------------------------
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------
+# Importación corporativa
+# ------------------------------------------------------
+from src.core.logger import info, ok
+from src.core.env_loader import get_config
+from src.core.utils import normalize_text
+from src.loaders.migrations import ensure_rtree, ensure_fts, RTREE_TABLE, FTS_TABLE
+
+
+class CandidatesError(Exception):
+    pass
+
+
+_ORDINAL_1970 = 719163      # date(1970, 1, 1).toordinal()
+_EPS = 0.01                 # holgura de la caja (R*Tree guarda float32)
+
+
+# ======================================================
+# Candidatos desde disco · R*Tree monto × fecha
+# ======================================================
+class RTreeCandidates:
+    """
+    Proveedor de candidatos para MatcherEngine sin cargar bancos_pf:
+    por cada bloque de facturas arma sus cajas (tolerancia de monto ×
+    ventana de pago), las cruza con el R*Tree en una sola consulta y
+    trae de bancos_pf solo los movimientos que caen en alguna caja.
+
+    La caja es un superconjunto del filtro exacto de MatcherEngine
+    (que se sigue aplicando), así que el resultado no cambia; con
+    rtree_ventana_dias > 0 además se descartan movimientos fuera de
+    ± N días de la fecha de pago.
+    """
+
+    def __init__(
+        self,
+        monto_var: float,
+        tipo_cambio: float,
+        tipo_cambio_max: Optional[float] = None,
+        ventana_dias: Optional[int] = None,
+        bloque: Optional[int] = None,
+        db_path: Optional[Path] = None,
+    ):
+        cfg = get_config()
+        self.db_path = Path(db_path or cfg.db_pulseforge or cfg.db_destino)
+        if not ensure_rtree(self.db_path):
+            raise CandidatesError("SQLite sin módulo rtree")
+
+        self.monto_var = float(monto_var)
+        # Con tipo de cambio por fecha la caja USD cubre de la tasa mínima a la máxima
+        self.tipo_cambio = float(tipo_cambio or 0)
+        self.tipo_cambio_max = float(tipo_cambio_max or self.tipo_cambio)
+        self.ventana = int(cfg.matching.rtree_ventana_dias if ventana_dias is None else ventana_dias)
+        self.bloque = max(1, int(bloque or cfg.matching.rtree_bloque))
+
+        self.conn = sqlite3.connect(self.db_path)
+        self.consultas = 0
+        self.filas = 0
+
+        info(f"[Candidatos] R*Tree {RTREE_TABLE} · bloque {self.bloque} facturas · "
+             f"ventana {'±' + str(self.ventana) + ' días' if self.ventana else 'sin límite'}")
+
+    # --------------------------------------------------
+    # Huella de bancos_pf (para MatchProgress)
+    # --------------------------------------------------
+    def huella(self) -> str:
+        n, max_id, total = self.conn.execute(
+            "SELECT COUNT(*), MAX(id), TOTAL(monto) FROM bancos_pf"
+        ).fetchall()[0]
+        tc = f"{self.tipo_cambio}" if self.tipo_cambio_max == self.tipo_cambio \
+            else f"{self.tipo_cambio}-{self.tipo_cambio_max}"
+        return f"rtree|{n}|{max_id}|{total:.2f}|{self.ventana}|{tc}"
+
+    # --------------------------------------------------
+    # Cajas por factura (TOTAL_FINAL / DETRACCION × PEN / USD)
+    # --------------------------------------------------
+    def _cajas(self, df_f: pd.DataFrame, inicio: int) -> List[tuple]:
+        pos = pd.Series(range(inicio, inicio + len(df_f)), index=df_f.index)
+
+        f_lo = pd.Series(-1e9, index=df_f.index)
+        f_hi = pd.Series(1e9, index=df_f.index)
+        if self.ventana:
+            fecha = pd.Series(pd.NaT, index=df_f.index, dtype="datetime64[ns]")
+            for col in ("fecha_pago", "vencimiento", "fecha_emision"):
+                if col in df_f.columns:
+                    fecha = fecha.fillna(pd.to_datetime(df_f[col], errors="coerce"))
+            dias = (fecha - pd.Timestamp("1970-01-01")).dt.days + _ORDINAL_1970
+            f_lo = (dias - self.ventana).where(dias.notna(), f_lo)
+            f_hi = (dias + self.ventana).where(dias.notna(), f_hi)
+
+        cajas: List[tuple] = []
+        for col in ("total_final", "detraccion"):
+            if col not in df_f.columns:
+                continue
+            monto = pd.to_numeric(df_f[col], errors="coerce")
+            ok_ = monto > 0
+            lo = monto - self.monto_var - _EPS
+            hi = monto + self.monto_var + _EPS
+
+            cajas += zip(pos[ok_], lo[ok_], hi[ok_], [0] * int(ok_.sum()), f_lo[ok_], f_hi[ok_])
+            if self.tipo_cambio > 0:
+                cajas += zip(
+                    pos[ok_], lo[ok_] / self.tipo_cambio_max, hi[ok_] / self.tipo_cambio,
+                    [1] * int(ok_.sum()), f_lo[ok_], f_hi[ok_],
+                )
+        return cajas
+
+    # --------------------------------------------------
+    # Un bloque de facturas → (movimientos crudos, {posición: ids})
+    # --------------------------------------------------
+    def bloque_candidatos(
+        self, df_f: pd.DataFrame, inicio: int
+    ) -> Tuple[pd.DataFrame, Dict[int, List[int]]]:
+        conn = self.conn
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS pf_cajas (
+                pos INTEGER, lo REAL, hi REAL, usd INTEGER, f_lo REAL, f_hi REAL
+            )
+        """)
+        conn.execute("DELETE FROM temp.pf_cajas")
+        conn.executemany("INSERT INTO temp.pf_cajas VALUES (?, ?, ?, ?, ?, ?)",
+                         self._cajas(df_f, inicio))
+        conn.commit()
+
+        # CROSS JOIN fija el orden: cada caja consulta el R*Tree (sin él,
+        # SQLite recorre el R*Tree entero como tabla externa)
+        pares = conn.execute(f"""
+            SELECT c.pos, r.id
+            FROM temp.pf_cajas c
+            CROSS JOIN {RTREE_TABLE} r
+              ON r.monto_max >= c.lo AND r.monto_min <= c.hi
+             AND r.fecha_max >= c.f_lo AND r.fecha_min <= c.f_hi
+            WHERE r.usd = c.usd
+        """).fetchall()
+        self.consultas += 1
+
+        por_factura: Dict[int, List[int]] = {}
+        for p, i in pares:
+            por_factura.setdefault(p, []).append(int(i))
+        for p in por_factura:
+            por_factura[p] = sorted(set(por_factura[p]))
+
+        ids = sorted({i for _, i in pares})
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS pf_cand_ids (id INTEGER PRIMARY KEY)")
+        conn.execute("DELETE FROM temp.pf_cand_ids")
+        conn.executemany("INSERT INTO temp.pf_cand_ids VALUES (?)", [(i,) for i in ids])
+        conn.commit()
+
+        df_b = pd.read_sql_query(
+            "SELECT b.* FROM bancos_pf b JOIN temp.pf_cand_ids t ON t.id = b.id ORDER BY b.id",
+            conn,
+        )
+        self.filas += len(df_b)
+        return df_b, por_factura
+
+    def close(self):
+        try:
+            self.conn.close()
+        finally:
+            ok(f"[Candidatos] {self.consultas} consultas al R*Tree · {self.filas} movimientos leídos.")
+
+
+# ======================================================
+# Candidatos por nombre · FTS5 + BM25
+# ======================================================
+# Formas societarias y conectores: no distinguen a un cliente de otro
+_RUIDO = {
+    "sac", "saa", "sa", "srl", "eirl", "sociedad", "anonima", "cerrada",
+    "empresa", "cia", "de", "del", "la", "las", "los", "el", "y", "e",
+}
+
+
+class FTSNameCandidates:
+    """
+    Movimientos que mencionan al cliente, rankeados por BM25 contra los
+    términos de su razón social (descripcion + destinatario de bancos_pf).
+
+    Matcher calcula la similitud de nombre (SequenceMatcher / IA) solo
+    sobre estos hits; el resto de candidatos por monto/fecha queda con
+    similitud 0. Los rankings se cachean por nombre normalizado.
+    """
+
+    def __init__(self, limite: Optional[int] = None, db_path: Optional[Path] = None):
+        cfg = get_config()
+        self.db_path = Path(db_path or cfg.db_pulseforge or cfg.db_destino)
+        if not ensure_fts(self.db_path):
+            raise CandidatesError("SQLite sin FTS5")
+
+        self.limite = int(cfg.matching.fts_limite if limite is None else limite)
+        self.conn = sqlite3.connect(self.db_path)
+        self._rankings: Dict[str, Dict[int, float]] = {}
+        self._razones: Dict[str, str] = {}
+        self.consultas = 0
+
+        info(f"[Candidatos] FTS5 {FTS_TABLE} · "
+             f"{'top ' + str(self.limite) if self.limite else 'todos los'} hits por cliente")
+
+    # --------------------------------------------------
+    # Términos = normalize_text partido como el tokenizer unicode61
+    # --------------------------------------------------
+    @staticmethod
+    def terminos(nombre: str) -> List[str]:
+        palabras = re.split(r"[^a-z0-9]+", normalize_text(nombre))
+        return [p for p in dict.fromkeys(palabras) if len(p) > 1 and p not in _RUIDO]
+
+    def razon_social(self, ruc: Any) -> str:
+        """razon_social de clientes_pf por RUC (idx_cli_ruc), cacheada."""
+        ruc = str(ruc or "").strip()
+        if not ruc:
+            return ""
+        if ruc not in self._razones:
+            fila = self.conn.execute(
+                "SELECT razon_social FROM clientes_pf WHERE ruc = ? LIMIT 1", (ruc,)
+            ).fetchall()
+            self._razones[ruc] = str(fila[0][0] or "") if fila else ""
+        return self._razones[ruc]
+
+    def ranking(self, nombre: str) -> Dict[int, float]:
+        """{id bancos_pf: bm25} (menor = más relevante) de los movimientos que mencionan `nombre`."""
+        terminos = self.terminos(nombre)
+        clave = " ".join(terminos)
+        if clave in self._rankings:
+            return self._rankings[clave]
+
+        hits: Dict[int, float] = {}
+        if terminos:
+            consulta = " OR ".join(f'"{t}"' for t in terminos)
+            sql = f"""
+                SELECT rowid, bm25({FTS_TABLE}) FROM {FTS_TABLE}
+                WHERE {FTS_TABLE} MATCH ? ORDER BY rank
+            """
+            params: tuple = (consulta,)
+            if self.limite:
+                sql += " LIMIT ?"
+                params += (self.limite,)
+            hits = {int(i): float(r) for i, r in self.conn.execute(sql, params).fetchall()}
+            self.consultas += 1
+
+        self._rankings[clave] = hits
+        return hits
+
+    def close(self):
+        try:
+            self.conn.close()
+        finally:
+            ok(f"[Candidatos] {self.consultas} búsquedas FTS5 · {len(self._rankings)} clientes.")
+
+
+# ======================================================
+# Candidatos por clave · RUC y serie-número en el texto
+# ======================================================
+# RUC peruano: 10/15/16/17/20 + 9 dígitos
+_RE_RUC = re.compile(r"(?<!\d)((?:10|15|16|17|20)\d{9})(?!\d)")
+# Serie-número de comprobante: f001-277, e001 - 0045…
+_RE_DOC = re.compile(r"\b([a-z][a-z0-9]{3})\s?-\s?0*(\d{1,8})\b")
+
+
+def extraer_claves(textos: pd.Series) -> pd.DataFrame:
+    """
+    RUCs y serie-números citados en textos ya normalizados (normalize_text).
+    Devuelve [pos, tipo ('RUC'|'DOC'), clave] con pos = índice de `textos`;
+    la clave DOC es SERIE-NUMERO sin ceros a la izquierda (p.ej. F001-277).
+    """
+    partes = []
+
+    rucs = textos.str.extractall(_RE_RUC)
+    if not rucs.empty:
+        partes.append(pd.DataFrame({
+            "pos": rucs.index.get_level_values(0), "tipo": "RUC", "clave": rucs[0].to_numpy(),
+        }))
+
+    docs = textos.str.extractall(_RE_DOC)
+    if not docs.empty:
+        partes.append(pd.DataFrame({
+            "pos": docs.index.get_level_values(0), "tipo": "DOC",
+            "clave": (docs[0].str.upper() + "-" + docs[1]).to_numpy(),
+        }))
+
+    if not partes:
+        return pd.DataFrame(columns=["pos", "tipo", "clave"])
+    return pd.concat(partes, ignore_index=True).drop_duplicates()
+
+
+class ReferenceCandidates:
+    """
+    Claves extraídas de bancos (descripcion / destinatario / tipo_documento)
+    → facturas, vía los índices de la BD destino:
+
+        DOC  serie-número  → facturas_pf(serie, numero)   idx_inv_serie_num
+        RUC  de un cliente → clientes_pf(ruc)             idx_cli_ruc
+                           → facturas_pf(ruc)             idx_inv_ruc
+
+    Un RUC que no está en clientes_pf (cuentas, DNIs, ruido) no produce
+    candidatos. Cada consulta es un solo JOIN contra una TEMP de claves.
+    """
+
+    def __init__(self, db_path: Optional[Path] = None):
+        cfg = get_config()
+        self.db_path = Path(db_path or cfg.db_pulseforge or cfg.db_destino)
+        self.conn = sqlite3.connect(self.db_path)
+        self.claves = 0
+        self.hits = 0
+
+    def facturas(self, claves: pd.DataFrame) -> pd.DataFrame:
+        """[pos, tipo, clave] → [pos, factura_id, tipo]."""
+        if claves.empty:
+            return pd.DataFrame(columns=["pos", "factura_id", "tipo"])
+
+        # Una consulta por clave distinta (un RUC se repite en muchos movimientos)
+        unicas = claves[["tipo", "clave"]].drop_duplicates()
+        es_doc = unicas["tipo"] == "DOC"
+        doc = unicas["clave"].astype(str).str.split("-", n=1)
+        filas = pd.DataFrame({
+            "tipo": unicas["tipo"],
+            "clave": unicas["clave"],
+            "serie": doc.str[0].where(es_doc),
+            "numero": doc.str[1].where(es_doc),
+        })
+        filas = filas.astype(object).where(filas.notna(), None)
+
+        conn = self.conn
+        conn.execute("""
+            CREATE TEMP TABLE IF NOT EXISTS pf_claves (
+                tipo TEXT, clave TEXT, serie TEXT, numero TEXT
+            )
+        """)
+        conn.execute("DELETE FROM temp.pf_claves")
+        conn.executemany("INSERT INTO temp.pf_claves VALUES (?, ?, ?, ?)",
+                         filas.itertuples(index=False, name=None))
+        conn.commit()
+
+        # CROSS JOIN fija el orden: cada clave busca por índice
+        hits = pd.read_sql_query("""
+            SELECT k.tipo, k.clave, f.id AS factura_id
+            FROM temp.pf_claves k
+            CROSS JOIN facturas_pf f ON f.serie = k.serie AND f.numero = k.numero
+            WHERE k.tipo = 'DOC'
+            UNION ALL
+            SELECT k.tipo, k.clave, f.id
+            FROM temp.pf_claves k
+            CROSS JOIN facturas_pf f ON f.ruc = k.clave
+            WHERE k.tipo = 'RUC'
+              AND EXISTS (SELECT 1 FROM clientes_pf c WHERE c.ruc = k.clave)
+        """, conn)
+
+        df = claves.merge(hits, on=["tipo", "clave"])[["pos", "factura_id", "tipo"]]
+        self.claves += len(filas)
+        self.hits += len(df)
+        return df.drop_duplicates().reset_index(drop=True)
+
+    def razones_sociales(self) -> Dict[str, str]:
+        """{ruc: razon_social} de clientes_pf."""
+        filas = self.conn.execute(
+            "SELECT ruc, razon_social FROM clientes_pf WHERE ruc IS NOT NULL AND ruc <> ''"
+        ).fetchall()
+        return {str(r).strip(): str(n or "") for r, n in filas}
+
+    def close(self):
+        try:
+            self.conn.close()
+        finally:
+            ok(f"[Candidatos] {self.claves} claves RUC/serie-número · {self.hits} facturas candidatas.")
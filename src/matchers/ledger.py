@@ -0,0 +1,581 @@
+# src/matchers/ledger.py
+from __future__ import annotations
+import sys
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------
+# Bootstrap de rutas
+# ------------------------------------------------------
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------
+# Importación corporativa
+# ------------------------------------------------------
+from src.core.logger import info, ok, warn
+from src.core.utils import to_cents
+
+
+SIN_FECHA = np.iinfo(np.int32).min      # día "vacío" (NaT)
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+# Columnas de texto del libro → columna del DataFrame preparado
+TEXTOS = {
+    "descripcion": "descripcion_banco",
+    "operacion": "operacion_banco",
+    "destinatario": "destinatario",
+    "tipo_documento": "tipo_documento",
+}
+
+
+# ======================================================
+# Pool de textos persistido (bytes UTF-8 + offsets)
+# ======================================================
+class TextPool:
+    """
+    Pool de textos como en BankLedger.pool (el último id es el nulo), pero
+    en dos arreglos planos que se pueden mapear desde disco: bytes UTF-8
+    contiguos y offsets. Cada string se decodifica al pedirlo, una vez.
+    """
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self.blob = blob
+        self.offsets = offsets
+        self._cache: Dict[int, str] = {}
+
+    @classmethod
+    def codificar(cls, pool: np.ndarray) -> "TextPool":
+        datos = [str(v).encode("utf-8") for v in pool[:-1]]
+        offsets = np.zeros(len(datos) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(d) for d in datos], dtype=np.int64)
+        return cls(np.frombuffer(b"".join(datos), dtype=np.uint8), offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)    # textos + nulo
+
+    def _texto(self, i: int) -> Optional[str]:
+        if i >= len(self.offsets) - 1:
+            return None
+        v = self._cache.get(i)
+        if v is None:
+            v = bytes(self.blob[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+            self._cache[i] = v
+        return v
+
+    def __getitem__(self, idx):
+        if np.isscalar(idx):
+            return self._texto(int(idx))
+        unicos, inversa = np.unique(np.asarray(idx), return_inverse=True)
+        textos = np.empty(len(unicos), dtype=object)
+        textos[:] = [self._texto(i) for i in unicos.tolist()]
+        return textos[inversa]
+
+    def todos(self) -> np.ndarray:
+        return self[np.arange(len(self))]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.blob.nbytes + self.offsets.nbytes)
+
+
+# ======================================================
+# Libro de movimientos en arreglos
+# ======================================================
+class BankLedger:
+    """
+    Movimientos bancarios en arreglos NumPy, armado una vez por corrida y
+    compartido por MatcherEngine / TieredMatcher / Matcher:
+
+        - montos en céntimos int64 (Monto_PEN y monto original)
+        - fecha como día int32 desde 1970 (SIN_FECHA = NaT)
+        - banco y moneda categóricos (código int16 + categorías)
+        - textos internados: un solo pool de strings únicos y un id
+          int32 por movimiento y columna
+
+    Los candidatos se piden por posición (rango de montos, ventana de
+    fechas) y solo esas filas se materializan en DataFrame con frame().
+    save() / load() lo persisten en .npy mapeables (ver LedgerStore).
+    """
+
+    VERSION = 1
+    ARREGLOS = ("ids", "cent", "monto_cent", "dia", "banco_cod", "moneda_cod", "detraccion")
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        indice: np.ndarray,
+        cent: np.ndarray,
+        monto_cent: np.ndarray,
+        dia: np.ndarray,
+        banco: Tuple[np.ndarray, np.ndarray],
+        moneda: Tuple[np.ndarray, np.ndarray],
+        detraccion: np.ndarray,
+        textos: Dict[str, np.ndarray],
+        pool: np.ndarray,
+    ):
+        self.ids = ids
+        self.indice = indice
+        self.cent = cent
+        self.monto_cent = monto_cent
+        self.dia = dia
+        self.banco_cod, self.bancos = banco
+        self.moneda_cod, self.monedas = moneda
+        self.detraccion = detraccion
+        self.textos = textos
+        self.pool = pool
+
+        self._por_monto: Optional[np.ndarray] = None
+        self._por_dia: Optional[np.ndarray] = None
+        self._posicion: Optional[pd.Index] = None
+
+    def __len__(self) -> int:
+        return len(self.cent)
+
+    # --------------------------------------------------
+    # Construcción
+    # --------------------------------------------------
+    @staticmethod
+    def _categorias(s: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+        cod, cats = pd.factorize(s, use_na_sentinel=True)
+        return cod.astype(np.int16), np.asarray(cats, dtype=object)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "BankLedger":
+        """
+        Desde bancos ya preparados (MatcherEngine._prepare_bancos): usa
+        Monto_PEN_cent, fecha, banco_codigo, moneda, en_detraccion y las
+        columnas de TEXTOS que existan.
+        """
+        n = len(df)
+        vacio = pd.Series("", index=df.index)
+
+        if "Monto_PEN_cent" in df.columns:
+            cent = df["Monto_PEN_cent"].fillna(0).to_numpy(dtype=np.int64)
+        else:
+            cent = to_cents(pd.to_numeric(df.get("Monto_PEN", vacio), errors="coerce")).to_numpy()
+        monto = df["monto"] if "monto" in df.columns else df.get("Monto", df.get("Monto_PEN", vacio))
+        monto_cent = to_cents(pd.to_numeric(monto, errors="coerce")).to_numpy()
+
+        fecha = pd.to_datetime(df.get("fecha", pd.Series(pd.NaT, index=df.index)), errors="coerce")
+        dias = fecha.to_numpy(dtype="datetime64[D]")
+        dia = np.full(n, SIN_FECHA, dtype=np.int32)
+        con_fecha = ~np.isnat(dias)
+        dia[con_fecha] = (dias[con_fecha] - _EPOCH).astype(np.int32)
+
+        moneda = df.get("moneda", pd.Series("PEN", index=df.index)).fillna("PEN").astype(str).str.upper().str.strip()
+        det = df.get("en_detraccion", pd.Series(False, index=df.index)).fillna(False).astype(bool).to_numpy()
+
+        # Un pool para todas las columnas de texto: lo repetido se guarda una vez
+        presentes = {k: c for k, c in TEXTOS.items() if c in df.columns}
+        if presentes:
+            todos = pd.concat([df[c].astype(object) for c in presentes.values()], ignore_index=True)
+            cod, pool = pd.factorize(todos.where(todos.notna(), None), use_na_sentinel=True)
+            pool = np.append(np.asarray(pool, dtype=object), None)   # último = nulo
+            cod = np.where(cod < 0, len(pool) - 1, cod).astype(np.int32)
+            textos = {k: cod[i * n:(i + 1) * n] for i, k in enumerate(presentes)}
+        else:
+            pool = np.array([None], dtype=object)
+            textos = {}
+
+        ids = df["id"].to_numpy() if "id" in df.columns else np.arange(n, dtype=np.int64)
+        if ids.dtype == object:
+            numericos = pd.to_numeric(df["id"], errors="coerce")
+            if numericos.notna().all() and (numericos % 1 == 0).all():
+                ids = numericos.to_numpy(dtype=np.int64)
+
+        indice = df.index.to_numpy()
+        if isinstance(df.index, pd.RangeIndex) and df.index.start == 0 and df.index.step == 1:
+            indice = None
+
+        return cls(
+            ids=ids,
+            indice=indice,
+            cent=cent,
+            monto_cent=monto_cent,
+            dia=dia,
+            banco=cls._categorias(df.get("banco_codigo", pd.Series(None, index=df.index, dtype=object))),
+            moneda=cls._categorias(moneda),
+            detraccion=det,
+            textos=textos,
+            pool=pool,
+        )
+
+    # --------------------------------------------------
+    # Columnas (opcionalmente solo posiciones `pos`)
+    # --------------------------------------------------
+    @staticmethod
+    def _decodificar(cod: np.ndarray, cats: np.ndarray) -> np.ndarray:
+        out = np.empty(len(cod), dtype=object)
+        ok_ = cod >= 0
+        out[ok_] = cats[cod[ok_]]
+        out[~ok_] = None
+        return out
+
+    def texto(self, columna: str, pos=None) -> np.ndarray:
+        cod = self.textos.get(columna)
+        if cod is None:
+            return np.full(len(self) if pos is None else len(pos), None, dtype=object)
+        return self.pool[cod if pos is None else cod[pos]]
+
+    def fechas(self, pos=None) -> np.ndarray:
+        d = self.dia if pos is None else self.dia[pos]
+        out = np.full(len(d), np.datetime64("NaT"), dtype="datetime64[ns]")
+        con_fecha = d != SIN_FECHA
+        out[con_fecha] = (_EPOCH + d[con_fecha].astype(np.int64)).astype("datetime64[ns]")
+        return out
+
+    def dias(self) -> np.ndarray:
+        """Día float (NaN sin fecha), el formato de TieredMatcher."""
+        return np.where(self.dia == SIN_FECHA, np.nan, self.dia.astype(np.float64))
+
+    def banco(self, pos=None) -> np.ndarray:
+        return self._decodificar(self.banco_cod if pos is None else self.banco_cod[pos], self.bancos)
+
+    def moneda(self, pos=None) -> np.ndarray:
+        return self._decodificar(self.moneda_cod if pos is None else self.moneda_cod[pos], self.monedas)
+
+    def unicos(self, columnas: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (código por movimiento, posición representante por código) de la
+        combinación de textos `columnas`: normalizar / extraer claves cuesta
+        lo que las combinaciones distintas, no lo que los movimientos.
+        """
+        cod = np.zeros(len(self), dtype=np.int64)
+        for c in columnas:
+            if c in self.textos:
+                # Refactorizar en cada columna: la combinación nunca desborda int64
+                cod, _ = pd.factorize(cod * len(self.pool) + self.textos[c])
+        cod = cod.astype(np.int64)
+        n = int(cod.max()) + 1 if len(cod) else 0
+        rep = np.zeros(n, dtype=np.int64)
+        rep[cod[::-1]] = np.arange(len(cod))[::-1]
+        return cod, rep
+
+    # --------------------------------------------------
+    # Búsquedas
+    # --------------------------------------------------
+    def orden_monto(self) -> np.ndarray:
+        """Posiciones ordenadas por céntimos (se arma una vez / viene de disco)."""
+        if self._por_monto is None:
+            self._por_monto = np.argsort(self.cent, kind="stable")
+        return self._por_monto
+
+    def orden_dia(self) -> np.ndarray:
+        if self._por_dia is None:
+            self._por_dia = np.argsort(self.dia, kind="stable")
+        return self._por_dia
+
+    def rango(self, lo: int, hi: int, pos: Optional[np.ndarray] = None,
+              detraccion: Optional[bool] = None) -> np.ndarray:
+        """Posiciones con lo ≤ céntimos ≤ hi (en orden de llegada)."""
+        if pos is None:
+            orden = self.orden_monto()
+            a, b = np.searchsorted(self.cent[orden], [lo, hi + 1])
+            sel = np.sort(orden[a:b])
+        else:
+            pos = np.asarray(pos, dtype=np.int64)
+            sel = pos[(self.cent[pos] >= lo) & (self.cent[pos] <= hi)]
+        if detraccion is not None:
+            sel = sel[self.detraccion[sel] == detraccion]
+        return sel
+
+    def ventana(self, desde, hasta) -> np.ndarray:
+        """Posiciones con fecha en [desde, hasta] (días; en orden de llegada)."""
+        orden = self.orden_dia()
+        lo = int((np.datetime64(pd.Timestamp(desde).ceil("D"), "D") - _EPOCH).astype(np.int64))
+        hi = int((np.datetime64(pd.Timestamp(hasta), "D") - _EPOCH).astype(np.int64))
+        a, b = np.searchsorted(self.dia[orden], [max(lo, SIN_FECHA + 1), hi + 1])
+        return np.sort(orden[a:b])
+
+    def posiciones(self, ids) -> np.ndarray:
+        """ids de movimiento → posiciones (-1 si no está)."""
+        if self._posicion is None:
+            self._posicion = pd.Index(self.ids)
+        return self._posicion.get_indexer(ids)
+
+    # --------------------------------------------------
+    # Materialización
+    # --------------------------------------------------
+    def frame(self, pos=None) -> pd.DataFrame:
+        """
+        Filas `pos` (todas si None) con las columnas de _prepare_bancos y
+        los nombres que espera Matcher (Fecha, Banco, Descripcion, …).
+        """
+        pos = np.arange(len(self)) if pos is None else np.asarray(pos, dtype=np.int64)
+        fecha = self.fechas(pos)
+        banco = self.banco(pos)
+        desc = self.texto("descripcion", pos)
+        oper = self.texto("operacion", pos)
+        monto_pen = self.cent[pos] / 100
+
+        df = pd.DataFrame({
+            "id": self.ids[pos],
+            "fecha": fecha,
+            "monto": self.monto_cent[pos] / 100,
+            "moneda": self.moneda(pos),
+            "banco_codigo": banco,
+            "descripcion": desc,
+            "operacion": oper,
+            "destinatario": self.texto("destinatario", pos),
+            "tipo_documento": self.texto("tipo_documento", pos),
+            "Monto_PEN": monto_pen,
+            "Monto_PEN_cent": self.cent[pos],
+            "descripcion_banco": desc,
+            "operacion_banco": oper,
+            "en_detraccion": self.detraccion[pos],
+            # Nombres de Matcher
+            "Fecha": fecha,
+            "Banco": pd.Series(banco, dtype=object).astype(str).to_numpy(),
+            "Descripcion": desc,
+            "Operacion": oper,
+            "Monto": self.monto_cent[pos] / 100,
+        }, index=pos if self.indice is None else self.indice[pos])
+        return df
+
+    def huella(self) -> bytes:
+        """Bytes estables de ids + montos (huella de reanudación)."""
+        h = hashlib.sha1()
+        h.update(pd.util.hash_array(np.asarray(self.ids)).tobytes())
+        h.update(self.cent.tobytes())
+        return h.digest()
+
+    def memoria(self) -> int:
+        """Bytes aproximados: arreglos + strings del pool."""
+        arreglos = [self.cent, self.monto_cent, self.dia, self.banco_cod, self.moneda_cod,
+                    self.detraccion, *self.textos.values()]
+        total = sum(a.nbytes for a in arreglos)
+        total += self.ids.nbytes
+        if self.ids.dtype == object:
+            total += sum(sys.getsizeof(v) for v in self.ids)
+        total += self.indice.nbytes if self.indice is not None else 0
+        total += self.pool.nbytes
+        if isinstance(self.pool, np.ndarray):
+            total += sum(sys.getsizeof(s) for s in self.pool if s is not None)
+        total += sum(sys.getsizeof(s) for s in (*self.bancos, *self.monedas))
+        return int(total)
+
+    # --------------------------------------------------
+    # Anexar movimientos nuevos
+    # --------------------------------------------------
+    @staticmethod
+    def _unir_categorias(a: Tuple[np.ndarray, np.ndarray],
+                         b: Tuple[np.ndarray, np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        (cod_a, cats_a), (cod_b, cats_b) = a, b
+        cats = list(cats_a)
+        donde = {c: i for i, c in enumerate(cats)}
+        mapa = np.full(len(cats_b) + 1, -1, dtype=np.int16)    # último = nulo
+        for k, c in enumerate(cats_b):
+            if c not in donde:
+                donde[c] = len(cats)
+                cats.append(c)
+            mapa[k] = donde[c]
+        cod_b = mapa[np.where(cod_b >= 0, cod_b, len(cats_b))]
+        return np.concatenate([cod_a, cod_b]).astype(np.int16), np.array(cats, dtype=object)
+
+    def anexar(self, otro: "BankLedger") -> "BankLedger":
+        """
+        Libro con los movimientos de `otro` al final: categorías y pool se
+        unen (lo ya presente reusa su id), los arreglos se concatenan.
+        """
+        decodificar = lambda p: p.todos() if isinstance(p, TextPool) else np.asarray(p)
+        viejo = decodificar(self.pool)
+        textos = list(viejo[:-1])
+        donde = {t: i for i, t in enumerate(textos)}
+        mapa = np.empty(len(otro.pool), dtype=np.int32)
+        for k, t in enumerate(decodificar(otro.pool)[:-1]):
+            if t not in donde:
+                donde[t] = len(textos)
+                textos.append(t)
+            mapa[k] = donde[t]
+        nulo = len(textos)
+        mapa[-1] = nulo
+        pool = np.empty(nulo + 1, dtype=object)
+        pool[:nulo] = textos
+        pool[nulo] = None
+
+        columnas = list(self.textos) + [c for c in otro.textos if c not in self.textos]
+        unidos = {}
+        for c in columnas:
+            a = self.textos.get(c)
+            a = np.full(len(self), nulo, dtype=np.int32) if a is None else \
+                np.where(a == len(viejo) - 1, nulo, a).astype(np.int32)
+            b = otro.textos.get(c)
+            b = np.full(len(otro), nulo, dtype=np.int32) if b is None else mapa[b]
+            unidos[c] = np.concatenate([a, b])
+
+        indice = None
+        if self.indice is not None or otro.indice is not None:
+            indice = np.concatenate([
+                np.arange(len(self)) if self.indice is None else self.indice,
+                np.arange(len(otro)) + len(self) if otro.indice is None else otro.indice,
+            ])
+
+        return BankLedger(
+            ids=np.concatenate([self.ids, otro.ids]),
+            indice=indice,
+            cent=np.concatenate([self.cent, otro.cent]),
+            monto_cent=np.concatenate([self.monto_cent, otro.monto_cent]),
+            dia=np.concatenate([self.dia, otro.dia]),
+            banco=self._unir_categorias((self.banco_cod, self.bancos), (otro.banco_cod, otro.bancos)),
+            moneda=self._unir_categorias((self.moneda_cod, self.monedas), (otro.moneda_cod, otro.monedas)),
+            detraccion=np.concatenate([self.detraccion, otro.detraccion]),
+            textos=unidos,
+            pool=pool,
+        )
+
+    # --------------------------------------------------
+    # Persistencia (.npy mapeables + meta.json)
+    # --------------------------------------------------
+    def save(self, ruta: Path, meta: Optional[Dict[str, Any]] = None):
+        """
+        Un .npy por arreglo (np.load(mmap_mode="r") los mapea sin leerlos)
+        y meta.json. Se escribe en un directorio aparte y se reemplaza al
+        final: un corte a medias nunca deja un libro mezclado.
+        """
+        if self.ids.dtype == object or self.indice is not None:
+            raise ValueError("Solo se persisten libros con ids numéricos e índice por posición")
+
+        ruta = Path(ruta)
+        tmp = ruta.with_name(ruta.name + ".tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        arreglos = {n: getattr(self, n) for n in self.ARREGLOS}
+        arreglos.update({f"texto_{c}": cod for c, cod in self.textos.items()})
+        pool = self.pool if isinstance(self.pool, TextPool) else TextPool.codificar(self.pool)
+        arreglos.update({
+            "pool_bytes": pool.blob, "pool_offsets": pool.offsets,
+            "por_monto": self.orden_monto(), "por_dia": self.orden_dia(),
+        })
+        for nombre, arr in arreglos.items():
+            np.save(tmp / f"{nombre}.npy", np.ascontiguousarray(arr), allow_pickle=False)
+
+        (tmp / "meta.json").write_text(json.dumps({
+            "version": self.VERSION, "filas": len(self), "textos": list(self.textos),
+            "bancos": list(self.bancos), "monedas": list(self.monedas), **(meta or {}),
+        }, default=str), encoding="utf-8")
+
+        shutil.rmtree(ruta, ignore_errors=True)
+        tmp.rename(ruta)
+
+    @classmethod
+    def load(cls, ruta: Path, mmap: bool = True) -> Tuple[Optional["BankLedger"], Dict[str, Any]]:
+        """(libro, meta) desde save(); (None, {}) si falta, es de otra versión o está corrupto."""
+        ruta = Path(ruta)
+        modo = "r" if mmap else None
+        try:
+            meta = json.loads((ruta / "meta.json").read_text(encoding="utf-8"))
+            if meta.get("version") != cls.VERSION:
+                return None, {}
+            leer = lambda n: np.load(ruta / f"{n}.npy", mmap_mode=modo, allow_pickle=False)
+            arr = {n: leer(n) for n in (*cls.ARREGLOS, "pool_bytes", "pool_offsets", "por_monto", "por_dia")}
+            textos = {c: leer(f"texto_{c}") for c in meta["textos"]}
+        except Exception:
+            return None, {}
+
+        n = int(meta.get("filas", -1))
+        if any(len(arr[k]) != n for k in (*cls.ARREGLOS, "por_monto", "por_dia")) or \
+                any(len(t) != n for t in textos.values()):
+            return None, {}
+
+        libro = cls(
+            ids=arr["ids"],
+            indice=None,
+            cent=arr["cent"],
+            monto_cent=arr["monto_cent"],
+            dia=arr["dia"],
+            banco=(arr["banco_cod"], np.array(meta["bancos"], dtype=object)),
+            moneda=(arr["moneda_cod"], np.array(meta["monedas"], dtype=object)),
+            detraccion=arr["detraccion"],
+            textos=textos,
+            pool=TextPool(arr["pool_bytes"], arr["pool_offsets"]),
+        )
+        libro._por_monto = arr["por_monto"]
+        libro._por_dia = arr["por_dia"]
+        return libro, meta
+
+
+# ======================================================
+# Libro de bancos_pf persistido entre corridas
+# ======================================================
+class LedgerStore:
+    """
+    BankLedger de bancos_pf en data/temp/libro_bancos, sellado con la
+    tabla (filas, máximo id y suma de ids hasta ese máximo) y con la
+    configuración que cambia la preparación (tipo de cambio, cuenta de
+    detracciones). Al cargar:
+
+        - sello y configuración iguales → arreglos mapeados de disco
+        - solo hay ids mayores (BankWriter reemplaza con id nuevo) → se
+          preparan esas filas y se anexan
+        - bajas / reemplazos / otra configuración → libro completo
+
+    Un UPDATE en sitio sobre bancos_pf (fuera de BankWriter) no cambia
+    el sello: borrar el directorio fuerza la reconstrucción.
+    """
+
+    NOMBRE = "libro_bancos"
+
+    def __init__(self, engine, ruta: Optional[Path] = None):
+        self.engine = engine
+        if ruta is None:
+            temp_dir = Path(engine.cfg.temp_dir)
+            if not temp_dir.is_absolute():
+                temp_dir = ROOT / temp_dir
+            ruta = temp_dir / self.NOMBRE
+        self.ruta = Path(ruta)
+
+    @staticmethod
+    def _sello(libro: BankLedger) -> Dict[str, int]:
+        ids = np.asarray(libro.ids, dtype=np.int64)
+        return {"filas": len(ids), "max_id": int(ids.max()) if len(ids) else 0, "suma_ids": int(ids.sum())}
+
+    def _guardar(self, libro: BankLedger, config: str) -> BankLedger:
+        try:
+            t0 = time.perf_counter()
+            libro.save(self.ruta, {**self._sello(libro), "config": config})
+            info(f"Índice de bancos guardado → {self.ruta} ({time.perf_counter() - t0:.2f}s)")
+        except Exception as e:
+            warn(f"No se pudo guardar el índice de bancos ({e}) → solo en memoria.")
+        return libro
+
+    def cargar(self, conn) -> BankLedger:
+        t0 = time.perf_counter()
+        config = self.engine.huella_libro()
+        libro, meta = BankLedger.load(self.ruta)
+
+        if libro is not None and meta.get("config") == config:
+            filas, suma = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(id), 0) FROM bancos_pf WHERE id <= ?", (meta["max_id"],)
+            ).fetchone()
+            if filas == meta["filas"] and suma == meta["suma_ids"]:
+                nuevos = pd.read_sql_query(
+                    "SELECT * FROM bancos_pf WHERE id > ? ORDER BY id", conn, params=(meta["max_id"],)
+                )
+                if nuevos.empty:
+                    ok(f"Índice de bancos desde disco: {len(libro)} movimientos · "
+                       f"{(time.perf_counter() - t0) * 1000:.0f} ms")
+                    return libro
+
+                info(f"Índice de bancos: {len(nuevos)} movimientos nuevos → se anexan a {len(libro)}")
+                delta = BankLedger.from_frame(self.engine._prepare_bancos(nuevos))
+                return self._guardar(libro.anexar(delta), config)
+
+            info("bancos_pf cambió (bajas o reemplazos) → índice de bancos completo.")
+        elif libro is not None:
+            info("Configuración de bancos distinta → índice de bancos completo.")
+
+        df = pd.read_sql_query("SELECT * FROM bancos_pf ORDER BY id", conn)
+        libro = self.engine.ledger(df)
+        if not len(libro):
+            return libro
+        return self._guardar(libro, config)
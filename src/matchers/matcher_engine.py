@@ -1,9 +1,12 @@
 # src/matchers/matcher_engine.py
 from __future__ import annotations
+import re
 import sys
 import time
+import hashlib
 from pathlib import Path
-from typing import Tuple
+from typing import Optional, Tuple
+import numpy as np
 import pandas as pd
 
 # ------------------------------------------------------
@@ -16,9 +19,13 @@ if str(ROOT) not in sys.path:
 # ------------------------------------------------------
 # Importación corporativa
 # ------------------------------------------------------
-from src.core.logger import info, ok, warn
+from src.core.logger import info, ok
 from src.core.env_loader import get_env, get_config
+from src.core.utils import to_cents, amount_cents
 from src.transformers.calculator import Calculator
+from src.loaders.stage_store import huella
+from src.matchers.tiered import TieredMatcher, TieredError, PASADAS
+from src.matchers.ledger import BankLedger
 
 # IA opcional
 try:
@@ -63,8 +70,19 @@ class MatcherEngine:
             or float(get_env("MONTO_VARIACION", default=0.50))
         )
 
+        self.monto_var_cent = int(round(self.monto_var * 100))
+
         self.min_score_match = 0.55
 
+        # Cuenta de detracciones (Banco de la Nación): código de banco, tabla
+        # de tablas_bancos o número de cuenta citado en el movimiento
+        self.cuenta_detraccion = str(self.cfg.cuenta_detraccion or "").strip()
+
+        # Pasadas ordenadas (exacta → tolerancia → nombre → ia); vacío = bucle clásico
+        self.pasadas = [p for p in self.cfg.matching.match_pasadas if p]
+        if self.pasadas:
+            info(f"Matching por pasadas: {' → '.join(self.pasadas)} (válidas: {', '.join(PASADAS)})")
+
         ok("MatcherEngine cargado correctamente.")
 
     # --------------------------------------------------
@@ -91,36 +109,94 @@ class MatcherEngine:
 
         if "Monto_PEN" not in df.columns:
             df["Monto_PEN"] = pd.to_numeric(df.get("monto"), errors="coerce").fillna(0)
+        if "Monto_PEN_cent" not in df.columns:
+            df["Monto_PEN_cent"] = to_cents(df["Monto_PEN"])
 
         df["descripcion_banco"] = df.get("descripcion", "").astype(str)
         df["operacion_banco"] = df.get("operacion", "").astype(str)
         df["banco_codigo"] = df.get("banco_codigo")
+        df["en_detraccion"] = self._en_cuenta_detraccion(df)
 
         return df
 
+    def ledger(self, df_bancos: pd.DataFrame) -> BankLedger:
+        """
+        Bancos crudos → BankLedger (una vez por corrida). El DataFrame
+        preparado se descarta: el matching trabaja sobre los arreglos.
+        """
+        df = self._prepare_bancos(df_bancos)
+        libro = BankLedger.from_frame(df)
+        pesado = int(df.memory_usage(deep=True).sum())
+        if len(libro):
+            info(f"Libro de bancos: {len(libro)} movimientos · {libro.memoria() / 1e6:.1f} MB "
+                 f"(DataFrame {pesado / 1e6:.1f} MB, {pesado / max(libro.memoria(), 1):.1f}×)")
+        return libro
+
+    def huella_libro(self) -> str:
+        """Configuración que cambia lo que arma ledger() (índice de bancos en disco)."""
+        return huella(
+            BankLedger.VERSION,
+            self.calc.huella_tipo_cambio(),
+            self.cuenta_detraccion,
+            self.cfg.tablas_bancos if self.cuenta_detraccion else {},
+        )
+
+    def _en_cuenta_detraccion(self, df: pd.DataFrame) -> pd.Series:
+        """True para los movimientos de la cuenta de detracciones."""
+        en = pd.Series(False, index=df.index)
+        if not self.cuenta_detraccion:
+            return en
+
+        cuenta = self.cuenta_detraccion.upper()
+        codigos = {cuenta} | {
+            str(alias).upper() for alias, tabla in self.cfg.tablas_bancos.items()
+            if str(tabla).upper() == cuenta
+        }
+        en |= df["banco_codigo"].fillna("").astype(str).str.strip().str.upper().isin(codigos)
+
+        # Número de cuenta citado (sin guiones ni espacios)
+        digitos = re.sub(r"\D", "", cuenta)
+        if len(digitos) >= 6:
+            texto = pd.Series("", index=df.index)
+            for col in ("descripcion", "destinatario", "tipo_documento"):
+                if col in df.columns:
+                    texto = texto + " " + df[col].fillna("").astype(str)
+            en |= texto.str.replace(r"[\s\-.]", "", regex=True).str.contains(digitos, regex=False)
+        return en
+
     # --------------------------------------------------
     # Filtrar candidatos (DOBLE MATCH REAL)
     # --------------------------------------------------
-    def _filtrar_candidatos(self, fac: pd.Series, df_bancos: pd.DataFrame) -> pd.DataFrame:
+    def _filtrar_candidatos(self, fac: pd.Series, libro: BankLedger,
+                            pos: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """
+        Candidatos de `libro` (solo las posiciones `pos` si se indican).
+        Con cuenta_detraccion configurada, la DETRACCION solo se busca en los
+        movimientos de esa cuenta y el TOTAL_FINAL solo fuera de ella.
+        """
         candidatos = []
+        por_cuenta = bool(self.cuenta_detraccion)
 
         for tipo, monto in [
             ("TOTAL_FINAL", fac.get("total_final")),
             ("DETRACCION", fac.get("detraccion")),
         ]:
-            if monto is None or monto <= 0:
+            if monto is None or pd.isna(monto) or monto <= 0:
                 continue
-
-            df = df_bancos[
-                (df_bancos["Monto_PEN"] >= monto - self.monto_var) &
-                (df_bancos["Monto_PEN"] <= monto + self.monto_var)
-            ].copy()
-
-            if df.empty:
+            monto_c = amount_cents(monto)
+
+            # Comparación entera: sin falsos fuera de rango por un céntimo
+            sel = libro.rango(
+                monto_c - self.monto_var_cent, monto_c + self.monto_var_cent, pos,
+                detraccion=(tipo == "DETRACCION") if por_cuenta else None,
+            )
+            if not len(sel):
                 continue
 
+            df = libro.frame(sel)
             df["tipo_monto_match"] = tipo
             df["monto_objetivo"] = monto
+            df["monto_objetivo_cent"] = monto_c
             candidatos.append(df)
 
         if not candidatos:
@@ -135,7 +211,10 @@ class MatcherEngine:
         target = mov["monto_objetivo"]
         monto_banco = mov["Monto_PEN"]
 
-        variacion = abs(target - monto_banco)
+        if "monto_objetivo_cent" in mov and "Monto_PEN_cent" in mov:
+            variacion = abs(int(mov["monto_objetivo_cent"]) - int(mov["Monto_PEN_cent"])) / 100
+        else:
+            variacion = abs(target - monto_banco)
 
         score_monto = max(0.0, 1.0 - (variacion / target)) if target > 0 else 0.0
 
@@ -154,25 +233,96 @@ class MatcherEngine:
 
         return score, variacion, razon
 
+    # --------------------------------------------------
+    # Huella de entrada (para reanudar con MatchProgress)
+    # --------------------------------------------------
+    def _huella(self, df_f: pd.DataFrame, libro: Optional[BankLedger], proveedor=None) -> str:
+        h = hashlib.sha1()
+        presentes = [c for c in ["id", "source_hash", "total_final", "detraccion"] if c in df_f.columns]
+        h.update(pd.util.hash_pandas_object(df_f[presentes], index=False).values.tobytes())
+        if libro is not None:
+            h.update(libro.huella())
+        if proveedor is not None:
+            h.update(proveedor.huella().encode("utf-8"))
+        h.update(f"{self.days_tol}|{self.monto_var}|{self.min_score_match}".encode("utf-8"))
+        if self.cuenta_detraccion:
+            h.update(self.cuenta_detraccion.encode("utf-8"))
+        return h.hexdigest()
+
+    # --------------------------------------------------
+    # Candidatos de un bloque de facturas (proveedor en disco)
+    # --------------------------------------------------
+    def _bloque_proveedor(self, proveedor, df_f: pd.DataFrame, inicio: int):
+        crudos, por_factura = proveedor.bloque_candidatos(
+            df_f.iloc[inicio:inicio + proveedor.bloque], inicio
+        )
+        if crudos.empty:
+            return BankLedger.from_frame(crudos), por_factura
+        return BankLedger.from_frame(self._prepare_bancos(crudos)), por_factura
+
     # --------------------------------------------------
     # Ejecución principal
     # --------------------------------------------------
-    def run(self, df_facturas: pd.DataFrame, df_bancos: pd.DataFrame):
+    def run(self, df_facturas: pd.DataFrame, df_bancos,
+            progreso=None, proveedor=None):
+        """
+        df_bancos: movimientos crudos o un BankLedger ya armado (ledger()),
+        para compartirlo entre corridas / matchers sin volver a prepararlo.
+
+        progreso: MatchProgress opcional → guarda posición + filas cada N
+        facturas y, si hay un lote previo con la misma huella, continúa ahí.
+
+        proveedor: RTreeCandidates opcional → los movimientos no se cargan
+        enteros; cada bloque de facturas trae solo sus candidatos desde disco.
+
+        Con matching.match_pasadas (y bancos en memoria) el matching lo resuelve
+        TieredMatcher: pasadas ordenadas que retiran lo ya resuelto.
+        """
+
+        if self.pasadas and proveedor is not None:
+            raise TieredError("Las pasadas requieren bancos en memoria; no admiten proveedor de candidatos.")
 
         df_f = self._prepare_facturas(df_facturas)
-        df_b = self._prepare_bancos(df_bancos)
+        libro = None
+        if proveedor is None:
+            libro = df_bancos if isinstance(df_bancos, BankLedger) else self.ledger(df_bancos)
+
+        # Pasadas: conjunto completo en memoria, sin progreso por factura
+        if self.pasadas:
+            return TieredMatcher(self, self.pasadas).run(df_f, libro)
+        por_factura = {}
 
         total = len(df_f)
         start = time.time()
 
         match_rows = []
         detalles_rows = []
+        desde = 0
+
+        if progreso is not None and progreso.activo:
+            h = self._huella(df_f, libro, proveedor)
+            desde, match_rows, detalles_rows = progreso.load(h)
+            ultimo = (len(match_rows), len(detalles_rows))
+        else:
+            progreso = None
+
+        for i, (_, fac) in enumerate(df_f.iloc[desde:].iterrows(), start=desde):
+            if progreso is not None and i > desde and i % progreso.cada == 0:
+                progreso.save(h, i, match_rows[ultimo[0]:], detalles_rows[ultimo[1]:])
+                ultimo = (len(match_rows), len(detalles_rows))
 
-        for i, fac in df_f.iterrows():
             sys.stdout.write(f"\r🔵 {_progress(i + 1, total, start)}")
             sys.stdout.flush()
 
-            candidatos = self._filtrar_candidatos(fac, df_b)
+            if proveedor is not None:
+                if (i - desde) % proveedor.bloque == 0:
+                    libro, por_factura = self._bloque_proveedor(proveedor, df_f, i)
+                ix = libro.posiciones(por_factura.get(i, [])) if len(libro) else np.array([], dtype=np.int64)
+                ix = ix[ix >= 0]
+                candidatos = (self._filtrar_candidatos(fac, libro, ix)
+                              if len(ix) else pd.DataFrame())
+            else:
+                candidatos = self._filtrar_candidatos(fac, libro)
 
             if candidatos.empty:
                 continue
@@ -0,0 +1,125 @@
+# src/matchers/subset_sum.py
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+
+# ======================================================
+# Suma de subconjuntos en céntimos (meet-in-the-middle)
+# ======================================================
+MAX_ITEMS = 40   # 2 mitades de 2^20 sumas como máximo
+
+
+def _mitad(montos: np.ndarray) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Todas las sumas de `montos` agrupadas por cuántos items usan:
+    {items: (sumas ordenadas, máscaras)}; el bit k de una máscara indica
+    si entra el item k.
+    """
+    sumas = np.zeros(1, dtype=np.int64)
+    items = np.zeros(1, dtype=np.int8)
+    for a in montos:
+        sumas = np.concatenate([sumas, sumas + a])
+        items = np.concatenate([items, items + 1])
+
+    grupos = {}
+    for k in np.unique(items):
+        ix = np.flatnonzero(items == k)
+        orden = np.argsort(sumas[ix], kind="stable")
+        grupos[int(k)] = (sumas[ix][orden], ix[orden])
+    return grupos
+
+
+def _bits(mascara: int, desde: int, n: int) -> list:
+    return [desde + k for k in range(n) if (mascara >> k) & 1]
+
+
+class SubsetIndex:
+    """
+    Sumas de las dos mitades de un conjunto de montos (céntimos, > 0),
+    enumeradas una vez y consultables para muchos objetivos: varios
+    depósitos del mismo cliente comparten facturas candidatas.
+    """
+
+    def __init__(self, montos: np.ndarray):
+        self.montos = np.asarray(montos, dtype=np.int64)
+        if len(self.montos) > MAX_ITEMS:
+            raise ValueError(f"SubsetIndex admite hasta {MAX_ITEMS} montos ({len(self.montos)})")
+        self.total = int(self.montos.sum())
+        orden = np.sort(self.montos)
+        self._menores = np.concatenate([[0], np.cumsum(orden)])          # k más chicos
+        self._mayores = np.concatenate([[0], np.cumsum(orden[::-1])])    # k más grandes
+        self.mitad = len(self.montos) // 2
+        self.izq = _mitad(self.montos[: self.mitad])
+        self.der = _mitad(self.montos[self.mitad:])
+
+    @property
+    def nbytes(self) -> int:
+        """Memoria de las sumas + máscaras enumeradas (2^mitad por lado)."""
+        return sum(s.nbytes + m.nbytes for g in (self.izq, self.der) for s, m in g.values())
+
+    def buscar(
+        self,
+        objetivo: int,
+        tolerancia: int,
+        min_items: int = 2,
+        max_items: Optional[int] = None,
+    ) -> Optional[np.ndarray]:
+        """
+        Índices de un subconjunto cuya suma cae en objetivo ± tolerancia.
+        Gana el de menos items (con muchos montos casi cualquier total se
+        alcanza con muchos items: pocos = más creíble) y, a igual tamaño,
+        el más cercano al objetivo. None si no hay.
+        """
+        n = len(self.montos)
+        max_items = n if max_items is None else min(max_items, n)
+        if n < min_items or self.total < objetivo - tolerancia:
+            return None
+
+        # Poda por tamaño: con k items la suma va de los k menores a los k mayores
+        desde = max(min_items, int(np.searchsorted(self._mayores, objetivo - tolerancia)))
+        hasta = min(max_items, int(np.searchsorted(self._menores, objetivo + tolerancia, side="right")) - 1)
+
+        for total in range(desde, hasta + 1):
+            mejor = None   # (diferencia, máscara izq, máscara der)
+            for i_items, (i_sumas, i_masc) in self.izq.items():
+                if total - i_items not in self.der:
+                    continue
+                d_sumas, d_masc = self.der[total - i_items]
+
+                # La suma derecha más cercana a lo que falta
+                falta = objetivo - i_sumas
+                pos = np.searchsorted(d_sumas, falta)
+                a = np.clip(pos - 1, 0, len(d_sumas) - 1)
+                b = np.clip(pos, 0, len(d_sumas) - 1)
+                cerca = np.where(np.abs(d_sumas[a] - falta) <= np.abs(d_sumas[b] - falta), a, b)
+                dif = np.abs(d_sumas[cerca] - falta)
+
+                k = int(np.argmin(dif))
+                if dif[k] <= tolerancia and (mejor is None or dif[k] < mejor[0]):
+                    mejor = (int(dif[k]), int(i_masc[k]), int(d_masc[cerca[k]]))
+
+            if mejor is not None:
+                elegidos = _bits(mejor[1], 0, self.mitad) + _bits(mejor[2], self.mitad, n - self.mitad)
+                return np.array(elegidos, dtype=np.int64)
+        return None
+
+
+def subconjunto_suma(
+    montos: np.ndarray,
+    objetivo: int,
+    tolerancia: int,
+    min_items: int = 2,
+    max_items: Optional[int] = None,
+) -> Optional[np.ndarray]:
+    """
+    SubsetIndex de un solo uso, con poda previa: montos mayores que
+    objetivo + tolerancia fuera y total insuficiente → None.
+    """
+    montos = np.asarray(montos, dtype=np.int64)
+    idx = np.flatnonzero((montos > 0) & (montos <= objetivo + tolerancia))
+    if len(idx) < min_items or int(montos[idx].sum()) < objetivo - tolerancia:
+        return None
+    elegidos = SubsetIndex(montos[idx]).buscar(objetivo, tolerancia, min_items, max_items)
+    return None if elegidos is None else idx[elegidos]
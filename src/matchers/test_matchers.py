@@ -0,0 +1,483 @@
+# src/matchers/test_matchers.py
+from __future__ import annotations
+
+# -------------------------
+# Bootstrap
+# -------------------------
+import sys
+import sqlite3
+import tempfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# -------------------------
+# Imports Core
+# -------------------------
+from src.core.logger import info, ok, error
+from src.core.env_loader import get_config
+
+# -------------------------
+# Matchers
+# -------------------------
+from src.matchers.matcher_engine import MatcherEngine
+from src.matchers.tiered import TieredMatcher
+from src.matchers.subset_sum import MAX_ITEMS, SubsetIndex, subconjunto_suma
+from src.matchers.ledger import BankLedger, LedgerStore
+from src.loaders.migrations import migrate
+
+import numpy as np
+import pandas as pd
+
+
+# =====================================================
+#   DATOS DE PRUEBA (armados a mano)
+# =====================================================
+def _engine() -> MatcherEngine:
+    """MatcherEngine con parámetros fijos (no dependen de settings.json)."""
+    engine = MatcherEngine()
+    engine.days_tol = 14
+    engine.monto_var = 0.50
+    engine.monto_var_cent = 50
+    engine.cuenta_detraccion = ""
+    return engine
+
+
+def _facturas(filas) -> pd.DataFrame:
+    """(id, serie-número, ruc, cliente, total_final, fecha_pago) → facturas preparadas."""
+    df = pd.DataFrame(filas, columns=["id", "combinada", "ruc", "cliente_generador", "total_final", "fecha_pago"])
+    df["detraccion"] = 0.0  # un solo objetivo (TOTAL_FINAL) por factura
+    df["fecha_pago"] = pd.to_datetime(df["fecha_pago"])
+    return df
+
+
+def _bancos(engine: MatcherEngine, filas):
+    """(id, fecha, descripción, monto) → BankLedger, igual que en una corrida."""
+    df = pd.DataFrame(filas, columns=["id", "fecha", "descripcion", "monto"])
+    df["operacion"] = "OP" + df["id"].astype(str)
+    df["moneda"] = "PEN"
+    df["banco_codigo"] = "BCP"
+    return engine.ledger(df)
+
+
+@contextmanager
+def _bd_destino(df_f: pd.DataFrame):
+    """BD destino temporal con facturas_pf / clientes_pf (ReferenceCandidates)."""
+    cfg = get_config()
+    previa = cfg.db_pulseforge
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "pf_test.sqlite"
+        serie_num = df_f["combinada"].str.split("-", n=1)
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("CREATE TABLE facturas_pf (id INTEGER PRIMARY KEY, serie TEXT, numero TEXT, ruc TEXT)")
+            conn.execute("CREATE TABLE clientes_pf (ruc TEXT, razon_social TEXT)")
+            conn.executemany(
+                "INSERT INTO facturas_pf VALUES (?, ?, ?, ?)",
+                zip(df_f["id"].tolist(), serie_num.str[0], serie_num.str[1], df_f["ruc"]),
+            )
+            conn.executemany(
+                "INSERT INTO clientes_pf VALUES (?, ?)",
+                df_f[["ruc", "cliente_generador"]].drop_duplicates().itertuples(index=False, name=None),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        cfg.db_pulseforge = str(path)
+        try:
+            yield path
+        finally:
+            cfg.db_pulseforge = previa
+
+
+def _pares(df_match: pd.DataFrame) -> dict:
+    """{factura_id: (movimiento_id, pasada)}"""
+    return {
+        int(f): (int(m), p)
+        for f, m, p in zip(df_match["factura_id"], df_match["movimiento_id"], df_match["pasada"])
+    }
+
+
+# =====================================================
+#   TEST PASADAS EXACTA → REFERENCIA → TOLERANCIA
+# =====================================================
+def test_pasadas():
+    info("🔍 Probando pasadas exacta → referencia → tolerancia...")
+
+    try:
+        engine = _engine()
+        df_f = _facturas([
+            (1, "F001-101", "20111111111", "ALFA SAC", 1000.00, "2025-03-10"),
+            (2, "F001-102", "20222222222", "BETA SAC", 2500.00, "2025-03-10"),
+            (3, "F001-103", "20333333333", "GAMMA SAC", 777.00, "2025-03-12"),
+        ])
+        libro = _bancos(engine, [
+            (10, "2025-03-10", "PAGO VARIOS", 1000.00),             # exacta: céntimos + día
+            (11, "2025-03-13", "ABONO RUC 20222222222", 2500.20),   # referencia: RUC citado
+            (12, "2025-03-14", "TRANSFERENCIA", 777.30),            # tolerancia: único en rango
+            (13, "2025-03-20", "OTRO ABONO", 1000.00),              # mismo monto que la factura 1
+        ])
+
+        with _bd_destino(df_f):
+            tm = TieredMatcher(engine, ["exacta", "referencia", "tolerancia"])
+            df_match, df_det = tm.run(df_f, libro)
+
+        pares = _pares(df_match)
+        assert pares == {1: (10, "exacta"), 2: (11, "referencia"), 3: (12, "tolerancia")}, pares
+        ok(f"Pares por pasada → {pares}")
+
+        # Lo resuelto sale del conjunto de trabajo: el movimiento 13 ya no
+        # compite con el 10 por la factura 1 y queda libre
+        assert not tm.o_libre.any()
+        assert tm.libro.ids[tm.m_libre].tolist() == [13]
+        assert 13 not in set(df_det["movimiento_id"])
+        ok("Objetivos y movimientos resueltos retirados entre pasadas → OK")
+
+        resumen = [(st.nombre, st.objetivos, st.evaluados, st.resueltos) for st in tm.stats]
+        assert resumen == [
+            ("exacta", 3, 1, 1),
+            ("referencia", 2, 1, 1),
+            ("tolerancia", 1, 1, 1),
+        ], resumen
+        ok(f"Estadísticas por pasada → {resumen}")
+
+        # Sin la pasada exacta, 10 y 13 empatan para la factura 1 → ambigua
+        with _bd_destino(df_f):
+            tm = TieredMatcher(engine, ["tolerancia"])
+            df_match, _ = tm.run(df_f, libro)
+        assert 1 not in _pares(df_match)
+        ok("Sin retirar lo exacto, la factura 1 queda ambigua en tolerancia → OK")
+
+    except Exception as e:
+        error(f"ERROR en test_pasadas: {e}")
+        raise
+
+
+# =====================================================
+#   TEST SUMA DE SUBCONJUNTOS (CÉNTIMOS)
+# =====================================================
+def test_subset_sum():
+    info("🔍 Probando suma de subconjuntos en céntimos...")
+
+    try:
+        montos = np.array([300_00, 450_00, 700_00])
+
+        # 2 de 3 facturas suman exacto el depósito
+        sel = subconjunto_suma(montos, 750_00, 0)
+        assert sel is not None and sorted(sel.tolist()) == [0, 1], sel
+        ok("2 de 3 montos = depósito exacto → OK")
+
+        # Dentro de monto_variacion pero no exacto
+        sel = subconjunto_suma(montos, 750_30, 50)
+        assert sel is not None and sorted(sel.tolist()) == [0, 1], sel
+        assert subconjunto_suma(montos, 750_30, 10) is None
+        ok("Depósito a 0.30 del subconjunto: dentro de ±0.50, fuera de ±0.10 → OK")
+
+        # Sin solución: ninguna combinación de 2+ montos cae en el rango
+        assert subconjunto_suma(montos, 900_00, 50) is None
+        assert subconjunto_suma(montos, 300_00, 50) is None   # 1 item no es masivo
+        ok("Sin solución → None")
+
+        # Tope de items: el índice no enumera más de MAX_ITEMS montos
+        try:
+            SubsetIndex(np.arange(1, MAX_ITEMS + 2) * 100)
+        except ValueError:
+            ok(f"SubsetIndex con {MAX_ITEMS + 1} montos → ValueError")
+        else:
+            raise AssertionError(f"SubsetIndex aceptó más de {MAX_ITEMS} montos")
+
+    except Exception as e:
+        error(f"ERROR en test_subset_sum: {e}")
+        raise
+
+
+def test_subconjunto_tope():
+    info("🔍 Probando tope de candidatos en TieredMatcher._subconjunto...")
+
+    try:
+        tm = TieredMatcher(_engine(), ["masivo"])
+
+        # 45 candidatos: 40 cercanos en fecha (múltiplos de 10.00) y 5 lejanos
+        cent = np.array([(k + 1) * 1000 for k in range(40)] + [3333_33, 4444_44, 11, 13, 17], dtype=np.int64)
+        dias = np.array([1.0] * 40 + [12.0] * 5)
+        cand = np.arange(len(cent))
+
+        # Solo suman el objetivo dos lejanos → fuera de los 40 más cercanos
+        assert tm._subconjunto(OrderedDict(), cand, cent, dias, 7777_77, MAX_ITEMS, 3) is None
+
+        sel = tm._subconjunto(OrderedDict(), cand, cent, dias, 30_00, MAX_ITEMS, 2)
+        assert sel is not None and int(cent[sel].sum()) == 30_00 and (sel < 40).all(), sel
+        ok(f"{len(cand)} candidatos → se enumeran los {MAX_ITEMS} más cercanos en fecha → OK")
+
+        # Caché de índices acotada por memoria (LRU), no por cantidad
+        indices = OrderedDict()
+        tope = SubsetIndex(cent[:12]).nbytes * 2
+        tm.INDICES_MAX_BYTES = tope
+        for desde in range(5):
+            tm._subconjunto(indices, cand[desde:desde + 12], cent, dias[:12], 30_00, MAX_ITEMS, 2)
+        assert sum(ix.nbytes for ix in indices.values()) <= tope, len(indices)
+        assert list(indices)[-1] == np.sort(cand[4:16]).tobytes()
+        ok(f"Caché de SubsetIndex ≤ {tope} bytes → {len(indices)} índices retenidos (LRU)")
+
+    except Exception as e:
+        error(f"ERROR en test_subconjunto_tope: {e}")
+        raise
+
+
+# =====================================================
+#   TEST PASADA MASIVO (UN DEPÓSITO → VARIAS FACTURAS)
+# =====================================================
+def test_pasada_masivo():
+    info("🔍 Probando pasada masivo...")
+
+    try:
+        engine = _engine()
+        df_f = _facturas([
+            (1, "F001-201", "20555555555", "DELTA SAC", 300.00, "2025-04-01"),
+            (2, "F001-202", "20555555555", "DELTA SAC", 450.00, "2025-04-01"),
+            (3, "F001-203", "20555555555", "DELTA SAC", 700.00, "2025-04-01"),
+            (4, "F001-204", "20666666666", "OMEGA SAC", 120.00, "2025-04-01"),
+            (5, "F001-205", "20666666666", "OMEGA SAC", 80.00, "2025-04-01"),
+        ])
+        libro = _bancos(engine, [
+            (20, "2025-04-02", "DEPOSITO 20555555555", 750.00),    # 300 + 450 exacto
+            (21, "2025-04-03", "DEPOSITO 20666666666", 200.30),    # 120 + 80 ± 0.30
+            (22, "2025-04-03", "DEPOSITO 20666666666", 999.00),    # sin solución
+        ])
+
+        with _bd_destino(df_f):
+            tm = TieredMatcher(engine, ["masivo"])
+            df_match, _ = tm.run(df_f, libro)
+
+        por_mov = df_match.groupby("movimiento_id")["factura_id"].apply(lambda s: sorted(s.tolist())).to_dict()
+        assert por_mov == {20: [1, 2], 21: [4, 5]}, por_mov
+        assert (df_match["pasada"] == "masivo").all()
+        assert df_match.loc[df_match["movimiento_id"] == 21, "diferencia"].round(2).eq(0.30).all()
+        assert tm.libro.ids[tm.m_libre].tolist() == [22]
+        ok(f"Depósitos → facturas: {por_mov}; el de 999.00 queda libre → OK")
+
+    except Exception as e:
+        error(f"ERROR en test_pasada_masivo: {e}")
+        raise
+
+
+# =====================================================
+#   TEST PASADA FRACCIONADO (UNA FACTURA → VARIOS MOVIMIENTOS)
+# =====================================================
+def test_pasada_fraccionado():
+    info("🔍 Probando pasada fraccionado (sin reutilizar movimientos)...")
+
+    try:
+        engine = _engine()
+        df_f = _facturas([
+            (1, "F001-301", "20444444444", "SIGMA SAC", 300.00, "2025-05-05"),
+            (2, "F001-302", "20444444444", "SIGMA SAC", 300.00, "2025-05-05"),
+        ])
+        # Ambas facturas pueden pagarse con 100+200 o con 150+150
+        libro = _bancos(engine, [
+            (30, "2025-05-05", "TRANSF 20444444444", 100.00),
+            (31, "2025-05-06", "TRANSF 20444444444", 200.00),
+            (32, "2025-05-06", "TRANSF 20444444444", 150.00),
+            (33, "2025-05-07", "TRANSF 20444444444", 150.00),
+        ])
+
+        with _bd_destino(df_f):
+            tm = TieredMatcher(engine, ["fraccionado"])
+            df_match, _ = tm.run(df_f, libro)
+
+        assert (df_match["pasada"] == "fraccionado").all()
+        assert not df_match["movimiento_id"].duplicated().any(), df_match
+        por_fac = df_match.groupby("factura_id")["monto_banco"].sum().round(2).to_dict()
+        assert por_fac == {1: 300.00, 2: 300.00}, por_fac
+        assert sorted(df_match["movimiento_id"].tolist()) == [30, 31, 32, 33]
+        ok("Dos facturas iguales → subconjuntos disjuntos; ningún movimiento se reutiliza → OK")
+
+        # Un movimiento ya consumido por una pasada anterior no vuelve a entrar:
+        # la factura 2 (400.00) podría pagarse con 40+41, pero 40 ya es de la 1
+        df_f = _facturas([
+            (1, "F001-301", "20444444444", "SIGMA SAC", 300.00, "2025-05-05"),
+            (2, "F001-302", "20444444444", "SIGMA SAC", 400.00, "2025-05-09"),
+        ])
+        with _bd_destino(df_f):
+            tm = TieredMatcher(engine, ["exacta", "fraccionado"])
+            df_match, _ = tm.run(df_f, _bancos(engine, [
+                (40, "2025-05-05", "TRANSF 20444444444", 300.00),   # exacta para la factura 1
+                (41, "2025-05-06", "TRANSF 20444444444", 100.00),
+                (42, "2025-05-08", "TRANSF 20444444444", 200.00),
+                (43, "2025-05-09", "TRANSF 20444444444", 200.00),
+            ]))
+        usados = df_match.groupby("pasada")["movimiento_id"].apply(lambda s: sorted(s.tolist())).to_dict()
+        assert usados == {"exacta": [40], "fraccionado": [42, 43]}, usados
+        ok(f"Movimiento de la pasada exacta no entra al fraccionado → {usados}")
+
+    except Exception as e:
+        error(f"ERROR en test_pasada_fraccionado: {e}")
+        raise
+
+
+# =====================================================
+#   TEST PASADA NOMBRE (GANADOR CLARO vs EMPATE)
+# =====================================================
+def test_pasada_nombre():
+    info("🔍 Probando pasada nombre (solo ganadores claros)...")
+
+    try:
+        engine = _engine()
+        df_f = _facturas([
+            (1, "F001-401", "20555555555", "DELTA SAC", 500.00, "2025-06-10"),
+            (2, "F001-402", "20666666666", "OMEGA SAC", 800.00, "2025-06-10"),
+        ])
+        libro = _bancos(engine, [
+            # Factura 1: el nombre desempata entre dos montos iguales
+            (50, "2025-06-11", "PAGO DELTA SAC", 500.00),
+            (51, "2025-06-11", "ABONO VARIOS", 500.00),
+            # Factura 2: dos candidatos idénticos (monto, fecha y nombre)
+            (60, "2025-06-11", "PAGO OMEGA SAC", 800.00),
+            (61, "2025-06-11", "PAGO OMEGA SAC", 800.00),
+        ])
+
+        with _bd_destino(df_f):
+            tm = TieredMatcher(engine, ["nombre"])
+            df_match, _ = tm.run(df_f, libro)
+
+        pares = _pares(df_match)
+        assert pares == {1: (50, "nombre")}, pares
+        assert tm.o_libre.sum() == 1
+        ok(f"Ganador claro resuelto, empate exacto queda ambiguo → {pares}")
+
+    except Exception as e:
+        error(f"ERROR en test_pasada_nombre: {e}")
+        raise
+
+
+# =====================================================
+#   TEST LIBRO DE BANCOS: DISCO (mmap) / ANEXAR / RECONSTRUIR
+# =====================================================
+_COLS_BANCOS = ["id", "fecha", "descripcion", "operacion", "destinatario",
+                "tipo_documento", "monto", "moneda", "banco_codigo"]
+
+
+def _movs(filas) -> pd.DataFrame:
+    return pd.DataFrame(filas, columns=_COLS_BANCOS)
+
+
+_MOVS_A = [
+    (1, "2025-07-01", "ABONO ALFA SAC", "OP1", "ALFA", "TRANSF", 100.00, "PEN", "BCP"),
+    (2, "2025-07-02", "ABONO BETA SAC", "OP2", None, "TRANSF", 250.50, "PEN", "IBK"),
+    (3, None, "ABONO ALFA SAC", None, "ALFA", None, 75.25, "PEN", "BCP"),
+    (4, "2025-07-04", "DEPOSITO", "OP4", None, "DEP", 1200.00, "PEN", None),
+]
+# Textos repetidos y nuevos, banco nuevo (BBVA) y banco ya conocido
+_MOVS_B = [
+    (5, "2025-07-05", "ABONO ALFA SAC", "OP5", "GAMMA", "TRANSF", 300.00, "PEN", "BBVA"),
+    (6, "2025-07-06", "PAGO GAMMA EIRL", "OP6", None, "DEP", 42.10, "PEN", "BCP"),
+    (7, None, "DEPOSITO", "OP4", "ALFA", None, 9.99, "PEN", "BBVA"),
+]
+
+
+def _mismo_libro(a: BankLedger, b: BankLedger):
+    pd.testing.assert_frame_equal(a.frame(), b.frame())
+
+
+def test_ledger_persistencia():
+    info("🔍 Probando BankLedger save/load (mmap), anexar y LedgerStore...")
+
+    try:
+        engine = _engine()
+        df_a, df_b = _movs(_MOVS_A), _movs(_MOVS_B)
+        libro_a, libro_b = engine.ledger(df_a), engine.ledger(df_b)
+        completo = engine.ledger(pd.concat([df_a, df_b], ignore_index=True))
+        sin_2 = engine.ledger(pd.concat([df_a, df_b], ignore_index=True).query("id != 2").reset_index(drop=True))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            # 1) save → load mapeado de disco
+            libro_a.save(Path(tmp) / "libro", {"prueba": 1})
+            cargado, meta = BankLedger.load(Path(tmp) / "libro")
+            assert cargado is not None and meta["prueba"] == 1 and meta["filas"] == len(libro_a)
+            assert isinstance(cargado.cent, np.memmap)
+            _mismo_libro(cargado, libro_a)
+            assert (cargado.orden_monto() == libro_a.orden_monto()).all()
+            ok("save → load (mmap) → mismo frame()")
+
+            # 2) anexar (en memoria y sobre el libro mapeado) = from_frame del total
+            _mismo_libro(libro_a.anexar(libro_b), completo)
+            _mismo_libro(cargado.anexar(libro_b), completo)
+            sin_destinatario = engine.ledger(df_b.drop(columns=["destinatario"]))
+            _mismo_libro(
+                libro_a.anexar(sin_destinatario),
+                engine.ledger(pd.concat([df_a, df_b.assign(destinatario=None)], ignore_index=True)),
+            )
+            ok("anexar (pool y categorías re-mapeados) = BankLedger del frame concatenado")
+
+            # 3) LedgerStore: disco / solo ids nuevos / bajas → reconstrucción
+            # engine.ledger() solo se llama al reconstruir el libro completo
+            completos = []
+            ledger = engine.ledger
+
+            def ledger_contado(df: pd.DataFrame) -> BankLedger:
+                completos.append(len(df))
+                return ledger(df)
+
+            bd = Path(tmp) / "pf.sqlite"
+            migrate(bd)
+            conn = sqlite3.connect(bd)
+            engine.ledger = ledger_contado
+            try:
+                conn.executemany(
+                    f"INSERT INTO bancos_pf ({', '.join(_COLS_BANCOS)}) VALUES ({', '.join('?' * len(_COLS_BANCOS))})",
+                    _MOVS_A,
+                )
+                conn.commit()
+
+                store = LedgerStore(engine, ruta=Path(tmp) / "libro_bancos")
+
+                _mismo_libro(store.cargar(conn), libro_a)         # primera vez → completo
+                desde_disco = store.cargar(conn)                  # sin cambios → mmap
+                assert isinstance(desde_disco.cent, np.memmap)
+                _mismo_libro(desde_disco, libro_a)
+                assert completos == [4], completos
+
+                conn.executemany(
+                    f"INSERT INTO bancos_pf ({', '.join(_COLS_BANCOS)}) VALUES ({', '.join('?' * len(_COLS_BANCOS))})",
+                    _MOVS_B,
+                )
+                conn.commit()
+                _mismo_libro(store.cargar(conn), completo)        # ids nuevos → anexa
+                _mismo_libro(store.cargar(conn), completo)        # y queda guardado
+                assert completos == [4], completos
+                ok("LedgerStore: ids nuevos → se anexan sin reconstruir")
+
+                conn.execute("DELETE FROM bancos_pf WHERE id = 2")
+                conn.commit()
+                _mismo_libro(store.cargar(conn), sin_2)           # baja → completo
+                assert completos == [4, 6], completos
+                ok("LedgerStore: baja en bancos_pf → libro reconstruido")
+            finally:
+                engine.ledger = ledger
+                conn.close()
+
+    except Exception as e:
+        error(f"ERROR en test_ledger_persistencia: {e}")
+        raise
+
+
+# =====================================================
+#   RUNNER
+# =====================================================
+if __name__ == "__main__":
+    info("=== INICIANDO TEST MATCHERS PULSEFORGE ===")
+
+    test_pasadas()
+    test_subset_sum()
+    test_subconjunto_tope()
+    test_pasada_masivo()
+    test_pasada_fraccionado()
+    test_pasada_nombre()
+    test_ledger_persistencia()
+
+    ok("=== TEST MATCHERS COMPLETADO ===")
@@ -0,0 +1,770 @@
+# src/matchers/tiered.py
+from __future__ import annotations
+import sys
+import time
+import heapq
+from collections import OrderedDict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------
+# Bootstrap de rutas
+# ------------------------------------------------------
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------
+# Importación corporativa
+# ------------------------------------------------------
+from src.core.logger import info, ok, warn
+from src.core.env_loader import get_config
+from src.core.utils import normalize_text, to_cents
+from src.matchers.candidates import FTSNameCandidates, ReferenceCandidates, extraer_claves
+from src.matchers.subset_sum import SubsetIndex
+from src.matchers.ledger import BankLedger
+
+# IA opcional
+try:
+    from src.transformers.ai_helpers import ai_decide_match
+    _AI_AVAILABLE = True
+except Exception:
+    _AI_AVAILABLE = False
+    ai_decide_match = None
+
+
+class TieredError(Exception):
+    pass
+
+
+# Orden canónico de las pasadas (de la más barata a la más cara)
+PASADAS = ("exacta", "referencia", "pareada", "tolerancia", "nombre", "masivo", "fraccionado", "ia")
+
+_EPOCH = pd.Timestamp("1970-01-01")
+
+
+@dataclass
+class _Pasada:
+    nombre: str
+    objetivos: int = 0     # objetivos libres al entrar
+    evaluados: int = 0     # pares factura × movimiento evaluados
+    resueltos: int = 0
+    segundos: float = 0.0
+
+
+# ======================================================
+# Matching por pasadas
+# ======================================================
+class TieredMatcher:
+    """
+    MatcherEngine por pasadas ordenadas, de la más barata a la más cara:
+
+        exacta      hash join por céntimos + día de pago, o por la
+                    serie-número de la factura citada en la descripción
+        referencia  RUC / serie-número extraídos del texto del banco →
+                    facturas por índices de la BD (ReferenceCandidates)
+        pareada     neto + detracción de la misma factura a la vez, la
+                    detracción solo en la cuenta de detracciones
+        tolerancia  rango ±monto_variacion (búsqueda binaria sobre montos
+                    ordenados); solo pares sin ambigüedad
+        nombre      desempata los pares ambiguos por similitud de nombre
+        masivo      un depósito paga varias facturas del mismo cliente
+                    (suma de subconjuntos en céntimos)
+        fraccionado una factura pagada en varias transferencias del
+                    mismo cliente (la misma búsqueda, al revés)
+        ia          lo que queda: mejor score por reglas, confirmado con
+                    ai_decide_match si activar_ia
+
+    La unidad de trabajo es el objetivo (factura × TOTAL_FINAL/DETRACCION;
+    NETO_RECIBIDO si no hay total_final). Cada pasada retira los objetivos
+    resueltos y los movimientos consumidos (un movimiento paga un solo
+    objetivo, salvo en la pasada masivo; un objetivo lo paga un solo
+    movimiento, salvo en la pasada fraccionado). Matches y detalles salen con las
+    mismas columnas que el bucle clásico, más la pasada que resolvió.
+
+    Con cuenta_detraccion configurada, los objetivos DETRACCION solo se
+    cruzan con movimientos de esa cuenta y el resto nunca con ellos.
+    """
+
+    SIM_MINIMA = 0.35      # similitud de nombre mínima para desempatar
+    MARGEN = 0.05          # ventaja mínima del mejor candidato sobre el segundo
+    INDICES_MAX_BYTES = 256 * 2**20   # tope de la caché de SubsetIndex (~8 índices de 40 montos)
+
+    def __init__(self, engine, pasadas: List[str]):
+        desconocidas = [p for p in pasadas if p not in PASADAS]
+        if desconocidas:
+            raise TieredError(f"Pasadas desconocidas: {desconocidas} (válidas: {list(PASADAS)})")
+
+        self.engine = engine
+        self.pasadas = list(pasadas)
+        self.var_c = engine.monto_var_cent
+        self.por_cuenta = bool(engine.cuenta_detraccion)
+        if "pareada" in self.pasadas and not self.por_cuenta:
+            warn("[Pasadas] 'pareada' requiere cuentas_bancarias.cuenta_detraccion → se omite.")
+        cfg = get_config()
+        self.usar_ia = bool(cfg.activar_ia) and _AI_AVAILABLE
+        self.masivo_candidatos = int(cfg.matching.masivo_candidatos)
+        self.masivo_max = int(cfg.matching.masivo_max_facturas)
+        self.fraccionado_candidatos = int(cfg.matching.fraccionado_candidatos)
+        self.fraccionado_max = int(cfg.matching.fraccionado_max_movimientos)
+        self.stats: List[_Pasada] = []
+
+    # --------------------------------------------------
+    # Conjunto de trabajo
+    # --------------------------------------------------
+    @staticmethod
+    def _centimos(s: pd.Series) -> np.ndarray:
+        return to_cents(pd.to_numeric(s, errors="coerce")).to_numpy()
+
+    @staticmethod
+    def _dias(s: pd.Series) -> np.ndarray:
+        """Ordinal de día (float, NaN si no hay fecha)."""
+        return (pd.to_datetime(s, errors="coerce").dt.normalize() - _EPOCH).dt.days.to_numpy(dtype="float64")
+
+    @staticmethod
+    def _referencia(texto: pd.Series) -> pd.Series:
+        claves = extraer_claves(texto.map(normalize_text))
+        doc = claves[claves["tipo"] == "DOC"].drop_duplicates("pos")
+        return pd.Series(doc["clave"].to_numpy(), index=doc["pos"].to_numpy()).reindex(texto.index)
+
+    def _objetivos(self, df_f: pd.DataFrame) -> pd.DataFrame:
+        fecha = pd.Series(pd.NaT, index=df_f.index, dtype="datetime64[ns]")
+        for col in ("fecha_pago", "vencimiento", "fecha_emision"):
+            if col in df_f.columns:
+                fecha = fecha.fillna(pd.to_datetime(df_f[col], errors="coerce"))
+
+        if "combinada" in df_f.columns:
+            ref = self._referencia(df_f["combinada"].fillna("").astype(str))
+        else:
+            ref = self._referencia(df_f.get("serie", "").astype(str) + "-" + df_f.get("numero", "").astype(str))
+
+        cliente = df_f.get("cliente_generador", pd.Series("", index=df_f.index))
+        cliente = cliente.fillna("").astype(str).map(normalize_text)
+        ruc = df_f.get("ruc", pd.Series("", index=df_f.index)).fillna("").astype(str).str.strip()
+        vacio = pd.Series(np.nan, index=df_f.index)
+
+        partes = []
+        for tipo, col in (("TOTAL_FINAL", "total_final"), ("DETRACCION", "detraccion")):
+            monto = pd.to_numeric(df_f.get(col, vacio), errors="coerce")
+            tipos = pd.Series(tipo, index=df_f.index)
+            if tipo == "TOTAL_FINAL" and "neto_recibido" in df_f.columns:
+                # calculos_pf.total_final puede venir vacío → neto_recibido (lo que llega al banco)
+                neto = pd.to_numeric(df_f["neto_recibido"], errors="coerce")
+                sin_total = ~(monto > 0) & (neto > 0)
+                monto = monto.where(~sin_total, neto)
+                tipos = tipos.where(~sin_total, "NETO_RECIBIDO")
+
+            sel = (monto > 0).to_numpy()
+            partes.append(pd.DataFrame({
+                "factura_id": df_f["id"].to_numpy()[sel],
+                "tipo_monto_match": tipos.to_numpy()[sel],
+                "monto_objetivo": monto.to_numpy()[sel],
+                "fecha_pago": fecha.to_numpy()[sel],
+                "ref": ref.to_numpy()[sel],
+                "cliente": cliente.to_numpy()[sel],
+                "ruc": ruc.to_numpy()[sel],
+            }))
+
+        return pd.concat(partes, ignore_index=True)
+
+    def _preparar(self, df_f: pd.DataFrame, libro: BankLedger):
+        self.obj = self._objetivos(df_f)
+        self.libro = libro
+
+        # Montos en céntimos int64; los float (salida / IA) salen de ahí
+        self.o_cent = self._centimos(self.obj["monto_objetivo"])
+        self.o_dia = self._dias(self.obj["fecha_pago"])
+        self.o_monto = self.o_cent / 100
+
+        self.m_cent = libro.cent
+        self.m_dia = libro.dias()
+        self.m_monto = self.m_cent / 100
+
+        # Textos normalizados una vez por combinación distinta, no por movimiento
+        cod, rep = libro.unicos(("descripcion", "destinatario", "tipo_documento"))
+        texto = pd.Series(libro.texto("descripcion", rep)).fillna("").astype(str)
+        if "destinatario" in libro.textos:
+            texto = texto + " " + pd.Series(libro.texto("destinatario", rep)).fillna("").astype(str)
+        texto = texto.map(normalize_text)
+        self.m_texto = pd.Series(texto.to_numpy()[cod])
+
+        # RUC / serie-número citados (descripcion + destinatario + tipo_documento)
+        texto_ref = texto
+        if "tipo_documento" in libro.textos:
+            doc = pd.Series(libro.texto("tipo_documento", rep)).fillna("").astype(str)
+            texto_ref = texto_ref + " " + doc.map(normalize_text)
+        claves = extraer_claves(texto_ref).reset_index(names="orden")
+        claves["pos"] = claves["pos"].astype("int64")
+        claves["bloque"] = (claves["tipo"] == "DOC").astype("int8")
+        self.m_claves = pd.DataFrame({"m": np.arange(len(cod)), "pos": cod}) \
+            .merge(claves, on="pos").sort_values(["bloque", "m", "orden"]) \
+            [["m", "tipo", "clave"]].reset_index(drop=True)
+
+        # Cuenta de detracciones: objetivo DETRACCION ↔ movimiento de esa cuenta
+        self.o_det = (self.obj["tipo_monto_match"] == "DETRACCION").to_numpy()
+        self.m_det = libro.detraccion
+
+        self._fuente = None
+        self.o_libre = np.ones(len(self.obj), dtype=bool)
+        self.m_libre = np.ones(len(self.libro), dtype=bool)
+        self._rango = None
+
+    def _referencias(self) -> ReferenceCandidates:
+        """Conexión a la BD destino compartida por las pasadas que la usan."""
+        if self._fuente is None:
+            self._fuente = ReferenceCandidates()
+        return self._fuente
+
+    # --------------------------------------------------
+    # Pares y scoring (vectorizados)
+    # --------------------------------------------------
+    @staticmethod
+    def _pares(o: np.ndarray, m: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame({"o": o.astype("int64"), "m": m.astype("int64")})
+
+    def _misma_cuenta(self, pares: pd.DataFrame) -> pd.DataFrame:
+        """Descarta DETRACCION fuera de la cuenta de detracciones (y viceversa)."""
+        if not self.por_cuenta or pares.empty:
+            return pares
+        o = pares["o"].to_numpy(dtype="int64")
+        m = pares["m"].to_numpy(dtype="int64")
+        return pares[self.o_det[o] == self.m_det[m]]
+
+    def _rango_montos(self, oi: np.ndarray, mi: np.ndarray) -> pd.DataFrame:
+        """Pares oi × mi con |Δ céntimos| ≤ monto_variacion (búsqueda binaria)."""
+        orden = mi[np.argsort(self.m_cent[mi], kind="stable")]
+        montos = self.m_cent[orden]
+        lo = np.searchsorted(montos, self.o_cent[oi] - self.var_c, side="left")
+        hi = np.searchsorted(montos, self.o_cent[oi] + self.var_c, side="right")
+        n = hi - lo
+        o = np.repeat(oi, n)
+        desplazamiento = np.arange(int(n.sum())) - np.repeat(np.cumsum(n) - n, n)
+        m = orden[np.repeat(lo, n) + desplazamiento]
+        return self._pares(o, m)
+
+    def _pares_rango(self) -> pd.DataFrame:
+        """Pares objetivo × movimiento libres con |Δ céntimos| ≤ monto_variacion."""
+        if self._rango is None:
+            todos_o = np.arange(len(self.obj))
+            todos_m = np.arange(len(self.libro))
+            if self.por_cuenta:
+                # Un índice por cuenta: la detracción solo busca en la suya
+                self._rango = pd.concat([
+                    self._rango_montos(todos_o[~self.o_det], todos_m[~self.m_det]),
+                    self._rango_montos(todos_o[self.o_det], todos_m[self.m_det]),
+                ], ignore_index=True)
+            else:
+                self._rango = self._rango_montos(todos_o, todos_m)
+
+        r = self._rango
+        return r[self.o_libre[r["o"].to_numpy()] & self.m_libre[r["m"].to_numpy()]].reset_index(drop=True)
+
+    def _puntuar(self, pares: pd.DataFrame) -> pd.DataFrame:
+        """Mismo score que MatcherEngine._score_candidato: 0.7 monto + 0.3 fecha."""
+        o = pares["o"].to_numpy()
+        m = pares["m"].to_numpy()
+        target = self.o_monto[o]
+        variacion = np.abs(self.o_cent[o] - self.m_cent[m]) / 100
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s_monto = np.where(target > 0, np.clip(1.0 - variacion / target, 0.0, None), 0.0)
+        dias = np.abs(self.m_dia[m] - self.o_dia[o])
+        s_fecha = np.nan_to_num(np.clip(1.0 - dias / self.engine.days_tol, 0.0, None), nan=0.0)
+
+        pares = pares.copy()
+        pares["variacion"] = variacion
+        pares["score"] = 0.7 * s_monto + 0.3 * s_fecha
+        pares["razon"] = [f"Reglas → monto={a:.2f}, fecha={b:.2f}" for a, b in zip(s_monto, s_fecha)]
+        return pares
+
+    def _en_tolerancia(self, pares: pd.DataFrame) -> pd.DataFrame:
+        o = pares["o"].to_numpy(dtype="int64")
+        m = pares["m"].to_numpy(dtype="int64")
+        return pares[np.abs(self.o_cent[o] - self.m_cent[m]) <= self.var_c]
+
+    @staticmethod
+    def _unicos(pares: pd.DataFrame) -> pd.Series:
+        """Pares cuyo objetivo y movimiento aparecen una sola vez (sin ambigüedad)."""
+        return (~pares["o"].duplicated(keep=False)) & (~pares["m"].duplicated(keep=False))
+
+    @staticmethod
+    def _asignar(pares: pd.DataFrame, columna: str) -> pd.Series:
+        """Asignación 1 a 1 voraz por `columna` descendente."""
+        orden = pares.sort_values(columna, ascending=False, kind="stable")
+        elegidos, usados_o, usados_m = [], set(), set()
+        for ix, o, m in zip(orden.index, orden["o"], orden["m"]):
+            if o in usados_o or m in usados_m:
+                continue
+            usados_o.add(o)
+            usados_m.add(m)
+            elegidos.append(ix)
+        return pd.Series(pares.index.isin(elegidos), index=pares.index)
+
+    # --------------------------------------------------
+    # PASADA 1 · exacta (céntimos + día, o serie-número)
+    # --------------------------------------------------
+    def _pasada_exacta(self) -> pd.DataFrame:
+        oi = np.flatnonzero(self.o_libre & ~np.isnan(self.o_dia))
+        mi = np.flatnonzero(self.m_libre & ~np.isnan(self.m_dia))
+        por_monto = pd.DataFrame({"o": oi, "cent": self.o_cent[oi], "dia": self.o_dia[oi]}).merge(
+            pd.DataFrame({"m": mi, "cent": self.m_cent[mi], "dia": self.m_dia[mi]}),
+            on=["cent", "dia"],
+        )[["o", "m"]]
+
+        # Serie-número citada en la descripción (+ monto dentro de tolerancia)
+        refs = self.m_claves[self.m_claves["tipo"] == "DOC"]
+        refs = refs[self.m_libre[refs["m"].to_numpy(dtype="int64")]].rename(columns={"clave": "ref"})
+        oi = np.flatnonzero(self.o_libre & self.obj["ref"].notna().to_numpy())
+        por_ref = pd.DataFrame({"o": oi, "ref": self.obj["ref"].to_numpy()[oi]}).merge(refs[["m", "ref"]], on="ref")
+        por_ref = self._en_tolerancia(por_ref[["o", "m"]])
+
+        pares = pd.concat([por_monto, por_ref], ignore_index=True).drop_duplicates(["o", "m"])
+        pares = self._misma_cuenta(pares.astype("int64"))
+        pares = self._puntuar(pares.reset_index(drop=True))
+        pares["resuelto"] = self._unicos(pares)
+        return pares
+
+    # --------------------------------------------------
+    # PASADA 2 · referencia (RUC / serie-número → índices BD)
+    # --------------------------------------------------
+    def _pasada_referencia(self) -> pd.DataFrame:
+        claves = self.m_claves[self.m_libre[self.m_claves["m"].to_numpy(dtype="int64")]]
+        hits = pd.DataFrame(columns=["pos", "factura_id", "tipo"])
+        if not claves.empty:
+            hits = self._referencias().facturas(claves.rename(columns={"m": "pos"}))
+        hits = hits.astype({"pos": "int64", "factura_id": "int64"})
+
+        oi = np.flatnonzero(self.o_libre)
+        pares = pd.DataFrame({"o": oi, "factura_id": self.obj["factura_id"].to_numpy()[oi]}).merge(
+            hits.rename(columns={"pos": "m"}), on="factura_id"
+        )
+        # Por tipo de clave: la de serie-número manda sobre la de RUC
+        pares = pares.sort_values("tipo").drop_duplicates(["o", "m"])
+        via = self._misma_cuenta(pares[["o", "m", "tipo"]].astype({"o": "int64", "m": "int64"}))
+        pares = self._puntuar(self._en_tolerancia(via[["o", "m"]]).reset_index(drop=True))
+        pares = pares.merge(via, on=["o", "m"], how="left")
+
+        pares["razon"] = pares["tipo"].map({"DOC": "serie-número", "RUC": "RUC"}) + " en banco · " + pares["razon"]
+        pares["resuelto"] = self._unicos(pares) & (pares["score"] >= self.engine.min_score_match)
+        return pares.drop(columns=["tipo"])
+
+    # --------------------------------------------------
+    # PASADA 3 · pareada (neto + detracción de la misma factura)
+    # --------------------------------------------------
+    def _pasada_pareada(self) -> pd.DataFrame:
+        """
+        Neto y detracción de una factura se buscan juntos: el par de
+        movimientos se puntúa con la media de ambos scores y se asigna 1 a 1.
+        Sin cuenta_detraccion no hay con qué separar los depósitos → vacía.
+        """
+        pares = self._pares_rango()
+        pares = self._puntuar(pares if self.por_cuenta else pares.iloc[:0])
+        pares["resuelto"] = False
+        if pares.empty:
+            return pares
+
+        o = pares["o"].to_numpy()
+        pares["factura_id"] = self.obj["factura_id"].to_numpy()[o]
+        cols = ["o", "m", "score", "factura_id"]
+        juntos = pares.loc[~self.o_det[o], cols].merge(
+            pares.loc[self.o_det[o], cols], on="factura_id", suffixes=("_n", "_d")
+        )
+        juntos["score"] = (juntos["score_n"] + juntos["score_d"]) / 2
+        juntos = juntos[juntos["score"] >= self.engine.min_score_match]
+        juntos = juntos.sort_values("score", ascending=False, kind="stable")
+
+        # Asignación voraz: factura y movimientos una sola vez
+        elegidos: Dict[Tuple[int, int], float] = {}
+        usadas, usados = set(), set()
+        for fid, on, mn, od, md, sc in zip(juntos["factura_id"], juntos["o_n"], juntos["m_n"],
+                                           juntos["o_d"], juntos["m_d"], juntos["score"]):
+            if fid in usadas or mn in usados or md in usados:
+                continue
+            usadas.add(fid)
+            usados.update((mn, md))
+            elegidos[(on, mn)] = elegidos[(od, md)] = sc
+
+        claves = list(zip(pares["o"], pares["m"]))
+        pares["resuelto"] = [k in elegidos for k in claves]
+        pares["score"] = [elegidos.get(k, s) for k, s in zip(claves, pares["score"])]
+        pares.loc[pares["resuelto"], "razon"] = "Neto + detracción · " + pares.loc[pares["resuelto"], "razon"]
+        return pares.drop(columns=["factura_id"])
+
+    # --------------------------------------------------
+    # PASADA 4 · tolerancia (solo pares sin ambigüedad)
+    # --------------------------------------------------
+    def _pasada_tolerancia(self) -> pd.DataFrame:
+        pares = self._puntuar(self._pares_rango())
+        pares["resuelto"] = self._unicos(pares) & (pares["score"] >= self.engine.min_score_match)
+        return pares
+
+    # --------------------------------------------------
+    # PASADA 5 · nombre (desempate por similitud)
+    # --------------------------------------------------
+    def _pasada_nombre(self) -> pd.DataFrame:
+        pares = self._puntuar(self._pares_rango())
+        if pares.empty:
+            pares["resuelto"] = pd.Series(dtype=bool)
+            return pares
+
+        clientes = self.obj["cliente"].to_numpy()[pares["o"].to_numpy()]
+        textos = self.m_texto.to_numpy()[pares["m"].to_numpy()]
+        cache: Dict[Tuple[str, str], float] = {}
+
+        def sim(a: str, b: str) -> float:
+            if not a or not b:
+                return 0.0
+            if (a, b) not in cache:
+                cache[(a, b)] = SequenceMatcher(None, a, b).ratio()
+            return cache[(a, b)]
+
+        pares["sim"] = [sim(a, b) for a, b in zip(clientes, textos)]
+        pares["combinado"] = 0.7 * pares["score"] + 0.3 * pares["sim"]
+
+        # Solo objetivos con un ganador claro por nombre
+        orden = pares.sort_values(["o", "combinado"], ascending=[True, False], kind="stable")
+        puesto = orden.groupby("o").cumcount()
+        segundo = orden.loc[puesto == 1].set_index("o")["combinado"]
+        mejor = orden.loc[puesto == 0].set_index("o")
+        claro = (
+            (mejor["sim"] >= self.SIM_MINIMA)
+            & (mejor["score"] >= self.engine.min_score_match)
+            & ((mejor["combinado"] - segundo.reindex(mejor.index)).fillna(1.0) >= self.MARGEN)
+        )
+        candidatos = pares["o"].isin(claro[claro].index)
+
+        pares["razon"] = pares["razon"] + pares["sim"].map(lambda s: f", nombre={s:.2f}")
+        pares["resuelto"] = False
+        if candidatos.any():
+            pares.loc[candidatos, "resuelto"] = self._asignar(pares[candidatos], "combinado")
+        return pares
+
+    # --------------------------------------------------
+    # Suma de subconjuntos (pasadas masivo y fraccionado)
+    # --------------------------------------------------
+    def _subconjunto(
+        self,
+        indices: "OrderedDict[bytes, SubsetIndex]",
+        cand: np.ndarray,
+        cent: np.ndarray,
+        dias: np.ndarray,
+        objetivo: int,
+        max_candidatos: int,
+        max_items: int,
+    ) -> Optional[np.ndarray]:
+        """
+        Subconjunto de `cand` (índices sobre `cent`) que suma `objetivo` ±
+        monto_variacion, entre los `max_candidatos` más cercanos en fecha
+        (`dias`: desfase de cada candidato; sin fecha → se admite).
+        """
+        dentro = ~(np.abs(dias) > self.engine.days_tol)
+        cand, dias = cand[dentro], dias[dentro]
+        if len(cand) < 2:
+            return None
+
+        # Las más cercanas en fecha (acota la enumeración)
+        cerca = np.argsort(np.nan_to_num(np.abs(dias), nan=np.inf), kind="stable")[:max_candidatos]
+        cand = np.sort(cand[cerca])
+        if int(cent[cand].sum()) < objetivo - self.var_c:
+            return None
+
+        # Objetivos con los mismos candidatos comparten la enumeración
+        # (LRU acotada por memoria: un índice de 40 montos ocupa ~32 MB)
+        clave = cand.tobytes()
+        if clave in indices:
+            indices.move_to_end(clave)
+        else:
+            indices[clave] = SubsetIndex(cent[cand])
+            ocupado = sum(ix.nbytes for ix in indices.values())
+            while ocupado > self.INDICES_MAX_BYTES and len(indices) > 1:
+                ocupado -= indices.popitem(last=False)[1].nbytes
+        elegidos = indices[clave].buscar(objetivo, self.var_c, max_items=max_items)
+        return None if elegidos is None else cand[elegidos]
+
+    @staticmethod
+    def _aceptar(claves: List[int], solucion, cent_clave: np.ndarray, cent: np.ndarray,
+                 usado: np.ndarray) -> Dict[int, np.ndarray]:
+        """
+        Cola de propuestas {clave: subconjunto}: se acepta primero la más
+        creíble (menos items, suma más exacta). Si al salir usa items ya
+        tomados por otra clave, se recalcula sin ellos y vuelve a la cola.
+        """
+        def prioridad(k: int, sel: np.ndarray) -> tuple:
+            return (len(sel), abs(int(cent[sel].sum()) - int(cent_clave[k])), k)
+
+        cola = [(prioridad(k, sel), k, sel) for k in claves for sel in [solucion(k)] if sel is not None]
+        heapq.heapify(cola)
+
+        aceptados: Dict[int, np.ndarray] = {}
+        while cola:
+            _, k, sel = heapq.heappop(cola)
+            if usado[sel].any():
+                sel = solucion(k)
+                if sel is not None:
+                    heapq.heappush(cola, (prioridad(k, sel), k, sel))
+                continue
+            usado[sel] = True
+            aceptados[k] = sel
+        return aceptados
+
+    # --------------------------------------------------
+    # PASADA 6 · masivo (un depósito → varias facturas)
+    # --------------------------------------------------
+    def _clientes_por_movimiento(self, oi: np.ndarray, mi: np.ndarray) -> Dict[int, set]:
+        """{movimiento: {ruc}}: RUC citado en el texto o razón social mencionada."""
+        rucs = set(self.obj["ruc"].to_numpy()[oi]) - {""}
+        por_mov: Dict[int, set] = {}
+
+        claves = self.m_claves[(self.m_claves["tipo"] == "RUC") & self.m_claves["clave"].isin(rucs)]
+        for m, r in zip(claves["m"].to_numpy(dtype="int64"), claves["clave"]):
+            if self.m_libre[m] and self.m_cent[m] > 0:
+                por_mov.setdefault(int(m), set()).add(r)
+
+        # Índice invertido término → movimientos (solo libres)
+        indice: Dict[str, set] = {}
+        for m in mi:
+            for t in FTSNameCandidates.terminos(self.m_texto.iat[m]):
+                indice.setdefault(t, set()).add(int(m))
+
+        razones = self._referencias().razones_sociales()
+        nombres = pd.DataFrame({"ruc": self.obj["ruc"].to_numpy()[oi],
+                                "cliente": self.obj["cliente"].to_numpy()[oi]}).drop_duplicates()
+        for ruc, cliente in nombres.itertuples(index=False, name=None):
+            if not ruc:
+                continue
+            for nombre in {cliente, razones.get(ruc, "")} - {""}:
+                terminos = FTSNameCandidates.terminos(nombre)
+                if not terminos:
+                    continue
+                movs = set.intersection(*(indice.get(t, set()) for t in terminos))
+                for m in movs:
+                    por_mov.setdefault(m, set()).add(ruc)
+        return por_mov
+
+    def _pasada_masivo(self) -> pd.DataFrame:
+        columnas = ["o", "m", "variacion", "score", "razon", "resuelto"]
+        es_factura = self.obj["tipo_monto_match"].isin(["TOTAL_FINAL", "NETO_RECIBIDO"]).to_numpy()
+        oi = np.flatnonzero(self.o_libre & es_factura)
+        mi = np.flatnonzero(self.m_libre & ~self.m_det & (self.m_cent > 0))
+        if not len(oi) or not len(mi):
+            return pd.DataFrame(columns=columnas)
+
+        clientes = self._clientes_por_movimiento(oi, mi)
+        por_ruc: Dict[str, np.ndarray] = {
+            r: g.to_numpy() for r, g in pd.Series(oi).groupby(self.obj["ruc"].to_numpy()[oi])
+        }
+        usado = np.zeros(len(self.obj), dtype=bool)
+        indices: "OrderedDict[bytes, SubsetIndex]" = OrderedDict()
+
+        def solucion(m: int) -> Optional[np.ndarray]:
+            cand = np.concatenate([por_ruc.get(r, np.array([], dtype=np.int64)) for r in clientes[m]])
+            cand = cand[~usado[cand] & (self.o_cent[cand] <= self.m_cent[m] + self.var_c)]
+            return self._subconjunto(indices, cand, self.o_cent, self.o_dia[cand] - self.m_dia[m],
+                                     int(self.m_cent[m]), self.masivo_candidatos, self.masivo_max)
+
+        aceptados = self._aceptar(list(clientes), solucion, self.m_cent, self.o_cent, usado)
+
+        filas = []
+        for m, o in aceptados.items():
+            suma = int(self.o_cent[o].sum()) / 100
+            variacion = abs(int(self.o_cent[o].sum()) - int(self.m_cent[m])) / 100
+            s_monto = max(0.0, 1.0 - variacion / self.m_monto[m])
+            s_fecha = np.nan_to_num(np.clip(1.0 - np.abs(self.m_dia[m] - self.o_dia[o]) / self.engine.days_tol,
+                                            0.0, None), nan=0.0)
+            for k, oo in enumerate(o):
+                filas.append((int(oo), int(m), variacion, 0.7 * s_monto + 0.3 * s_fecha[k],
+                              f"Pago masivo → {len(o)} facturas · suma={suma:.2f} vs banco={self.m_monto[m]:.2f}",
+                              True))
+
+        return pd.DataFrame(filas, columns=columnas).astype({"o": "int64", "m": "int64", "resuelto": bool})
+
+    # --------------------------------------------------
+    # PASADA 7 · fraccionado (una factura → varios movimientos)
+    # --------------------------------------------------
+    def _pasada_fraccionado(self) -> pd.DataFrame:
+        columnas = ["o", "m", "variacion", "score", "razon", "resuelto"]
+        es_factura = self.obj["tipo_monto_match"].isin(["TOTAL_FINAL", "NETO_RECIBIDO"]).to_numpy()
+        oi = np.flatnonzero(self.o_libre & es_factura & (self.obj["ruc"] != "").to_numpy())
+        mi = np.flatnonzero(self.m_libre & ~self.m_det & (self.m_cent > 0))
+        if not len(oi) or not len(mi):
+            return pd.DataFrame(columns=columnas)
+
+        # Movimientos de cada cliente ordenados por monto: los mayores que
+        # la factura se cortan con una búsqueda binaria
+        por_ruc: Dict[str, List[int]] = {}
+        for m, rucs in self._clientes_por_movimiento(oi, mi).items():
+            for r in rucs:
+                por_ruc.setdefault(r, []).append(m)
+        por_ruc_m: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        for r, movs in por_ruc.items():
+            movs = np.array(movs, dtype=np.int64)
+            movs = movs[np.argsort(self.m_cent[movs], kind="stable")]
+            por_ruc_m[r] = (movs, self.m_cent[movs])
+
+        rucs = self.obj["ruc"].to_numpy()
+        oi = np.array([o for o in oi if rucs[o] in por_ruc_m], dtype=np.int64)
+        usado = np.zeros(len(self.libro), dtype=bool)
+        indices: "OrderedDict[bytes, SubsetIndex]" = OrderedDict()
+
+        def solucion(o: int) -> Optional[np.ndarray]:
+            movs, cents = por_ruc_m[rucs[o]]
+            cand = movs[: np.searchsorted(cents, self.o_cent[o] + self.var_c, side="right")]
+            cand = cand[~usado[cand]]
+            return self._subconjunto(indices, cand, self.m_cent, self.m_dia[cand] - self.o_dia[o],
+                                     int(self.o_cent[o]), self.fraccionado_candidatos, self.fraccionado_max)
+
+        aceptados = self._aceptar(list(oi), solucion, self.o_cent, self.m_cent, usado)
+
+        filas = []
+        for o, m in aceptados.items():
+            suma = int(self.m_cent[m].sum()) / 100
+            variacion = abs(int(self.m_cent[m].sum()) - int(self.o_cent[o])) / 100
+            s_monto = max(0.0, 1.0 - variacion / self.o_monto[o])
+            s_fecha = np.nan_to_num(np.clip(1.0 - np.abs(self.m_dia[m] - self.o_dia[o]) / self.engine.days_tol,
+                                            0.0, None), nan=0.0)
+            for k, mm in enumerate(m):
+                filas.append((int(o), int(mm), variacion, 0.7 * s_monto + 0.3 * s_fecha[k],
+                              f"Pago fraccionado → {len(m)} movimientos · suma={suma:.2f} vs factura={self.o_monto[o]:.2f}",
+                              True))
+
+        return pd.DataFrame(filas, columns=columnas).astype({"o": "int64", "m": "int64", "resuelto": bool})
+
+    # --------------------------------------------------
+    # PASADA 8 · IA (solo lo que queda)
+    # --------------------------------------------------
+    def _pasada_ia(self) -> pd.DataFrame:
+        pares = self._puntuar(self._pares_rango())
+        pares["resuelto"] = False
+        pares["match_tipo"] = "MATCH"
+        if pares.empty:
+            return pares
+
+        aptos = pares["score"] >= self.engine.min_score_match
+        if aptos.any():
+            pares.loc[aptos, "resuelto"] = self._asignar(pares[aptos], "score")
+
+        if not self.usar_ia:
+            return pares
+
+        for ix in pares.index[pares["resuelto"]]:
+            o, m = int(pares.at[ix, "o"]), int(pares.at[ix, "m"])
+            try:
+                dec = ai_decide_match({
+                    "factura": str(self.obj.at[o, "factura_id"]),
+                    "cliente": str(self.obj.at[o, "cliente"]),
+                    "descripcion_banco": str(self.m_texto.iat[m]),
+                    "monto_banco_equivalente": float(self.m_monto[m]),
+                    "monto_ref": float(self.o_monto[o]),
+                    "tipo_monto_ref": str(self.obj.at[o, "tipo_monto_match"]),
+                    "diff_monto": float(pares.at[ix, "variacion"]),
+                    "sim_regla": float(pares.at[ix, "score"]),
+                })
+            except Exception as e:
+                warn(f"[Pasadas] IA no respondió ({e}) → se mantiene la decisión por reglas.")
+                continue
+
+            decision = str(dec.get("decision") or "MATCH_DUDOSO").upper()
+            if decision == "NO_MATCH":
+                pares.at[ix, "resuelto"] = False
+            else:
+                pares.at[ix, "match_tipo"] = decision
+            pares.at[ix, "razon"] = f"{pares.at[ix, 'razon']} · IA: {dec.get('justificacion', '')}"
+        return pares
+
+    # --------------------------------------------------
+    # Ejecución
+    # --------------------------------------------------
+    def run(self, df_f: pd.DataFrame, df_b) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """df_b: BankLedger o bancos ya preparados (se arma el libro)."""
+        info(f"=== MATCHING POR PASADAS · {' → '.join(self.pasadas)} ===")
+        t_total = time.perf_counter()
+
+        self._preparar(df_f, df_b if isinstance(df_b, BankLedger) else BankLedger.from_frame(df_b))
+        resueltos: List[pd.DataFrame] = []
+        evaluados: List[pd.DataFrame] = []
+
+        try:
+            for nombre in self.pasadas:
+                st = _Pasada(nombre, objetivos=int(self.o_libre.sum()))
+                t0 = time.perf_counter()
+
+                pares = getattr(self, f"_pasada_{nombre}")()
+                pares["pasada"] = nombre
+                if "match_tipo" not in pares.columns:
+                    pares["match_tipo"] = "MATCH"
+                pares["match_tipo"] = pares["match_tipo"].fillna("MATCH")
+
+                hechos = pares[pares["resuelto"].astype(bool)]
+                self.o_libre[hechos["o"].to_numpy(dtype="int64")] = False
+                self.m_libre[hechos["m"].to_numpy(dtype="int64")] = False
+                resueltos.append(hechos)
+                evaluados.append(pares)
+
+                st.evaluados = len(pares)
+                st.resueltos = int(hechos["o"].nunique())
+                st.segundos = time.perf_counter() - t0
+                self.stats.append(st)
+        finally:
+            if self._fuente is not None:
+                self._fuente.close()
+
+        self.report(time.perf_counter() - t_total)
+        return self._filas(resueltos, evaluados)
+
+    def report(self, pared: float):
+        for st in self.stats:
+            info(f"   - {st.nombre:<11} {st.objetivos:7d} objetivos → {st.resueltos:7d} resueltos · "
+                 f"{st.evaluados} pares · {st.segundos:.2f}s")
+
+        ok(f"⏱ Pasadas: {int((~self.o_libre).sum())}/{len(self.obj)} objetivos resueltos · "
+           f"{int(self.o_libre.sum())} sin match · {pared:.2f}s")
+
+    # --------------------------------------------------
+    # Filas con el formato de MatcherEngine
+    # --------------------------------------------------
+    def _filas(self, resueltos: List[pd.DataFrame], evaluados: List[pd.DataFrame]):
+        columnas = ["o", "m", "variacion", "score", "razon", "pasada", "match_tipo"]
+        hechos = pd.concat([r[columnas] for r in resueltos], ignore_index=True) \
+            if resueltos else pd.DataFrame(columns=columnas)
+        # Cada par una vez: la última pasada que lo evaluó
+        todos = pd.concat([e[columnas] for e in evaluados], ignore_index=True) \
+            if evaluados else pd.DataFrame(columns=columnas)
+        todos = todos.drop_duplicates(["o", "m"], keep="last")
+
+        def base(p: pd.DataFrame) -> Dict[str, np.ndarray]:
+            o = p["o"].to_numpy(dtype="int64")
+            m = p["m"].to_numpy(dtype="int64")
+            return {
+                "factura_id": self.obj["factura_id"].to_numpy()[o],
+                "movimiento_id": self.libro.ids[m],
+                "monto_factura": self.o_monto[o],
+                "monto_banco": self.m_monto[m],
+            }
+
+        df_match = pd.DataFrame({
+            **base(hechos),
+            "diferencia": hechos["variacion"].to_numpy(),
+            "score_similitud": hechos["score"].to_numpy(),
+            "match_tipo": hechos["match_tipo"].to_numpy(),
+            "tipo_monto_match": self.obj["tipo_monto_match"].to_numpy()[hechos["o"].to_numpy(dtype="int64")],
+            "pasada": hechos["pasada"].to_numpy(),
+        })
+
+        m = todos["m"].to_numpy(dtype="int64")
+        df_det = pd.DataFrame({
+            **base(todos),
+            "variacion_monto": todos["variacion"].to_numpy(),
+            "fecha_mov": self.libro.fechas(m),
+            "banco_pago": self.libro.banco(m),
+            "operacion": self.libro.texto("operacion", m),
+            "descripcion_banco": self.libro.texto("descripcion", m),
+            "score_similitud": todos["score"].to_numpy(),
+            "razon_ia": ("[" + todos["pasada"] + "] " + todos["razon"]).to_numpy(),
+            "tipo_monto_match": self.obj["tipo_monto_match"].to_numpy()[todos["o"].to_numpy(dtype="int64")],
+        })
+        return df_match, df_det
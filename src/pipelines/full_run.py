@@ -21,67 +21,90 @@ from src.pipelines.pipeline_facturas import PipelineFacturas
 from src.pipelines.pipeline_bancos import PipelineBancos
 from src.pipelines.pipeline_clients import PipelineClientes
 from src.matchers.matcher_engine import MatcherEngine
+from src.pipelines.stage_graph import StageGraph
+from src.loaders.stage_store import StageStore, MatchProgress, huella_archivo
 
 
 # ============================================================
-#  FULL RUN – EJECUCIÓN COMPLETA DEL SISTEMA PULSEFORGE
+#  ETAPAS (funciones de módulo → picklables)
 # ============================================================
-def run_full_pipeline() -> dict:
-    info("=== FULL RUN · PULSEFORGE 2025 ===")
-
-    cfg = get_config()
-
-    # -----------------------------
-    # 1) FACTURAS
-    # -----------------------------
+def _etapa_facturas(_) -> pd.DataFrame:
     info("→ Ejecutando PipelineFacturas…")
-    pf = PipelineFacturas()
-    df_fact = pf.process()
+    df_fact = PipelineFacturas().process()
 
     if df_fact is None or df_fact.empty:
         warn("PipelineFacturas devolvió cero filas.")
     else:
         ok(f"Facturas procesadas: {len(df_fact)}")
+    return df_fact
 
-    # -----------------------------
-    # 2) BANCOS
-    # -----------------------------
+
+def _etapa_bancos(_) -> pd.DataFrame:
     info("→ Ejecutando PipelineBancos…")
-    pb = PipelineBancos()
-    df_bank = pb.process()
+    df_bank = PipelineBancos().process()
 
     if df_bank is None or df_bank.empty:
         warn("PipelineBancos devolvió cero filas.")
     else:
         ok(f"Movimientos procesados: {len(df_bank)}")
+    return df_bank
+
 
-    # -----------------------------
-    # 3) CLIENTES
-    # -----------------------------
+def _etapa_clientes(_) -> list:
     info("→ Ejecutando PipelineClientes…")
-    pc = PipelineClientes()
-    clientes = pc.process()
+    clientes = PipelineClientes().process()
 
     if not clientes:
         warn("PipelineClientes devolvió cero registros.")
     else:
         ok(f"Clientes procesados: {len(clientes)}")
+    return clientes
 
-    # -----------------------------
-    # 4) MATCHING COMPLETO
-    # -----------------------------
+
+def _etapa_matching(e) -> tuple:
     info("→ Ejecutando MatcherEngine (facturas vs bancos)…")
     matcher = MatcherEngine()
+    progreso = MatchProgress("full_run")
 
-    df_match, df_det = matcher.run(df_fact, df_bank)
+    df_match, df_det = matcher.run(e["facturas"], e["bancos"], progreso=progreso)
+    progreso.clear()
 
     ok(f"Matches generados: {len(df_match)}")
     ok(f"Detalles generados: {len(df_det)}")
+    return df_match, df_det
+
+
+# ============================================================
+#  FULL RUN – EJECUCIÓN COMPLETA DEL SISTEMA PULSEFORGE
+# ============================================================
+def run_full_pipeline(resume: bool = False) -> dict:
+    """
+    resume=True → el matching continúa desde el último progreso guardado
+    (los DataFrames viven en memoria, así que las etapas previas se recalculan).
+    Una corrida completa limpia su registro: no queda nada que reanudar.
+    """
+    info("=== FULL RUN · PULSEFORGE 2025 ===")
+
+    cfg = get_config()
+    origen = {"origen": huella_archivo(cfg.db_source)}
+
+    # Facturas / bancos / clientes son independientes; el match espera a ambos
+    BD = ("bd_destino",)
+    store = StageStore("full_run")
+    g = StageGraph("full_run", store=store, resume=resume)
+    g.add("facturas", _etapa_facturas, recursos=BD, entrada=origen)
+    g.add("bancos", _etapa_bancos, recursos=BD, entrada=origen)
+    g.add("clientes", _etapa_clientes, recursos=BD, entrada=origen)
+    g.add("matching", _etapa_matching, deps=["facturas", "bancos"])
+
+    r = g.run()
+    df_match, df_det = r["matching"]
+    store.reset()
 
     return {
-        "facturas": df_fact,
-        "bancos": df_bank,
-        "clientes": clientes,
+        "facturas": r["facturas"],
+        "bancos": r["bancos"],
+        "clientes": r["clientes"],
         "matches": df_match,
         "detalles": df_det,
     }
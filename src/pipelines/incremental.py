@@ -2,6 +2,8 @@
 from __future__ import annotations
 import sys
 from pathlib import Path
+from typing import Optional
+import numpy as np
 import pandas as pd
 
 # ------------------------------------------------------------
@@ -17,16 +19,24 @@ if str(ROOT) not in sys.path:
 from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_config
 from src.core.db import get_connection
+from src.core.bloom import BloomFilter
 
-from src.pipelines.pipeline_facturas import PipelineFacturas
-from src.pipelines.pipeline_bancos import PipelineBancos
-from src.pipelines.pipeline_clients import PipelineClientes
+from src.extractors.invoices_extractor import InvoicesExtractor
+from src.extractors.bank_extractor import BankExtractor
+from src.extractors.clients_extractor import ClientsExtractor
 
+from src.loaders.invoice_writer import InvoiceWriter
+from src.loaders.bank_writer import BankWriter
+from src.loaders.clients_writer import ClientsWriter
+from src.loaders.checkpoint_store import CheckpointStore
+
+from src.transformers.calculator import Calculator
 from src.matchers.matcher_engine import MatcherEngine
+from src.pipelines.stage_graph import StageGraph
 
 
 # ============================================================
-#  INCREMENTAL RUN — SOLO PROCESAR LO NUEVO EN BD
+#  INCREMENTAL RUN — SOLO EXTRAER / PROCESAR LO NUEVO EN ORIGEN
 # ============================================================
 class IncrementalRunner:
 
@@ -34,65 +44,136 @@ class IncrementalRunner:
         info("Inicializando IncrementalRunner PulseForge…")
         self.cfg = get_config()
         self.conn = get_connection()
+        self.checkpoints = CheckpointStore()
+        self._blooms: dict = {}
 
     # --------------------------------------------------------
-    # Leer hashes ya existentes en destino
+    # Candidatos → TEMP table (idx, hash) en la BD destino
     # --------------------------------------------------------
-    def _load_existing_hashes(self) -> dict:
-        info("Leyendo hashes existentes desde BD destino…")
-
-        try:
-            df_f = pd.read_sql_query("SELECT source_hash FROM facturas_pf", self.conn)
-            df_b = pd.read_sql_query("SELECT source_hash FROM bancos_pf", self.conn)
-            df_c = pd.read_sql_query("SELECT source_hash FROM clientes_pf", self.conn)
+    def _load_candidates(self, hashes: list[str]):
+        self.conn.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS pf_candidatos (idx INTEGER PRIMARY KEY, h TEXT)"
+        )
+        self.conn.execute("DELETE FROM pf_candidatos")
+        self.conn.executemany(
+            "INSERT INTO pf_candidatos (idx, h) VALUES (?, ?)",
+            ((i, h or "") for i, h in enumerate(hashes)),
+        )
+
+    def _antijoin(self, tabla: str, hashes: list[str]) -> list[int]:
+        """Posiciones de `hashes` cuyo source_hash NO existe en destino (índice UNIQUE)."""
+        if not hashes:
+            return []
+
+        self._load_candidates(hashes)
+        cur = self.conn.execute(f"""
+            SELECT c.idx FROM pf_candidatos c
+            WHERE NOT EXISTS (SELECT 1 FROM {tabla} t WHERE t.source_hash = c.h)
+            ORDER BY c.idx
+        """)
+        nuevos = [r[0] for r in cur.fetchall()]
+
+        # Cerrar la transacción implícita → no retener lock SHARED frente a los writers
+        self.conn.commit()
+        return nuevos
 
-            ok("Hashes cargados correctamente.")
-            return {
-                "facturas": set(df_f["source_hash"].astype(str)),
-                "bancos": set(df_b["source_hash"].astype(str)),
-                "clientes": set(df_c["source_hash"].astype(str))
-            }
-
-        except Exception as e:
-            error(f"Error cargando hashes de destino: {e}")
-            return {"facturas": set(), "bancos": set(), "clientes": set()}
+    # --------------------------------------------------------
+    # Filtro Bloom en disco (opcional) → ruta rápida "seguro nuevo"
+    # --------------------------------------------------------
+    def _bloom_path(self, tabla: str) -> Path:
+        temp_dir = Path(self.cfg.temp_dir)
+        if not temp_dir.is_absolute():
+            temp_dir = ROOT / temp_dir
+        return temp_dir / f"bloom_{tabla}"
+
+    def _bloom_stamp(self, tabla: str) -> dict:
+        (n, max_id), = self.conn.execute(
+            f"SELECT COUNT(*), COALESCE(MAX(id), 0) FROM {tabla}"
+        ).fetchall()
+        return {"filas": n, "max_id": max_id}
+
+    def _bloom(self, tabla: str) -> Optional[BloomFilter]:
+        if not self.cfg.etl.bloom_incremental:
+            return None
+
+        if tabla in self._blooms:
+            return self._blooms[tabla]
+
+        stamp = self._bloom_stamp(tabla)
+        bloom, meta = BloomFilter.load(self._bloom_path(tabla))
+
+        vigente = (
+            bloom is not None and not bloom.saturado
+            and meta.get("filas") == stamp["filas"]
+            and meta.get("max_id") == stamp["max_id"]
+        )
+
+        if not vigente:
+            info(f"Reconstruyendo filtro Bloom de {tabla} ({stamp['filas']} filas)…")
+            bloom = BloomFilter(max(2 * stamp["filas"], 100_000), self.cfg.etl.bloom_fp)
+            cur = self.conn.execute(f"SELECT source_hash FROM {tabla}")
+            while True:
+                lote = cur.fetchmany(50_000)
+                if not lote:
+                    break
+                bloom.add_many(r[0] for r in lote)
+            bloom.save(self._bloom_path(tabla), stamp)
+
+        self._blooms[tabla] = bloom
+        return bloom
 
     # --------------------------------------------------------
-    # Filtrar solo registros nuevos
+    # Filtrar solo registros nuevos (sin cargar hashes de destino)
     # --------------------------------------------------------
-    @staticmethod
-    def _filter_new(lista: list[dict], existing: set):
-        return [item for item in lista if item.get("source_hash") not in existing]
+    def _filter_new(self, tabla: str, lista: list[dict]) -> list[dict]:
+        hashes = [item.get("source_hash") or "" for item in lista]
+
+        bloom = self._bloom(tabla)
+        if bloom is None:
+            return [lista[i] for i in self._antijoin(tabla, hashes)]
+
+        # Ausentes en el Bloom → nuevos seguros; el resto se confirma en BD
+        quizas = bloom.contains_many(hashes)
+        dudosos = np.flatnonzero(quizas)
+        nuevos = set(np.flatnonzero(~quizas).tolist())
+        nuevos.update(int(dudosos[i]) for i in self._antijoin(tabla, [hashes[k] for k in dudosos]))
+
+        info(f"[Bloom] {tabla}: {len(hashes) - len(dudosos)} nuevos directos · "
+             f"{len(dudosos)} confirmados contra BD")
+        return [lista[i] for i in sorted(nuevos)]
 
     # --------------------------------------------------------
-    # Guardar en BD destino
+    # Delta → filtrar → guardar → confirmar checkpoints
     # --------------------------------------------------------
-    def _save_facturas(self, rows: list[dict]):
-        if not rows:
-            warn("No hay facturas nuevas para insertar.")
-            return
+    def _cargar(self, etiqueta: str, tabla_pf: str, registros: list[dict],
+                writer, tablas_origen: list[str]) -> list[dict]:
+        nuevos = self._filter_new(tabla_pf, registros)
+        ok(f"{etiqueta} nuevos detectados: {len(nuevos)} (delta origen: {len(registros)})")
 
-        df = pd.DataFrame(rows)
-        df.to_sql("facturas_pf", self.conn, if_exists="append", index=False)
-        ok(f"Facturas nuevas insertadas: {len(df)}")
+        if writer.save_many(nuevos) is None:
+            error(f"{etiqueta}: error al guardar → checkpoint NO avanzado.")
+            return nuevos
 
-    def _save_bancos(self, rows: list[dict]):
-        if not rows:
-            warn("No hay movimientos nuevos para insertar.")
-            return
+        self.checkpoints.commit([t for t in tablas_origen if t])
 
-        df = pd.DataFrame(rows)
-        df.to_sql("bancos_pf", self.conn, if_exists="append", index=False)
-        ok(f"Movimientos nuevos insertados: {len(df)}")
+        bloom = self._blooms.get(tabla_pf)
+        if bloom is not None and nuevos:
+            bloom.add_many(r.get("source_hash") or "" for r in nuevos)
+            bloom.save(self._bloom_path(tabla_pf), self._bloom_stamp(tabla_pf))
 
-    def _save_clientes(self, rows: list[dict]):
-        if not rows:
-            warn("No hay clientes nuevos para insertar.")
-            return
+        return nuevos
 
-        df = pd.DataFrame(rows)
-        df.to_sql("clientes_pf", self.conn, if_exists="append", index=False)
-        ok(f"Clientes nuevos insertados: {len(df)}")
+    def _read_by_hash(self, tabla: str, hashes: list[str]) -> pd.DataFrame:
+        if not hashes:
+            return pd.DataFrame()
+
+        self._load_candidates(hashes)
+        df = pd.read_sql_query(
+            f"SELECT t.* FROM {tabla} t JOIN pf_candidatos c ON c.h = t.source_hash",
+            self.conn,
+        )
+        self.conn.commit()
+        return df
 
     # --------------------------------------------------------
     #  EJECUCIÓN PRINCIPAL INCREMENTAL
@@ -100,66 +181,94 @@ class IncrementalRunner:
     def run(self) -> dict:
         info("=== INCREMENTAL RUN · PULSEFORGE ===")
 
-        hashes = self._load_existing_hashes()
-
-        # -----------------------------
-        #  FACTURAS
-        # -----------------------------
-        pf = PipelineFacturas()
-        df_fact = pf.process()
-
-        nuevas_fact = self._filter_new(df_fact.to_dict("records"), hashes["facturas"])
-        ok(f"Facturas nuevas detectadas: {len(nuevas_fact)}")
-        self._save_facturas(nuevas_fact)
-
-        # -----------------------------
-        #  BANCOS
-        # -----------------------------
-        pb = PipelineBancos()
-        df_bank = pb.process()
-
-        nuevas_bank = self._filter_new(df_bank.to_dict("records"), hashes["bancos"])
-        ok(f"Movimientos nuevos detectados: {len(nuevas_bank)}")
-        self._save_bancos(nuevas_bank)
-
-        # -----------------------------
-        #  CLIENTES
-        # -----------------------------
-        pc = PipelineClientes()
-        lista_clientes = pc.process()
-
-        nuevas_cli = self._filter_new(lista_clientes, hashes["clientes"])
-        ok(f"Clientes nuevos detectados: {len(nuevas_cli)}")
-        self._save_clientes(nuevas_cli)
-
-        # -----------------------------
-        # MATCHING SOLO SOBRE LO NUEVO
-        # -----------------------------
+        # Extracción delta en paralelo; carga y match serializados sobre la BD destino
+        BD = ("bd_destino",)
+        g = StageGraph("incremental")
+
+        g.add("extraer_facturas", self._etapa_extraer_facturas)
+        g.add("extraer_bancos", self._etapa_extraer_bancos)
+        g.add("extraer_clientes", self._etapa_extraer_clientes)
+
+        g.add("cargar_facturas", self._etapa_cargar_facturas, deps=["extraer_facturas"], recursos=BD)
+        g.add("cargar_bancos", self._etapa_cargar_bancos, deps=["extraer_bancos"], recursos=BD)
+        g.add("cargar_clientes", self._etapa_cargar_clientes, deps=["extraer_clientes"], recursos=BD)
+
+        g.add("matching", self._etapa_matching, deps=["cargar_facturas", "cargar_bancos"], recursos=BD)
+
+        r = g.run()
+        df_match, df_det = r["matching"]
+
+        return {
+            "facturas_nuevas": r["cargar_facturas"],
+            "bancos_nuevos": r["cargar_bancos"],
+            "clientes_nuevos": r["cargar_clientes"],
+            "matches": df_match,
+            "detalles": df_det
+        }
+
+    # --------------------------------------------------------
+    #  ETAPAS DEL GRAFO
+    # --------------------------------------------------------
+    def _etapa_extraer_facturas(self, _) -> list[dict]:
+        return InvoicesExtractor(checkpoints=self.checkpoints).run()
+
+    def _etapa_extraer_bancos(self, _) -> tuple:
+        bank_ex = BankExtractor(checkpoints=self.checkpoints)
+        origen = [bank_ex.tabla_unica] if bank_ex.tabla_unica else list(bank_ex.tablas_bancos.values())
+        return bank_ex.run(), origen
+
+    def _etapa_extraer_clientes(self, _) -> list[dict]:
+        return ClientsExtractor(checkpoints=self.checkpoints).run()
+
+    def _etapa_cargar_facturas(self, e) -> list[dict]:
+        return self._cargar(
+            "Facturas", "facturas_pf", e["extraer_facturas"], InvoiceWriter(),
+            [self.cfg.tablas.get("facturas")],
+        )
+
+    def _etapa_cargar_bancos(self, e) -> list[dict]:
+        movimientos, origen = e["extraer_bancos"]
+        return self._cargar("Movimientos", "bancos_pf", movimientos, BankWriter(), origen)
+
+    def _etapa_cargar_clientes(self, e) -> list[dict]:
+        return self._cargar(
+            "Clientes", "clientes_pf", e["extraer_clientes"], ClientsWriter(),
+            [self.cfg.tablas.get("clientes")],
+        )
+
+    # -----------------------------
+    # MATCHING SOLO SOBRE LO NUEVO
+    # -----------------------------
+    def _etapa_matching(self, e) -> tuple:
         info("Ejecutando matching incremental…")
 
+        nuevas_fact = e["cargar_facturas"]
+        nuevas_bank = e["cargar_bancos"]
+
         df_match = pd.DataFrame()
         df_det = pd.DataFrame()
 
         if nuevas_fact or nuevas_bank:
-            matcher = MatcherEngine()
-
-            # matching incremental = match SOLO nuevos con TODO el banco
-            df_match, df_det = matcher.run(
-                pd.DataFrame(nuevas_fact),
-                pd.concat([df_bank], ignore_index=True)
+            # Facturas nuevas con su id de destino + cálculos financieros
+            df_fact = self._read_by_hash(
+                "facturas_pf", [f["source_hash"] for f in nuevas_fact]
             )
 
+            if not df_fact.empty:
+                calc = Calculator(self.cfg)
+                calc.save_calculos(calc.process_facturas(df_fact))
+
+                # matching incremental = match SOLO nuevas con TODO el banco
+                df_bank = pd.read_sql_query("SELECT * FROM bancos_pf", self.conn)
+
+                matcher = MatcherEngine()
+                df_match, df_det = matcher.run(df_fact, df_bank)
+
             ok(f"Matches generados (incremental): {len(df_match)}")
         else:
             warn("No hay datos nuevos. Matching no ejecutado.")
 
-        return {
-            "facturas_nuevas": nuevas_fact,
-            "bancos_nuevos": nuevas_bank,
-            "clientes_nuevos": nuevas_cli,
-            "matches": df_match,
-            "detalles": df_det
-        }
+        return df_match, df_det
 
 
 # ============================================================
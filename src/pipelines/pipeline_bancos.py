@@ -25,20 +25,28 @@ from src.transformers.calculator import Calculator
 # ============================================================
 class PipelineBancos:
 
-    def __init__(self):
+    def __init__(self, ctx=None):
         info("Inicializando PipelineBancos…")
 
         self.cfg = get_config()
         self.db_path = self.cfg.db_pulseforge
         self.calc = Calculator()
 
+        # RunContext opcional: movimientos de FASE 1 en memoria
+        self.ctx = ctx
+
         ok(f"PipelineBancos listo. BD destino → {self.db_path}")
 
     # --------------------------------------------------------
     # LECTURA DIRECTA DESDE BD DESTINO
     # --------------------------------------------------------
     def load_bancos(self) -> pd.DataFrame:
-        """Carga movimientos desde bancos_pf."""
+        """Carga movimientos (RunContext si los trae, si no bancos_pf)."""
+        if self.ctx is not None and self.ctx.has("bancos_pf"):
+            df = self.ctx.get("bancos_pf")
+            ok(f"Movimientos desde memoria: {len(df)}")
+            return df
+
         try:
             conn = sqlite3.connect(self.db_path)
 
@@ -53,6 +61,8 @@ class PipelineBancos:
             else:
                 ok(f"Movimientos cargados: {len(df)}")
 
+            if self.ctx is not None:
+                self.ctx.put("bancos_pf", df)
             return df
 
         except Exception as e:
@@ -25,20 +25,28 @@ from src.transformers.data_mapper import DataMapper
 # ============================================================
 class PipelineClientes:
 
-    def __init__(self):
+    def __init__(self, ctx=None):
         info("Inicializando PipelineClientes…")
 
         self.cfg = get_config()
         self.db_path = self.cfg.db_pulseforge
         self.mapper = DataMapper()
 
+        # RunContext opcional: clientes de FASE 1 en memoria
+        self.ctx = ctx
+
         ok(f"PipelineClientes listo. BD destino → {self.db_path}")
 
     # --------------------------------------------------------
     # LECTURA DESDE BD DESTINO
     # --------------------------------------------------------
     def load_clientes(self) -> pd.DataFrame:
-        """Lee clientes desde clientes_pf (tabla destino RAW)."""
+        """Lee clientes (RunContext si los trae, si no clientes_pf RAW)."""
+        if self.ctx is not None and self.ctx.has("clientes_pf"):
+            df = self.ctx.get("clientes_pf")
+            ok(f"Clientes desde memoria: {len(df)}")
+            return df
+
         try:
             conn = sqlite3.connect(self.db_path)
 
@@ -25,18 +25,26 @@ from src.transformers.calculator import Calculator
 # ============================================================
 class PipelineFacturas:
 
-    def __init__(self):
+    def __init__(self, ctx=None):
         info("Inicializando PipelineFacturas…")
         self.cfg = get_config()
         self.db_path = self.cfg.db_pulseforge
         self.calc = Calculator()
+
+        # RunContext opcional: frames de FASE 1 en memoria + escritura en segundo plano
+        self.ctx = ctx
         ok(f"PipelineFacturas listo. BD destino → {self.db_path}")
 
     # --------------------------------------------------------
     # LECTURA DIRECTA DESDE BD DESTINO
     # --------------------------------------------------------
     def load_facturas(self) -> pd.DataFrame:
-        """Carga las facturas crudas desde facturas_pf."""
+        """Carga las facturas crudas (RunContext si las trae, si no facturas_pf)."""
+        if self.ctx is not None and self.ctx.has("facturas_pf"):
+            df = self.ctx.get("facturas_pf")
+            ok(f"Facturas desde memoria: {len(df)}")
+            return df
+
         try:
             conn = sqlite3.connect(self.db_path)
             df = pd.read_sql_query("SELECT * FROM facturas_pf;", conn)
@@ -47,6 +55,8 @@ class PipelineFacturas:
             else:
                 ok(f"Facturas cargadas: {len(df)}")
 
+            if self.ctx is not None:
+                self.ctx.put("facturas_pf", df)
             return df
 
         except Exception as e:
@@ -72,14 +82,34 @@ class PipelineFacturas:
         # ====================================================
         # NUEVO: Guardar cálculos en calculos_pf
         # ====================================================
+        if self.ctx is not None:
+            self.ctx.write("calculos_pf", self._save_calculos, df_calc)
+            self.ctx.put("facturas_match", self._match_frame(df, df_calc))
+        else:
+            self._save_calculos(df_calc)
+
+        ok("Facturas procesadas correctamente.")
+        return df_calc
+
+    def _save_calculos(self, df_calc: pd.DataFrame):
         try:
             self.calc.save_calculos(df_calc)
             ok("Cálculos financieros persistidos correctamente.")
         except Exception as e:
             error(f"Error guardando cálculos financieros: {e}")
 
-        ok("Facturas procesadas correctamente.")
-        return df_calc
+    @staticmethod
+    def _match_frame(df: pd.DataFrame, df_calc: pd.DataFrame) -> pd.DataFrame:
+        """
+        Lo mismo que relee PipelineMatcher: facturas_pf sincronizada por
+        save_calculos (igv, total) + total_final / detraccion de calculos_pf.
+        """
+        out = df.copy()
+        out["igv"] = df_calc["igv"].to_numpy()
+        out["total"] = df_calc["total_con_igv"].to_numpy()
+        out["total_final"] = None
+        out["detraccion"] = df_calc["detraccion_monto"].to_numpy()
+        return out
 
     # --------------------------------------------------------
     # GUARDADO OPCIONAL EN TABLA AUXILIAR (no se usa en FULL)
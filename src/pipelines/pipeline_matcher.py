@@ -21,6 +21,8 @@ from src.core.env_loader import get_config
 from src.core.db import PulseForgeDB
 
 from src.matchers.matcher_engine import MatcherEngine
+from src.matchers.candidates import RTreeCandidates, CandidatesError
+from src.matchers.ledger import LedgerStore
 from src.loaders.match_writer import MatchWriter
 
 
@@ -29,7 +31,7 @@ from src.loaders.match_writer import MatchWriter
 # ============================================================
 class PipelineMatcher:
 
-    def __init__(self):
+    def __init__(self, progreso=None, ctx=None):
         info("Inicializando PipelineMatcher…")
 
         self.cfg = get_config()
@@ -37,13 +39,40 @@ class PipelineMatcher:
         self.writer = MatchWriter()
         self.engine = MatcherEngine()
 
+        # MatchProgress opcional (full --resume): posición cada N facturas
+        self.progreso = progreso
+
+        # RunContext opcional: facturas/bancos de FASE 2 en memoria
+        self.ctx = ctx
+
+        # Candidatos desde disco (R*Tree) en vez de cargar bancos_pf entera
+        self.candidatos = None
+        if self.cfg.matching.match_candidatos == "rtree":
+            try:
+                self.candidatos = RTreeCandidates(self.engine.monto_var, *self.engine.calc.rango_tipo_cambio())
+            except CandidatesError as e:
+                warn(f"R*Tree no disponible ({e}) → candidatos en memoria.")
+
         ok(f"PipelineMatcher listo. BD → {self.cfg.db_destino}")
 
     # --------------------------------------------------------
     # CARGA DE DATOS DESDE BD
     # --------------------------------------------------------
     def _load_data(self):
-        """Carga facturas + cálculos y bancos desde la BD PulseForge."""
+        """Carga facturas + cálculos y bancos (RunContext o BD PulseForge)."""
+        if (
+            self.ctx is not None
+            and self.ctx.has("facturas_match")
+            and self.ctx.has("bancos_pf")
+        ):
+            # Solo se leen los id asignados por SQLite (tras vaciar la cola de escritura)
+            df_fact = self.ctx.with_ids(self.ctx.get("facturas_match"), "facturas_pf")
+            df_bank = self.ctx.with_ids(self.ctx.get("bancos_pf"), "bancos_pf")
+
+            ok(f"Facturas desde memoria: {len(df_fact)}")
+            ok(f"Movimientos desde memoria: {len(df_bank)}")
+            return df_fact, df_bank
+
         try:
             conn = self.db.connect()
 
@@ -57,9 +86,20 @@ class PipelineMatcher:
                     ON f.source_hash = c.factura_hash
             """, conn)
 
-            df_bank = pd.read_sql_query(
-                "SELECT * FROM bancos_pf", conn
-            )
+            if self.candidatos is not None:
+                # Los movimientos se leen por bloques desde el R*Tree
+                df_bank = pd.DataFrame()
+                ok(f"Facturas cargadas: {len(df_fact)}")
+                ok("Movimientos: candidatos desde R*Tree (sin carga completa)")
+                return df_fact, df_bank
+
+            if self.cfg.matching.match_indice_disco:
+                # Índice persistido: solo se preparan los movimientos nuevos
+                df_bank = LedgerStore(self.engine).cargar(conn)
+            else:
+                df_bank = pd.read_sql_query(
+                    "SELECT * FROM bancos_pf", conn
+                )
 
             ok(f"Facturas cargadas: {len(df_fact)}")
             ok(f"Movimientos cargados: {len(df_bank)}")
@@ -94,74 +134,44 @@ class PipelineMatcher:
 
         df_fact, df_bank = self._load_data()
 
-        if df_fact.empty or df_bank.empty:
+        # Con bancos ya en memoria (RunContext) no hace falta el R*Tree
+        proveedor = self.candidatos if len(df_bank) == 0 else None
+
+        if df_fact.empty or (len(df_bank) == 0 and proveedor is None):
             warn("No hay data suficiente para ejecutar matching.")
             return {}
 
         info("Ejecutando motor MatcherEngine…")
-        df_match, df_detalles = self.engine.run(df_fact, df_bank)
+        try:
+            df_match, df_detalles = self.engine.run(
+                df_fact, df_bank, progreso=self.progreso, proveedor=proveedor
+            )
+        finally:
+            if self.candidatos is not None:
+                self.candidatos.close()
 
         ok(f"Matches generados: {len(df_match)}")
         ok(f"Detalles generados: {len(df_detalles)}")
 
-        # ----------------------------------------------------
-        # GUARDAR MATCHES
-        # ----------------------------------------------------
-        if not df_match.empty:
-            self.writer.save_many(df_match.to_dict("records"))
-        else:
+        if df_match.empty:
             warn("No se generaron matches válidos.")
 
         # ----------------------------------------------------
-        # MARCAR FACTURAS COBRADAS (🔥 CAMBIO CLAVE 🔥)
+        # MATCHES + FACTURAS COBRADAS + DETALLES (una transacción)
         # ----------------------------------------------------
-        try:
-            conn = self.db.connect()
-
-            df_ok = df_match[df_match["match_tipo"] == "MATCH"]
-
-            for _, row in df_ok.iterrows():
-                factura_id = row.get("factura_id")
-                if not factura_id:
-                    continue
-
-                conn.execute(
-                    """
-                    UPDATE facturas_pf
-                    SET fue_cobrado = 1,
-                        match_id = ?
-                    WHERE id = ?
-                    """,
-                    (row.get("factura_hash"), factura_id)
-                )
-
-            conn.commit()
-            ok(f"Facturas marcadas como cobradas: {len(df_ok)}")
-
-        except Exception as e:
-            warn(f"No se pudieron actualizar facturas cobradas: {e}")
-
-        # ----------------------------------------------------
-        # GUARDAR DETALLES TEMPORALES
-        # ----------------------------------------------------
-        if not df_detalles.empty:
-            try:
-                df_detalles.to_sql(
-                    "match_detalles_tmp",
-                    self.db.connect(),
-                    if_exists="replace",
-                    index=False
-                )
-                ok("Detalles guardados en match_detalles_tmp.")
-            except Exception as e:
-                warn(f"No se pudieron guardar detalles: {e}")
+        run_id = self.writer.save_run(df_match, df_detalles)
 
         # Auditoría
-        self._audit("MATCH_RUN", f"Matches generados: {len(df_match)}")
+        self._audit("MATCH_RUN", f"Corrida {run_id} · matches generados: {len(df_match)}")
+
+        # Resultado ya persistido → el progreso parcial deja de servir
+        if self.progreso is not None:
+            self.progreso.clear()
 
         ok("=== PIPELINE MATCHER COMPLETADO ===")
 
         return {
+            "run_id": run_id,
             "matches": df_match,
             "detalles": df_detalles
         }
@@ -0,0 +1,144 @@
+# src/pipelines/run_context.py
+from __future__ import annotations
+import sys
+import sqlite3
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+# ------------------------------------------------------------
+# Bootstrap rutas
+# ------------------------------------------------------------
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------------
+# Imports corporativos
+# ------------------------------------------------------------
+from src.core.logger import info, ok, warn, error
+from src.core.env_loader import get_config
+
+
+# ============================================================
+#  EXCEPCIÓN
+# ============================================================
+class RunContextError(Exception):
+    pass
+
+
+def frame_from_rows(columnas: Sequence[str], rows: List[tuple]) -> pd.DataFrame:
+    """
+    DataFrame equivalente a lo que deja un INSERT OR REPLACE de `rows`:
+    por source_hash gana la última fila (mismo orden que los ids asignados).
+    """
+    df = pd.DataFrame.from_records(rows, columns=list(columnas))
+    if "source_hash" in df.columns:
+        df = df.drop_duplicates(subset="source_hash", keep="last").reset_index(drop=True)
+    return df
+
+
+# ============================================================
+#  CONTEXTO DE CORRIDA · TRASPASO EN MEMORIA ENTRE FASES
+# ============================================================
+class RunContext:
+    """
+    DataFrames de cada fase disponibles para la siguiente sin releer SQLite.
+
+    - put/get: frames por nombre (p.ej. "facturas_pf", "facturas_match")
+    - write: encola una escritura en el único hilo escritor (durabilidad
+      en segundo plano, en orden de llegada → SQLite sin contención)
+    - flush: espera las escrituras pendientes y propaga el primer error
+    - with_ids: adjunta los id autoincrementales de la BD a un frame
+
+    Si una etapa corre sola (sin contexto o sin el frame), los pipelines
+    releen la BD destino como siempre.
+    """
+
+    def __init__(self):
+        self.db_path = get_config().db_pulseforge
+        self.frames: Dict[str, pd.DataFrame] = {}
+        self._lock = threading.Lock()
+        self._escritor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ctx-writer")
+        self._pendientes: List[Tuple[str, Future]] = []
+
+    # --------------------------------------------------------
+    # Frames en memoria
+    # --------------------------------------------------------
+    def put(self, nombre: str, df: pd.DataFrame):
+        with self._lock:
+            self.frames[nombre] = df
+        info(f"[RunContext] '{nombre}' en memoria ({len(df)} filas)")
+
+    def get(self, nombre: str) -> Optional[pd.DataFrame]:
+        with self._lock:
+            df = self.frames.get(nombre)
+        return None if df is None else df.copy()
+
+    def has(self, nombre: str) -> bool:
+        with self._lock:
+            return nombre in self.frames
+
+    # --------------------------------------------------------
+    # Escritura en segundo plano (un solo hilo)
+    # --------------------------------------------------------
+    def write(self, nombre: str, fn: Callable[..., Any], *args, **kwargs) -> Future:
+        fut = self._escritor.submit(fn, *args, **kwargs)
+        with self._lock:
+            self._pendientes.append((nombre, fut))
+        return fut
+
+    def flush(self):
+        with self._lock:
+            pendientes, self._pendientes = self._pendientes, []
+
+        if not pendientes:
+            return
+
+        info(f"[RunContext] Esperando {len(pendientes)} escrituras en segundo plano…")
+        fallos = []
+        for nombre, fut in pendientes:
+            try:
+                fut.result()
+            except Exception as e:
+                fallos.append(f"{nombre}: {e}")
+
+        if fallos:
+            for f in fallos:
+                error(f"[RunContext] ❌ {f}")
+            raise RunContextError(f"Escrituras en segundo plano fallidas → {fallos[0]}")
+        ok(f"[RunContext] ✔ {len(pendientes)} escrituras confirmadas en BD.")
+
+    def close(self):
+        """Vacía la cola sin tapar el error de la corrida (si lo hubo)."""
+        try:
+            self.flush()
+        except RunContextError as e:
+            error(f"[RunContext] {e}")
+        finally:
+            self._escritor.shutdown(wait=True)
+
+    # --------------------------------------------------------
+    # Ids autoincrementales (lectura estrecha: id + source_hash)
+    # --------------------------------------------------------
+    def with_ids(self, df: pd.DataFrame, tabla: str) -> pd.DataFrame:
+        self.flush()
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            ids = pd.read_sql_query(f"SELECT id, source_hash FROM {tabla}", conn)
+        finally:
+            conn.close()
+
+        df = df.drop(columns=["id"], errors="ignore").merge(ids, on="source_hash", how="left")
+        sin_id = int(df["id"].isna().sum())
+        if sin_id:
+            warn(f"[RunContext] {tabla}: {sin_id} filas sin id en BD → se descartan.")
+            df = df.dropna(subset=["id"])
+
+        df["id"] = df["id"].astype("int64")
+        columnas = ["id"] + [c for c in df.columns if c != "id"]
+        return df[columnas].sort_values("id").reset_index(drop=True)
@@ -0,0 +1,320 @@
+# src/pipelines/stage_graph.py
+from __future__ import annotations
+import sys
+import time
+import pickle
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# ------------------------------------------------------------
+# Bootstrap rutas
+# ------------------------------------------------------------
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------------
+# Imports corporativos
+# ------------------------------------------------------------
+from src.core.logger import info, ok, warn, error
+from src.core.env_loader import get_config
+from src.loaders.stage_store import StageStore, huella
+
+
+# ============================================================
+#  EXCEPCIÓN
+# ============================================================
+class StageGraphError(Exception):
+    pass
+
+
+# ============================================================
+#  ETAPA
+# ============================================================
+@dataclass
+class Stage:
+    nombre: str
+    fn: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    modo: str = "thread"              # "thread" | "process"
+    recursos: Tuple[str, ...] = ()    # locks compartidos (p.ej. "bd_destino")
+    durable: bool = False             # su efecto queda en BD → reanudable sin re-ejecutar
+    entrada: Any = None               # huella de entradas externas (BD origen, motor…)
+    saltada: bool = False             # completada en una corrida previa (--resume)
+
+    # Métricas (segundos desde el inicio del grafo)
+    inicio: Optional[float] = None
+    fin: Optional[float] = None
+    espera: float = 0.0               # tiempo esperando recursos
+
+    @property
+    def duracion(self) -> float:
+        if self.inicio is None or self.fin is None:
+            return 0.0
+        return self.fin - self.inicio
+
+
+# ============================================================
+#  GRAFO DE ETAPAS (DAG) · EJECUCIÓN CONCURRENTE
+# ============================================================
+class StageGraph:
+    """
+    Ejecutor mínimo de etapas con dependencias declaradas.
+
+    - Cada etapa recibe un dict {dependencia: resultado} y devuelve su resultado
+    - Ramas independientes corren en paralelo (hilos; "process" → ProcessPoolExecutor,
+      la función y sus entradas deben ser picklables)
+    - `recursos` serializa etapas que comparten algo no concurrente
+      (escrituras SQLite sobre la BD destino)
+    - Reporta tiempos por etapa y la ruta crítica
+    - Con `store` registra cada etapa completada; con `resume=True` salta
+      las que ya completó una corrida previa con la misma huella
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        workers: Optional[int] = None,
+        store: Optional[StageStore] = None,
+        resume: bool = False,
+    ):
+        cfg = get_config()
+        self.nombre = nombre
+        self.workers = max(1, int(workers or cfg.etl.dag_workers))
+        self.procesos: set = set(cfg.etl.dag_procesos or [])
+        self.store = store
+        self.resume = resume and store is not None
+        self.huellas: Dict[str, str] = {}
+
+        self.stages: Dict[str, Stage] = {}
+        self.resultados: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self.wall: float = 0.0
+
+    # --------------------------------------------------------
+    # Declaración
+    # --------------------------------------------------------
+    def add(
+        self,
+        nombre: str,
+        fn: Callable[[Dict[str, Any]], Any],
+        deps: Tuple[str, ...] | List[str] = (),
+        modo: str = "thread",
+        recursos: Tuple[str, ...] | List[str] = (),
+        durable: bool = False,
+        entrada: Any = None,
+    ) -> "StageGraph":
+        if nombre in self.stages:
+            raise StageGraphError(f"Etapa duplicada: {nombre}")
+
+        # settings.json → etl.dag_procesos fuerza etapas a procesos
+        if nombre in self.procesos:
+            modo = "process"
+
+        if modo == "process":
+            try:
+                pickle.dumps(fn)
+            except Exception:
+                warn(f"[{self.nombre}] Etapa '{nombre}' no es picklable → se ejecuta en hilo.")
+                modo = "thread"
+
+        self.stages[nombre] = Stage(
+            nombre, fn, tuple(deps), modo, tuple(recursos), durable, entrada
+        )
+        for r in recursos:
+            self._locks.setdefault(r, threading.Lock())
+        return self
+
+    def _orden_topologico(self) -> List[str]:
+        for st in self.stages.values():
+            faltantes = [d for d in st.deps if d not in self.stages]
+            if faltantes:
+                raise StageGraphError(f"[{st.nombre}] dependencias inexistentes: {faltantes}")
+
+        orden: List[str] = []
+        grados = {n: len(st.deps) for n, st in self.stages.items()}
+        listos = [n for n, g in grados.items() if g == 0]
+
+        while listos:
+            n = listos.pop(0)
+            orden.append(n)
+            for m, st in self.stages.items():
+                if n in st.deps:
+                    grados[m] -= 1
+                    if grados[m] == 0:
+                        listos.append(m)
+
+        if len(orden) != len(self.stages):
+            ciclo = [n for n in self.stages if n not in orden]
+            raise StageGraphError(f"Ciclo de dependencias entre: {ciclo}")
+        return orden
+
+    # --------------------------------------------------------
+    # Reanudación: huellas + etapas que se pueden saltar
+    # --------------------------------------------------------
+    def _calcular_huellas(self, orden: List[str]):
+        for n in orden:
+            st = self.stages[n]
+            self.huellas[n] = huella(
+                self.nombre, n, st.entrada, [self.huellas[d] for d in st.deps]
+            )
+
+    def _saltables(self, orden: List[str]) -> Dict[str, Any]:
+        """
+        Una etapa completada (misma huella) se salta si su efecto es durable
+        o si todas las etapas que consumen su resultado también se saltan.
+        Una etapa no durable sin consumidores nunca se salta: su resultado
+        solo vive en memoria y es lo que recibe quien ejecuta el grafo.
+        """
+        previas = self.store.completadas()
+        saltables: Dict[str, Any] = {}
+
+        for n in reversed(orden):
+            previa = previas.get(n)
+            if not previa or previa[0] != self.huellas[n]:
+                continue
+            consumidores = [m for m, st in self.stages.items() if n in st.deps]
+            if self.stages[n].durable or (consumidores and all(m in saltables for m in consumidores)):
+                saltables[n] = previa[1]
+
+        return saltables
+
+    # --------------------------------------------------------
+    # Ejecución de UNA etapa (siempre en un hilo del pool)
+    # --------------------------------------------------------
+    def _ejecutar(self, st: Stage, entradas: Dict[str, Any], t0: float,
+                  pool_proc: Optional[ProcessPoolExecutor]) -> Any:
+        locks = [self._locks[r] for r in sorted(st.recursos)]
+
+        t_espera = time.perf_counter()
+        for lk in locks:
+            lk.acquire()
+        try:
+            st.espera = time.perf_counter() - t_espera
+            st.inicio = time.perf_counter() - t0
+            info(f"[{self.nombre}] ▶ {st.nombre}")
+
+            if st.modo == "process" and pool_proc is not None:
+                return pool_proc.submit(st.fn, entradas).result()
+            return st.fn(entradas)
+        finally:
+            st.fin = time.perf_counter() - t0
+            for lk in reversed(locks):
+                lk.release()
+
+    # --------------------------------------------------------
+    # Ejecución del grafo
+    # --------------------------------------------------------
+    def run(self) -> Dict[str, Any]:
+        orden = self._orden_topologico()
+        info(f"=== GRAFO {self.nombre} · {len(orden)} etapas · {self.workers} workers ===")
+
+        pendientes = list(orden)
+        if self.store is not None:
+            self._calcular_huellas(orden)
+            if self.resume:
+                for n, salida in self._saltables(orden).items():
+                    self.stages[n].saltada = True
+                    self.resultados[n] = salida
+                    pendientes.remove(n)
+                    info(f"[{self.nombre}] ⏭ {n} (completada en corrida previa)")
+            else:
+                self.store.reset()
+
+        hay_procesos = any(st.modo == "process" for st in self.stages.values())
+        pool_proc = ProcessPoolExecutor(max_workers=self.workers) if hay_procesos else None
+
+        t0 = time.perf_counter()
+        en_curso: Dict[Any, str] = {}
+        fallo: Optional[Tuple[str, BaseException]] = None
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers,
+                                    thread_name_prefix=f"dag-{self.nombre}") as hilos:
+                while pendientes or en_curso:
+
+                    # Lanzar todo lo que ya tiene sus dependencias resueltas
+                    if fallo is None:
+                        for n in list(pendientes):
+                            st = self.stages[n]
+                            if all(d in self.resultados for d in st.deps):
+                                entradas = {d: self.resultados[d] for d in st.deps}
+                                fut = hilos.submit(self._ejecutar, st, entradas, t0, pool_proc)
+                                en_curso[fut] = n
+                                pendientes.remove(n)
+                    else:
+                        pendientes.clear()
+
+                    if not en_curso:
+                        break
+
+                    hechos, _ = wait(list(en_curso), return_when=FIRST_COMPLETED)
+                    for fut in hechos:
+                        n = en_curso.pop(fut)
+                        try:
+                            self.resultados[n] = fut.result()
+                            ok(f"[{self.nombre}] ✔ {n} ({self.stages[n].duracion:.2f}s)")
+                            if self.store is not None:
+                                st = self.stages[n]
+                                salida = self.resultados[n] if st.durable else None
+                                self.store.record(n, self.huellas[n], salida, st.duracion)
+                        except Exception as e:
+                            error(f"[{self.nombre}] ❌ {n} → {e}")
+                            if fallo is None:
+                                fallo = (n, e)
+        finally:
+            if pool_proc is not None:
+                pool_proc.shutdown()
+
+        self.wall = time.perf_counter() - t0
+        self.report()
+
+        if fallo is not None:
+            raise StageGraphError(f"Etapa '{fallo[0]}' falló: {fallo[1]}") from fallo[1]
+
+        return self.resultados
+
+    # --------------------------------------------------------
+    # Métricas: tiempos + ruta crítica
+    # --------------------------------------------------------
+    def critical_path(self) -> Tuple[List[str], float]:
+        acumulado: Dict[str, float] = {}
+        previo: Dict[str, Optional[str]] = {}
+
+        for n in self._orden_topologico():
+            st = self.stages[n]
+            mejor = max(st.deps, key=lambda d: acumulado.get(d, 0.0), default=None)
+            acumulado[n] = st.duracion + (acumulado.get(mejor, 0.0) if mejor else 0.0)
+            previo[n] = mejor
+
+        if not acumulado:
+            return [], 0.0
+
+        fin = max(acumulado, key=acumulado.get)
+        ruta = [fin]
+        while previo[ruta[-1]]:
+            ruta.append(previo[ruta[-1]])
+        return list(reversed(ruta)), acumulado[fin]
+
+    def report(self):
+        ejecutadas = [st for st in self.stages.values() if st.inicio is not None]
+        if not ejecutadas:
+            return
+
+        saltadas = [st.nombre for st in self.stages.values() if st.saltada]
+        if saltadas:
+            info(f"⏭ Reanudadas (sin re-ejecutar): {', '.join(saltadas)}")
+
+        info(f"⏱ Etapas {self.nombre}:")
+        for st in sorted(ejecutadas, key=lambda s: s.inicio):
+            extra = f" · espera recursos {st.espera:.2f}s" if st.espera >= 0.01 else ""
+            info(f"   - {st.nombre:<20} {st.inicio:7.2f}s → {st.fin:7.2f}s  "
+                 f"({st.duracion:.2f}s, {st.modo}){extra}")
+
+        ruta, total = self.critical_path()
+        suma = sum(st.duracion for st in ejecutadas)
+        info(f"⏱ Ruta crítica: {' → '.join(ruta)} = {total:.2f}s")
+        ok(f"⏱ {self.nombre}: pared {self.wall:.2f}s vs secuencial {suma:.2f}s")
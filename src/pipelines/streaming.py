@@ -0,0 +1,195 @@
+# src/pipelines/streaming.py
+from __future__ import annotations
+import sys
+import time
+import queue
+import threading
+from pathlib import Path
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+# ------------------------------------------------------------
+# Bootstrap rutas
+# ------------------------------------------------------------
+ROOT = Path(__file__).resolve().parents[2]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# ------------------------------------------------------------
+# Imports corporativos
+# ------------------------------------------------------------
+from src.core.logger import info, ok, error
+from src.core.env_loader import get_config
+
+
+# ============================================================
+#  EXCEPCIÓN
+# ============================================================
+class StreamError(Exception):
+    pass
+
+
+_FIN = object()  # centinela de fin de flujo
+
+
+@dataclass
+class _Tramo:
+    nombre: str
+    ocupado: float = 0.0   # segundos trabajando (sin contar esperas en colas)
+    bloques: int = 0
+
+
+# ============================================================
+#  PIPELINE LECTOR → TRANSFORMADOR → ESCRITOR (COLAS ACOTADAS)
+# ============================================================
+class StreamPipeline:
+    """
+    Tres hilos conectados por colas acotadas:
+
+        leer()          → bloques crudos (lectura SQLite por bloques)
+        transformar(b)  → filas listas (normalización + hash)
+        escribir(f)     → INSERT masivo (una transacción por bloque)
+
+    La cola llena frena al productor (backpressure) → memoria acotada a
+    ~2 × cola bloques en vuelo. El rendimiento tiende al tramo más lento,
+    no a la suma de los tres. Un error en cualquier tramo detiene el resto.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        leer: Callable[[], Iterable[Any]],
+        transformar: Callable[[Any], List[Any]],
+        escribir: Callable[[List[Any]], Optional[int]],
+        cola: Optional[int] = None,
+    ):
+        self.nombre = nombre
+        self.leer = leer
+        self.transformar = transformar
+        self.escribir = escribir
+
+        tam = max(1, int(cola or get_config().etl.stream_cola))
+        self._q_crudo: queue.Queue = queue.Queue(maxsize=tam)
+        self._q_listo: queue.Queue = queue.Queue(maxsize=tam)
+
+        self._parar = threading.Event()
+        self._errores: List[BaseException] = []
+        self.tramos = {n: _Tramo(n) for n in ("lectura", "transformacion", "escritura")}
+        self.filas = 0
+
+    # --------------------------------------------------------
+    # Colas con corte (no bloquear para siempre si otro tramo falló)
+    # --------------------------------------------------------
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self._parar.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self._parar.is_set():
+            try:
+                return q.get(timeout=0.2)
+            except queue.Empty:
+                continue
+        return _FIN
+
+    def _fallo(self, tramo: str, e: BaseException):
+        error(f"[{self.nombre}] ❌ Tramo {tramo} → {e}")
+        self._errores.append(e)
+        self._parar.set()
+
+    # --------------------------------------------------------
+    # Tramos
+    # --------------------------------------------------------
+    def _lector(self):
+        t = self.tramos["lectura"]
+        it = None
+        try:
+            it = iter(self.leer())
+            while True:
+                t0 = time.perf_counter()
+                bloque = next(it, _FIN)
+                t.ocupado += time.perf_counter() - t0
+                if bloque is _FIN or not self._put(self._q_crudo, bloque):
+                    break
+                t.bloques += 1
+        except Exception as e:
+            self._fallo("lectura", e)
+        finally:
+            if hasattr(it, "close"):
+                it.close()  # generador → libera su conexión a la BD origen
+            self._put(self._q_crudo, _FIN)
+
+    def _transformador(self):
+        t = self.tramos["transformacion"]
+        try:
+            while True:
+                bloque = self._get(self._q_crudo)
+                if bloque is _FIN:
+                    break
+                t0 = time.perf_counter()
+                filas = self.transformar(bloque)
+                t.ocupado += time.perf_counter() - t0
+                t.bloques += 1
+                if filas and not self._put(self._q_listo, filas):
+                    break
+        except Exception as e:
+            self._fallo("transformacion", e)
+        finally:
+            self._put(self._q_listo, _FIN)
+
+    def _escritor(self):
+        t = self.tramos["escritura"]
+        try:
+            while True:
+                filas = self._get(self._q_listo)
+                if filas is _FIN:
+                    break
+                t0 = time.perf_counter()
+                n = self.escribir(filas)
+                t.ocupado += time.perf_counter() - t0
+                if n is None:
+                    raise StreamError("el writer no confirmó el bloque")
+                t.bloques += 1
+                self.filas += n
+        except Exception as e:
+            self._fallo("escritura", e)
+
+    # --------------------------------------------------------
+    # Ejecución
+    # --------------------------------------------------------
+    def run(self) -> int:
+        info(f"=== STREAM {self.nombre} · cola {self._q_crudo.maxsize} bloques ===")
+        t0 = time.perf_counter()
+
+        hilos = [
+            threading.Thread(target=fn, name=f"stream-{self.nombre}-{n}", daemon=True)
+            for n, fn in (("lector", self._lector),
+                          ("transformador", self._transformador),
+                          ("escritor", self._escritor))
+        ]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        pared = time.perf_counter() - t0
+        self.report(pared)
+
+        if self._errores:
+            raise StreamError(f"Stream '{self.nombre}' falló: {self._errores[0]}") from self._errores[0]
+
+        return self.filas
+
+    def report(self, pared: float):
+        for t in self.tramos.values():
+            info(f"   - {t.nombre:<15} {t.ocupado:7.2f}s ocupado · {t.bloques} bloques")
+
+        cuello = max(self.tramos.values(), key=lambda t: t.ocupado)
+        suma = sum(t.ocupado for t in self.tramos.values())
+        ok(f"⏱ {self.nombre}: {self.filas} filas · pared {pared:.2f}s vs suma {suma:.2f}s "
+           f"(cuello de botella: {cuello.nombre})")
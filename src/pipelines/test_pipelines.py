@@ -1,6 +1,9 @@
 #  src/pipelines/test_pipelines.py
 from __future__ import annotations
+import os
 import sys
+import tempfile
+from contextlib import contextmanager
 from pathlib import Path
 import pandas as pd
 
@@ -21,6 +24,8 @@ from src.core.env_loader import get_config
 from src.pipelines.pipeline_facturas import PipelineFacturas
 from src.pipelines.pipeline_bancos import PipelineBancos
 from src.pipelines.pipeline_clients import PipelineClientes
+from src.pipelines.stage_graph import StageGraph, StageGraphError
+from src.loaders.stage_store import StageStore
 
 
 # ============================================================
@@ -77,6 +82,93 @@ def test_clientes():
     return lista
 
 
+# ============================================================
+#   TEST STAGE GRAPH · REANUDACIÓN (--resume)
+# ============================================================
+@contextmanager
+def _bd_etapas():
+    """BD destino temporal para StageStore / MatchProgress."""
+    get_config()  # carga el .env antes de tocar PULSEFORGE_NEWDB_PATH
+    previa = os.environ.get("PULSEFORGE_NEWDB_PATH")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PULSEFORGE_NEWDB_PATH"] = str(Path(tmp) / "pf_etapas.sqlite")
+        try:
+            yield
+        finally:
+            if previa is None:
+                os.environ.pop("PULSEFORGE_NEWDB_PATH", None)
+            else:
+                os.environ["PULSEFORGE_NEWDB_PATH"] = previa
+
+
+def _grafo_resume(llamadas: list, resume: bool, origen: str = "v1", falla: bool = False) -> StageGraph:
+    """
+    cargar (durable) → transformar (memoria) → guardar (durable)
+    resumen (memoria, sin consumidores)
+    """
+    def etapa(nombre, fn):
+        def run(e):
+            llamadas.append(nombre)
+            return fn(e)
+        return run
+
+    def guardar(e):
+        if falla:
+            raise RuntimeError("falla simulada")
+        return e["transformar"] * 10
+
+    g = StageGraph("test_resume", workers=1, store=StageStore("test_resume"), resume=resume)
+    g.add("cargar", etapa("cargar", lambda e: 1), durable=True, entrada={"origen": origen})
+    g.add("transformar", etapa("transformar", lambda e: e["cargar"] + 1), deps=["cargar"])
+    g.add("guardar", etapa("guardar", guardar), deps=["transformar"], durable=True)
+    g.add("resumen", etapa("resumen", lambda e: "ok"), entrada={"origen": origen})
+    return g
+
+
+def test_stage_graph_resume():
+    info("=== TEST · STAGE GRAPH --resume ===")
+
+    try:
+        with _bd_etapas():
+            # 1) Corrida completa
+            llamadas = []
+            r = _grafo_resume(llamadas, resume=False).run()
+            assert sorted(llamadas) == ["cargar", "guardar", "resumen", "transformar"], llamadas
+            assert r["guardar"] == 20
+
+            # 2) --resume sin cambios: se salta todo salvo la hoja en memoria
+            llamadas = []
+            r = _grafo_resume(llamadas, resume=True).run()
+            assert llamadas == ["resumen"], llamadas
+            assert r["guardar"] == 20 and r["resumen"] == "ok", r
+            ok("Resume sin cambios → etapas saltadas; la hoja en memoria se recalcula.")
+
+            # 3) Falla en 'guardar' → al reanudar solo se re-ejecuta lo necesario
+            try:
+                _grafo_resume([], resume=False, falla=True).run()
+            except StageGraphError:
+                pass
+            else:
+                raise AssertionError("La etapa 'guardar' debía fallar")
+
+            llamadas = []
+            r = _grafo_resume(llamadas, resume=True).run()
+            assert sorted(llamadas) == ["guardar", "resumen", "transformar"], llamadas
+            assert r["guardar"] == 20
+            ok("Resume tras falla → 'cargar' (durable) saltada; 'transformar' y 'guardar' re-ejecutadas.")
+
+            # 4) Cambió la huella del origen → nada se salta
+            llamadas = []
+            _grafo_resume(llamadas, resume=True, origen="v2").run()
+            assert sorted(llamadas) == ["cargar", "guardar", "resumen", "transformar"], llamadas
+            ok("Huella de origen distinta → grafo completo re-ejecutado.")
+
+    except Exception as e:
+        error(f"ERROR en test_stage_graph_resume: {e}")
+        raise
+
+
 # ============================================================
 # EJECUCIÓN DIRECTA DEL TEST SUITE
 # ============================================================
@@ -86,5 +178,6 @@ if __name__ == "__main__":
     df_f = test_facturas()
     df_b = test_bancos()
     df_c = test_clientes()
+    test_stage_graph_resume()
 
     ok("=== TEST PIPELINES COMPLETADO ===")
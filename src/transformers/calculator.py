@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import sys
+import hashlib
 from pathlib import Path
 from datetime import timedelta
 import pandas as pd
@@ -22,6 +23,8 @@ if str(ROOT_DIR) not in sys.path:
 from src.core.logger import info, ok, warn, error
 from src.core.env_loader import get_config, PulseForgeConfig
 from src.core.validations import validate_igv, validate_detraccion, validate_tipo_cambio
+from src.core.utils import to_cents, from_cents, pct_cents
+from src.loaders.tipo_cambio import convertir as tasa_por_fecha, rango as rango_tasas, serie as serie_tasas
 
 
 # ============================================================
@@ -39,6 +42,9 @@ class Calculator:
         self.detraccion = float(validate_detraccion(self.cfg.parametros.detraccion))
         self.tipo_cambio = float(validate_tipo_cambio(self.cfg.parametros.tipo_cambio_usd_pen))
 
+        # Tipo de cambio por fecha (tipo_cambio_pf desde CSV); sin CSV → fijo
+        self.tc_por_fecha = bool(self.cfg.parametros.tipo_cambio_csv)
+
         # Tolerancia
         self.monto_variacion = float(self.cfg.parametros.monto_variacion)
         self.days_tolerance = int(self.cfg.parametros.dias_tolerancia_pago)
@@ -65,6 +71,8 @@ class Calculator:
             raise ValueError("Falta columna 'subtotal' en facturas_pf")
 
         df["subtotal"] = pd.to_numeric(df["subtotal"], errors="coerce").fillna(0)
+        if "subtotal_cent" not in df.columns:
+            df["subtotal_cent"] = to_cents(df["subtotal"])
 
         df["fecha_emision"] = pd.to_datetime(df.get("fecha_emision"), errors="coerce")
         df["vencimiento"] = pd.to_datetime(df.get("vencimiento"), errors="coerce")
@@ -75,11 +83,14 @@ class Calculator:
 
         df["fecha_pago"] = df["vencimiento"]
 
-        # Cálculo financiero
-        df["igv"] = (df["subtotal"] * self.igv).round(2)
-        df["total_con_igv"] = (df["subtotal"] + df["igv"]).round(2)
-        df["detraccion_monto"] = (df["total_con_igv"] * self.detraccion).round(2)
-        df["neto_recibido"] = (df["total_con_igv"] - df["detraccion_monto"]).round(2)
+        # Cálculo financiero en céntimos enteros; los float salen de ahí
+        df["igv_cent"] = pct_cents(df["subtotal_cent"], self.igv)
+        df["total_con_igv_cent"] = df["subtotal_cent"] + df["igv_cent"]
+        df["detraccion_monto_cent"] = pct_cents(df["total_con_igv_cent"], self.detraccion)
+        df["neto_recibido_cent"] = df["total_con_igv_cent"] - df["detraccion_monto_cent"]
+
+        for campo in ("igv", "total_con_igv", "detraccion_monto", "neto_recibido"):
+            df[campo] = from_cents(df[f"{campo}_cent"])
 
         df["tiene_detraccion"] = df["detraccion_monto"] > 0
 
@@ -183,13 +194,34 @@ class Calculator:
         df["Monto_PEN"] = df["Monto"]
         try:
             mask_usd = df["moneda"].str.contains("USD|DOL", case=False)
-            df.loc[mask_usd, "Monto_PEN"] = df.loc[mask_usd, "Monto"] * self.tipo_cambio
+            if self.tc_por_fecha and mask_usd.any():
+                # As-of vectorizado: tasa vigente a la fecha de cada movimiento
+                tasa = tasa_por_fecha(df.loc[mask_usd, "Fecha"], self.tipo_cambio)
+                df.loc[mask_usd, "Monto_PEN"] = df.loc[mask_usd, "Monto"].to_numpy() * tasa
+            else:
+                df.loc[mask_usd, "Monto_PEN"] = df.loc[mask_usd, "Monto"] * self.tipo_cambio
         except Exception as e:
             warn(f"No se pudo convertir USD → PEN: {e}")
+        df["Monto_PEN_cent"] = to_cents(df["Monto_PEN"])
 
         ok("Movimientos bancarios normalizados.")
         return df
 
+    def huella_tipo_cambio(self) -> str:
+        """Cambia si cambia el USD → PEN que aplicaría process_bancos."""
+        h = hashlib.sha1(repr(float(self.tipo_cambio)).encode("utf-8"))
+        if self.tc_por_fecha:
+            fechas, tasas = serie_tasas("USD")
+            h.update(fechas.tobytes())
+            h.update(tasas.tobytes())
+        return h.hexdigest()
+
+    def rango_tipo_cambio(self) -> tuple:
+        """(mínimo, máximo) USD → PEN que puede aplicar process_bancos."""
+        if not self.tc_por_fecha:
+            return self.tipo_cambio, self.tipo_cambio
+        return rango_tasas(self.tipo_cambio)
+
 
 # ============================================================
 #   APIs PARA DATAMAPPER
@@ -21,7 +21,7 @@ if str(ROOT) not in sys.path:
 # ------------------------------------------------------------
 from src.core.logger import info, ok, warn
 from src.core.env_loader import get_config
-from src.core.utils import clean_amount
+from src.core.utils import clean_amount_series, to_cents
 
 
 # ============================================================
@@ -104,23 +104,58 @@ class DataMapper:
         return bool(re.match(r"^[0-9]{1,3}$", serie))
 
     # ------------------------------------------------------------
-    #  EXTRACTOR MULTICOLUMNA
+    #  HASH ESTABLE · EN BLOQUE (mismo resultado que _make_hash)
     # ------------------------------------------------------------
-    def _pick(self, row: pd.Series, posibles: List[str], colmap: Dict[str, str]):
+    @staticmethod
+    def _make_hash_frame(df: pd.DataFrame) -> list[str]:
+        """
+        Hash por fila sobre TODAS las columnas del DataFrame,
+        en orden alfabético y con str() por valor → idéntico a _make_hash(dict).
+        """
+        if df.empty:
+            return []
+
+        columnas = [df[c].tolist() for c in sorted(df.columns)]
+        return [
+            hashlib.sha256("|".join(map(str, valores)).encode("utf-8")).hexdigest()
+            for valores in zip(*columnas)
+        ]
+
+    # ------------------------------------------------------------
+    #  EXTRACTOR MULTICOLUMNA (COLUMNAR)
+    # ------------------------------------------------------------
+    @staticmethod
+    def _coalesce(df: pd.DataFrame, posibles: List[str], colmap: Dict[str, str]) -> pd.Series:
         """
-        Busca una columna usando los alias normalizados de settings.json.
+        Primer valor válido entre los alias de settings.json, columna a columna.
+        Equivale a un bfill(axis=1) sobre las candidatas; vacíos / "nan" / "None"
+        cuentan como faltantes. Faltantes → None.
         """
-        if not posibles:
-            return None
-
-        for alias in posibles:
-            alias_norm = normalize_colname(alias)
-            if alias_norm in colmap:
-                orig = colmap[alias_norm]
-                val = row.get(orig)
-                if pd.notna(val) and str(val).strip() not in ("", "nan", "None"):
-                    return val
-        return None
+        res = pd.Series(None, index=df.index, dtype=object)
+
+        for alias in posibles or []:
+            orig = colmap.get(normalize_colname(alias))
+            if orig is None or orig not in df.columns:
+                continue
+
+            col = df[orig]
+            if isinstance(col, pd.DataFrame):  # nombres duplicados
+                col = col.iloc[:, 0]
+            col = col.astype(object)
+
+            txt = col.astype(str).str.strip()
+            valido = col.notna() & ~txt.isin(["", "nan", "None"])
+
+            res = res.where(res.notna(), col.where(valido))
+
+        return res.where(res.notna(), None)
+
+    @staticmethod
+    def _as_text(s: pd.Series) -> pd.Series:
+        """Equivalente columnar de str(valor or "").strip()."""
+        vacio = s.isna() | ~s.astype(bool)
+        txt = s.astype(str).str.strip()
+        return txt.where(~vacio, "")
 
     # ============================================================
     #  MAPEO CLIENTES
@@ -151,80 +186,75 @@ class DataMapper:
     # ============================================================
     #  MAPEO FACTURAS
     # ============================================================
-    def map_facturas(self, df: pd.DataFrame) -> list[dict]:
-        info("Mapeando facturas (RAW)…")
+    def map_facturas_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Versión columnar: devuelve un DataFrame con las mismas columnas
+        (y el mismo source_hash) que los dicts de map_facturas().
+        """
+        info("Mapeando facturas (RAW · columnar)…")
 
         df_norm, colmap = normalize_dataframe_columns(df)
-        facturas: list[dict] = []
         c = self.cols_fact
 
-        for idx, row in df_norm.iterrows():
-            try:
-                # -----------------------------
-                # SUBTOTAL / IGV / TOTAL
-                # -----------------------------
-                subtotal = clean_amount(self._pick(row, c.get("subtotal"), colmap))
-                igv = clean_amount(self._pick(row, c.get("igv"), colmap))
-                total = clean_amount(self._pick(row, c.get("total"), colmap))
-
-                # -----------------------------
-                # IDENTIFICACIÓN
-                # -----------------------------
-                ruc = str(self._pick(row, c.get("ruc"), colmap) or "").strip()
-                cliente = str(self._pick(row, c.get("cliente_generador"), colmap) or "").strip()
-
-                # -----------------------------
-                # COMBINADA → (serie-numero)
-                # -----------------------------
-                combinada = str(self._pick(row, c.get("combinada"), colmap) or "").strip()
-                serie, numero = self._parse_combinada(combinada)
-
-                # fallback serie
-                if not serie:
-                    sr = str(self._pick(row, c.get("serie"), colmap) or "").strip()
-                    if sr and not self._serie_invalida(sr):
-                        serie = sr
-
-                # fallback numero
-                if not numero:
-                    nr = str(self._pick(row, c.get("numero"), colmap) or "").strip()
-                    if nr.isdigit():
-                        numero = nr
-
-                factura = {
-                    "subtotal": subtotal,
-                    "igv": igv,
-                    "total": total,
-                    "ruc": ruc,
-                    "cliente_generador": cliente,
-                    "serie": serie or "",
-                    "numero": numero or "",
-                    "combinada": combinada,
-                    "fecha_emision": self._pick(row, c.get("fecha_emision"), colmap),
-                    "vencimiento": self._pick(row, c.get("vencimiento"), colmap),
-                    "estado_fs": str(self._pick(row, c.get("estado_fs"), colmap) or "").strip(),
-                    "estado_cont": str(self._pick(row, c.get("estado_cont"), colmap) or "").strip(),
-                    "fue_cobrado": 0,
-                    "match_id": None,
-                }
-
-                factura["source_hash"] = self._make_hash(factura)
-                facturas.append(factura)
-
-            except Exception as e:
-                warn(f"[Factura {idx}] Error → {e}")
-
-        ok(f"Facturas mapeadas: {len(facturas)}")
-        return facturas
+        def col(campo: str) -> pd.Series:
+            return self._coalesce(df_norm, c.get(campo), colmap)
+
+        def texto(campo: str) -> pd.Series:
+            return self._as_text(col(campo))
+
+        # -----------------------------
+        # COMBINADA → (serie-numero)
+        # -----------------------------
+        combinada = texto("combinada")
+        partes = combinada.str.extract(r"^([A-Za-z0-9]+)-([0-9]+)")
+        serie, numero = partes[0], partes[1]
+
+        # fallback serie
+        sr = texto("serie")
+        sr_ok = (sr != "") & ~sr.str.match(r"^[0-9]{1,3}$")
+        serie = serie.where(serie.notna(), sr.where(sr_ok, ""))
+
+        # fallback numero
+        nr = texto("numero")
+        numero = numero.where(numero.notna(), nr.where(nr.str.isdigit(), ""))
+
+        out = pd.DataFrame({
+            "subtotal": clean_amount_series(col("subtotal")),
+            "igv": clean_amount_series(col("igv")),
+            "total": clean_amount_series(col("total")),
+            "ruc": texto("ruc"),
+            "cliente_generador": texto("cliente_generador"),
+            "serie": serie.astype(object),
+            "numero": numero.astype(object),
+            "combinada": combinada,
+            "fecha_emision": col("fecha_emision"),
+            "vencimiento": col("vencimiento"),
+            "estado_fs": texto("estado_fs"),
+            "estado_cont": texto("estado_cont"),
+            "fue_cobrado": 0,
+            "match_id": None,
+        }, index=df_norm.index)
+
+        out["source_hash"] = self._make_hash_frame(out)
+
+        # Céntimos int64 (después del hash: source_hash no cambia)
+        for campo in ("subtotal", "igv", "total"):
+            out[f"{campo}_cent"] = to_cents(out[campo])
+
+        ok(f"Facturas mapeadas: {len(out)}")
+        return out.reset_index(drop=True)
+
+    def map_facturas(self, df: pd.DataFrame) -> list[dict]:
+        if df is None or df.empty:
+            ok("Facturas mapeadas: 0")
+            return []
+        return self.map_facturas_frame(df).to_dict("records")
 
     # ============================================================
     #  MAPEO BANCOS
     # ============================================================
-    def map_bancos(self, df: pd.DataFrame, nombre_tabla: str) -> list[dict]:
-        info(f"Mapeando movimientos bancarios desde '{nombre_tabla}'…")
-
-        df_norm, colmap = normalize_dataframe_columns(df)
-        movimientos: list[dict] = []
+    def map_bancos_frame(self, df: pd.DataFrame, nombre_tabla: str) -> pd.DataFrame:
+        info(f"Mapeando movimientos bancarios desde '{nombre_tabla}' (columnar)…")
 
         # identificar banco por tabla
         codigo = next(
@@ -233,32 +263,37 @@ class DataMapper:
         )
         if not codigo:
             warn(f"No se encontró código de banco para tabla {nombre_tabla}")
-            return []
+            return pd.DataFrame()
 
+        df_norm, colmap = normalize_dataframe_columns(df)
         c = self.cols_bank
 
-        for idx, row in df_norm.iterrows():
-            try:
-                monto = clean_amount(self._pick(row, c.get("monto"), colmap))
-                moneda = str(self._pick(row, c.get("moneda"), colmap) or "").upper().strip()
-
-                mov = {
-                    "fecha": self._pick(row, c.get("fecha"), colmap),
-                    "tipo_mov": str(self._pick(row, c.get("tipo_mov"), colmap) or "").strip(),
-                    "descripcion": str(self._pick(row, c.get("descripcion"), colmap) or "").strip(),
-                    "operacion": str(self._pick(row, c.get("operacion"), colmap) or "").strip(),
-                    "destinatario": str(self._pick(row, c.get("destinatario"), colmap) or "").strip(),
-                    "tipo_documento": str(self._pick(row, c.get("tipo_documento"), colmap) or "").strip(),
-                    "monto": monto,
-                    "moneda": moneda,
-                    "banco_codigo": codigo,
-                }
-
-                mov["source_hash"] = self._make_hash(mov)
-                movimientos.append(mov)
-
-            except Exception as e:
-                warn(f"[Banco {codigo} fila {idx}] Error → {e}")
-
-        ok(f"Movimientos mapeados: {len(movimientos)}")
-        return movimientos
+        def col(campo: str) -> pd.Series:
+            return self._coalesce(df_norm, c.get(campo), colmap)
+
+        def texto(campo: str) -> pd.Series:
+            return self._as_text(col(campo))
+
+        out = pd.DataFrame({
+            "fecha": col("fecha"),
+            "tipo_mov": texto("tipo_mov"),
+            "descripcion": texto("descripcion"),
+            "operacion": texto("operacion"),
+            "destinatario": texto("destinatario"),
+            "tipo_documento": texto("tipo_documento"),
+            "monto": clean_amount_series(col("monto")),
+            "moneda": texto("moneda").str.upper().str.strip(),
+            "banco_codigo": codigo,
+        }, index=df_norm.index)
+
+        out["source_hash"] = self._make_hash_frame(out)
+        out["monto_cent"] = to_cents(out["monto"])
+
+        ok(f"Movimientos mapeados: {len(out)}")
+        return out.reset_index(drop=True)
+
+    def map_bancos(self, df: pd.DataFrame, nombre_tabla: str) -> list[dict]:
+        if df is None or df.empty:
+            ok("Movimientos mapeados: 0")
+            return []
+        return self.map_bancos_frame(df, nombre_tabla).to_dict("records")
@@ -7,6 +7,7 @@ from datetime import timedelta
 from difflib import SequenceMatcher
 from typing import Any, Optional, Dict, Tuple
 
+import numpy as np
 import pandas as pd
 
 CURRENT_FILE = Path(__file__).resolve()
@@ -16,7 +17,10 @@ if str(ROOT) not in sys.path:
 
 from src.core.logger import warn
 from src.core.env_loader import get_config, get_env
+from src.core.utils import amount_cents, to_cents
 from src.transformers.ai_helpers import ai_similarity, ai_decide_match
+from src.matchers.candidates import FTSNameCandidates
+from src.matchers.ledger import BankLedger
 
 
 class Matcher:
@@ -36,6 +40,7 @@ class Matcher:
         # ------------------------------------------------------
         # Desde settings.json → parametros_contables
         self.var_monto = float(cfg.parametros.monto_variacion)
+        self.var_cent = int(round(self.var_monto * 100))
         # Alias ya definido en env_loader: tipo_cambio = tipo_cambio_usd_pen
         self.tc_usd_pen = float(cfg.tipo_cambio)
 
@@ -49,6 +54,14 @@ class Matcher:
         # Flag híbrido IA (si algún día se mapea en cfg; si no, False)
         self.use_ai = bool(getattr(cfg, "activar_ia", False))
 
+        # Candidatos por nombre (FTS5 + BM25) → similitud solo sobre los hits
+        self.nombres: Optional[FTSNameCandidates] = None
+        if cfg.matching.match_nombres == "fts":
+            try:
+                self.nombres = FTSNameCandidates()
+            except Exception as e:
+                warn(f"Matcher: FTS5 no disponible ({e}) → similitud sobre toda la ventana.")
+
     @staticmethod
     def _similarity_basic(a: str, b: str) -> float:
         a = (a or "").strip().lower()
@@ -76,6 +89,10 @@ class Matcher:
         if monto_pen is None:
             return None
 
+        # Diferencias en céntimos enteros (comparación exacta contra var_cent)
+        banco_c = mov.get("Monto_PEN_cent")
+        banco_c = amount_cents(monto_pen) if banco_c is None or pd.isna(banco_c) else int(banco_c)
+
         refs = (
             ("neto_recibido", fac.get("neto_recibido")),
             ("total_con_igv", fac.get("total_con_igv")),
@@ -85,24 +102,26 @@ class Matcher:
         candidatos = []
         for nombre, val in refs:
             val_f = self._safe_float(val)
-            if val_f is not None:
-                diff = abs(monto_pen - val_f)
-                candidatos.append((nombre, val_f, diff))
+            if val_f is not None and val_f == val_f:
+                ref_c = fac.get(f"{nombre}_cent")
+                ref_c = amount_cents(val_f) if ref_c is None or pd.isna(ref_c) else int(ref_c)
+                candidatos.append((nombre, val_f, abs(banco_c - ref_c)))
 
         if not candidatos:
             return None
 
-        tipo, ref, diff = min(candidatos, key=lambda x: x[2])
+        tipo, ref, diff_c = min(candidatos, key=lambda x: x[2])
 
         return {
             "tipo_base": tipo,
             "monto_ref": ref,
             "monto_banco_equivalente": monto_pen,
-            "diff_monto": diff,
+            "diff_monto": diff_c / 100,
+            "diff_cent": diff_c,
         }
 
-    def match(self, df_facturas: pd.DataFrame, df_bancos: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
-
+    @staticmethod
+    def _normalizar_bancos(df_bancos: pd.DataFrame) -> pd.DataFrame:
         banks = df_bancos.copy()
 
         if "banco_codigo" in banks.columns and "Banco" not in banks.columns:
@@ -139,6 +158,56 @@ class Matcher:
 
         if "Monto_PEN" not in banks.columns:
             banks["Monto_PEN"] = banks["Monto"]
+        if "Monto_PEN_cent" not in banks.columns:
+            banks["Monto_PEN_cent"] = to_cents(pd.to_numeric(banks["Monto_PEN"], errors="coerce"))
+
+        return banks
+
+    def _candidatos(self, fac: pd.Series, banks: Optional[pd.DataFrame], libro: Optional[BankLedger],
+                    ini, fin) -> Tuple[pd.DataFrame, bool]:
+        """
+        (candidatos, hay movimientos en la ventana) con Fecha en [ini, fin]
+        (todos si ini es None). Con BankLedger solo se materializan los que
+        además quedan a ≤ 2 × var_monto de algún monto de referencia: el
+        resto el loop lo descarta igual.
+        """
+        if libro is None:
+            if ini is not None:
+                banks = banks[(banks["Fecha"] >= ini) & (banks["Fecha"] <= fin)]
+            return banks, not banks.empty
+
+        ventana = np.arange(len(libro)) if ini is None else libro.ventana(ini, fin)
+        if not len(ventana):
+            return pd.DataFrame(), False
+
+        sel = []
+        for nombre in ("neto_recibido", "total_con_igv", "subtotal"):
+            val_f = self._safe_float(fac.get(nombre))
+            if val_f is None or val_f != val_f:
+                continue
+            ref_c = fac.get(f"{nombre}_cent")
+            ref_c = amount_cents(val_f) if ref_c is None or pd.isna(ref_c) else int(ref_c)
+            sel.append(libro.rango(ref_c - 2 * self.var_cent, ref_c + 2 * self.var_cent, ventana))
+
+        pos = np.unique(np.concatenate(sel)) if sel else np.array([], dtype=np.int64)
+        return libro.frame(pos), True
+
+    def match(self, df_facturas: pd.DataFrame, df_bancos) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        df_bancos: DataFrame de movimientos o BankLedger compartido con
+        MatcherEngine (ledger()): la ventana y el rango de montos se buscan
+        en los arreglos y solo los candidatos pasan a DataFrame.
+        """
+        libro = df_bancos if isinstance(df_bancos, BankLedger) else None
+        banks = None if libro is not None else self._normalizar_bancos(df_bancos)
+
+        # Céntimos de los montos de referencia, una vez por columna
+        df_facturas = df_facturas.copy()
+        for nombre in ("neto_recibido", "total_con_igv", "subtotal"):
+            if nombre in df_facturas.columns and f"{nombre}_cent" not in df_facturas.columns:
+                df_facturas[f"{nombre}_cent"] = to_cents(pd.to_numeric(df_facturas[nombre], errors="coerce"))
+
+        usar_fts = self.nombres is not None and (libro is not None or "id" in banks.columns)
 
         rows_match = []
         rows_detalles = []
@@ -151,6 +220,13 @@ class Matcher:
             cliente = fac.get("cliente_generador") or ""
             ruc = fac.get("ruc")
 
+            # Movimientos que mencionan al cliente (id → bm25)
+            hits: Dict[int, float] = {}
+            if usar_fts:
+                nombre = fac.get("razon_social") or self.nombres.razon_social(ruc) or cliente
+                hits = self.nombres.ranking(nombre)
+                cliente = cliente or nombre
+
             fac_fecha = fac.get("fecha_emision")
             fac_lim = fac.get("fecha_limite_pago")
             win_ini = fac.get("fecha_inicio_ventana")
@@ -161,18 +237,15 @@ class Matcher:
                 if not pd.isna(fac_fecha):
                     win_ini = fac_fecha - timedelta(days=self.extra_days)
                     win_fin = fac_fecha + timedelta(days=self.extra_days)
-                    candidatos = banks[(banks["Fecha"] >= win_ini) & (banks["Fecha"] <= win_fin)]
+                    candidatos, en_ventana = self._candidatos(fac, banks, libro, win_ini, win_fin)
                 else:
-                    candidatos = banks
+                    candidatos, en_ventana = self._candidatos(fac, banks, libro, None, None)
             else:
                 extra = timedelta(days=self.extra_days)
-                candidatos = banks[
-                    (banks["Fecha"] >= win_ini - extra) &
-                    (banks["Fecha"] <= win_fin + extra)
-                ]
+                candidatos, en_ventana = self._candidatos(fac, banks, libro, win_ini - extra, win_fin + extra)
 
             # Sin candidatos
-            if candidatos.empty:
+            if not en_ventana:
                 rows_match.append({
                     "factura_id": factura_id,
                     "movimiento_id": None,
@@ -206,11 +279,15 @@ class Matcher:
                 if not monto_info:
                     continue
 
-                if monto_info["diff_monto"] > self.var_monto * 2:
+                if monto_info["diff_cent"] > self.var_cent * 2:
                     continue
 
                 desc = str(mov.get("Descripcion") or "")
-                sim_regla = self._similarity_basic(cliente, desc)
+                bm25 = hits.get(int(mov["id"])) if usar_fts else None
+                if usar_fts and bm25 is None:
+                    sim_regla = 0.0  # el movimiento no menciona al cliente
+                else:
+                    sim_regla = self._similarity_basic(cliente, desc)
 
                 # IA optimizada → solo si aporta valor
                 if self.use_ai and 0.25 < sim_regla < 0.80:
@@ -247,6 +324,7 @@ class Matcher:
                     "sim_nombre_regla": sim_regla,
                     "sim_nombre_ia": sim_ai,
                     "sim_nombre_max": sim_final,
+                    "bm25_nombre": bm25,
                     "tiene_terminos_flex": int(flex_flag),
                     "ventana_inicio": win_ini,
                     "ventana_fin": win_fin,
@@ -284,7 +362,7 @@ class Matcher:
             score_best, idx_best, mov_best, mi, sim_final, flex_flag = max(mejores, key=lambda x: x[0])
 
             # REGLA BASE
-            if sim_final >= self.sim_strong and mi["diff_monto"] <= self.var_monto:
+            if sim_final >= self.sim_strong and mi["diff_cent"] <= self.var_cent:
                 categoria = "MATCH"
             elif sim_final >= self.sim_dudoso or flex_flag:
                 categoria = "MATCH_DUDOSO"
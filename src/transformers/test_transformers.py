@@ -103,8 +103,87 @@ def main():
     ok("=== TEST TRANSFORMERS COMPLETADO EXITOSAMENTE ===")
 
 
+# =====================================================================
+#      TEST CALCULATOR · CÉNTIMOS vs CÁLCULO FLOAT ANTERIOR
+# =====================================================================
+def test_calculo_centimos():
+    info("🔍 Comparando IGV / detracción en céntimos con el cálculo float anterior…")
+
+    try:
+        calc = Calculator(get_config())
+        calc.igv, calc.detraccion = 0.18, 0.04
+
+        # Facturas conocidas: total redondo, base con decimales, montos chicos
+        df = pd.DataFrame({
+            "subtotal": [1000.00, 2542.37, 847.46, 123.45, 16.95, 99999.99],
+            "fecha_emision": "2025-01-10",
+            "vencimiento": "2025-02-09",
+        })
+        df_calc = calc.process_facturas(df)
+
+        # Cálculo previo (float + round(2)), fuera de los empates de medio céntimo
+        igv = (df["subtotal"] * 0.18).round(2)
+        total = (df["subtotal"] + igv).round(2)
+        detraccion = (total * 0.04).round(2)
+        neto = (total - detraccion).round(2)
+
+        for campo, previo in (("igv", igv), ("total_con_igv", total),
+                              ("detraccion_monto", detraccion), ("neto_recibido", neto)):
+            assert df_calc[campo].tolist() == previo.tolist(), (campo, df_calc[campo].tolist(), previo.tolist())
+        ok("IGV, total, detracción y neto coinciden con el cálculo float anterior.")
+
+        assert df_calc.loc[1, ["igv", "total_con_igv", "detraccion_monto", "neto_recibido"]].tolist() \
+            == [457.63, 3000.00, 120.00, 2880.00]
+
+        # Empate de medio céntimo: 0.25 × 18% = 0.045 → 0.05 (float daba 0.04)
+        medio = calc.process_facturas(df.head(1).assign(subtotal=0.25))
+        assert medio.loc[0, "igv"] == 0.05 and round(0.25 * 0.18, 2) == 0.04
+        ok("Medio céntimo → lejos de cero (0.045 → 0.05).")
+
+    except Exception as e:
+        error(f"ERROR en test_calculo_centimos: {e}")
+        raise
+
+
+# =====================================================================
+#      TEST DATAMAPPER · HASH EN BLOQUE vs HASH POR FILA
+# =====================================================================
+def test_hash_frame():
+    info("🔍 Comparando DataMapper._make_hash_frame con _make_hash por fila…")
+
+    try:
+        # Columnas desordenadas + tipos mezclados (int, float, NaN, None, texto, fecha)
+        df = pd.DataFrame({
+            "total": [1180.0, 295.59, float("nan")],
+            "ruc": ["20123456789", "20555666777", ""],
+            "fue_cobrado": [0, 0, 1],
+            "match_id": [None, None, 7],
+            "fecha_emision": ["2024-01-15", None, "2024-04-01"],
+            "cliente_generador": ["ACME SAC", "COMERCIAL ÑANDU", None],
+        })
+
+        esperado = [DataMapper._make_hash(fila) for fila in df.to_dict(orient="records")]
+        assert DataMapper._make_hash_frame(df) == esperado, "Hash en bloque ≠ hash por fila"
+        assert DataMapper._make_hash_frame(df.head(0)) == []
+
+        # map_facturas(): source_hash = _make_hash de la fila sin hash ni céntimos
+        out = DataMapper().map_facturas_frame(df)
+        assert len(out) == len(df)
+        for fila in out.to_dict(orient="records"):
+            base = {k: v for k, v in fila.items() if k != "source_hash" and not k.endswith("_cent")}
+            assert fila["source_hash"] == DataMapper._make_hash(base)
+
+        ok(f"source_hash idéntico en bloque y por fila ({len(df)} filas).")
+
+    except Exception as e:
+        error(f"ERROR en test_hash_frame: {e}")
+        raise
+
+
 # =====================================================================
 # Ejecución directa
 # =====================================================================
 if __name__ == "__main__":
+    test_calculo_centimos()
+    test_hash_frame()
     main()